@@ -230,5 +230,14 @@ def extract_ark(ark_path, output_dir):
                 num_files2 = read_uint32_le(f)
                 f.seek(4 * num_files2, 1)
 
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Extract files from a Rock Band .ark archive')
+    parser.add_argument('ark_path', help='Path to the .ark (or .hdr) file')
+    parser.add_argument('output_dir', help='Directory to extract files into')
+    args = parser.parse_args(argv)
+    extract_ark(args.ark_path, args.output_dir)
+    return 0
+
 if __name__ == '__main__':
-    pass
+    main()
@@ -16,14 +16,19 @@ cp output/*.html "$BACKUP_DIR/" 2>/dev/null || true
 
 # Intermediate files in rb4_temp
 cp rb4_temp/rb4_custom_songs.json "$BACKUP_DIR/" 2>/dev/null || true
+cp rb4_temp/rb4_custom_songs.delta.jsonl "$BACKUP_DIR/" 2>/dev/null || true
 cp rb4_temp/processed_pkgs.json "$BACKUP_DIR/" 2>/dev/null || true
+cp rb4_temp/processed_pkgs.jsonl "$BACKUP_DIR/" 2>/dev/null || true
 cp rb4_temp/pipeline_errors.json "$BACKUP_DIR/" 2>/dev/null || true
 cp rb4_temp/update_history.json "$BACKUP_DIR/" 2>/dev/null || true
+cp rb4_temp/perf_history.jsonl "$BACKUP_DIR/" 2>/dev/null || true
 
 # Most recent run log
 LOG_FILE=$(ls -t rb4_temp/rb4_extract_*.log 2>/dev/null | head -1)
 if [ -n "$LOG_FILE" ]; then
     cp "$LOG_FILE" "$BACKUP_DIR/"
+    cp "${LOG_FILE%.log}.events.jsonl" "$BACKUP_DIR/" 2>/dev/null || true
+    cp "${LOG_FILE%.log}.perf.json" "$BACKUP_DIR/" 2>/dev/null || true
 fi
 
 # Create 7z archive with max compression
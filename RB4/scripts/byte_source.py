@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Random-access byte sources with a block cache, for reading PKGs in place remotely.
+
+In SMB mode every PKG used to be downloaded in full (often several GB) so
+pkg_reader could pull a few kilobytes of .songdta_ps4 out of it. PkgReader
+and PfsReader only need a buffer that supports len() and slicing, so a
+remote file can stand in for the local mmap:
+
+    with BlockCache(SmbRangeSource(r'\\\\server\\share\\dir\\x.pkg')) as buf:
+        with PkgReader('x.pkg', buffer=buf) as pkg:
+            files = pkg.inner_pfs().read_files('.songdta_ps4')
+        print(buf.bytes_fetched)   # header, entry table, PFS inodes/dirents, songdta blocks
+
+A range source has `size`, `read_range(offset, length)` and `close()`:
+
+    FileRangeSource    a local file via os.pread (offline stand-in, counts bytes)
+    SmbRangeSource     a file on a share via smbprotocol (optional dependency;
+                       `pip install smbprotocol`)
+
+BlockCache turns a range source into a sliceable buffer. Reads are rounded to
+block_size (64 KB) blocks, missing blocks of one slice are fetched in a
+single contiguous request, and the most recently used max_blocks are kept.
+"""
+
+import os
+from collections import OrderedDict
+
+DEFAULT_BLOCK_SIZE = 64 * 1024
+DEFAULT_MAX_BLOCKS = 512  # 32 MB with the default block size
+
+
+class FileRangeSource:
+    """Byte ranges of a local file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        self.size = os.fstat(self._fd).st_size
+
+    def read_range(self, offset, length):
+        return os.pread(self._fd, length, offset)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class SmbRangeSource:
+    """Byte ranges of a file on an SMB share (needs the smbprotocol package).
+
+    unc_path is \\\\server\\share\\path\\file.pkg. Credentials come from
+    SMB_USERNAME / SMB_PASSWORD, defaulting to a guest login like `smbclient -N`.
+    """
+
+    def __init__(self, unc_path, size=None):
+        import smbclient  # smbprotocol's high-level API; ImportError if not installed
+        server = unc_path.lstrip('\\').split('\\', 1)[0]
+        smbclient.register_session(server, username=os.environ.get('SMB_USERNAME', 'guest'),
+                                   password=os.environ.get('SMB_PASSWORD', ''))
+        self.path = unc_path
+        self._file = smbclient.open_file(unc_path, mode='rb')
+        self.size = size if size is not None else smbclient.stat(unc_path).st_size
+
+    def read_range(self, offset, length):
+        self._file.seek(offset)
+        return self._file.read(length)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class BlockCache:
+    """Sliceable, read-only view of a range source, fetched in cached blocks."""
+
+    def __init__(self, source, block_size=DEFAULT_BLOCK_SIZE, max_blocks=DEFAULT_MAX_BLOCKS):
+        self.source = source
+        self.block_size = block_size
+        self.max_blocks = max_blocks
+        self._blocks = OrderedDict()  # block index -> bytes
+        self.requests = 0
+        self.bytes_fetched = 0
+
+    def __len__(self):
+        return self.source.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._blocks.clear()
+        self.source.close()
+
+    def _fetch(self, first, last):
+        """Read blocks first..last (inclusive) in one request."""
+        start = first * self.block_size
+        data = self.source.read_range(start, min((last + 1) * self.block_size, self.source.size) - start)
+        self.requests += 1
+        self.bytes_fetched += len(data)
+        for index in range(first, last + 1):
+            pos = (index - first) * self.block_size
+            self._blocks[index] = data[pos:pos + self.block_size]
+            self._blocks.move_to_end(index)
+
+    def _load(self, first, last):
+        run_start = None
+        for index in range(first, last + 2):
+            missing = index <= last and index not in self._blocks
+            if missing and run_start is None:
+                run_start = index
+            elif not missing and run_start is not None:
+                self._fetch(run_start, index - 1)
+                run_start = None
+            if index <= last and not missing:
+                self._blocks.move_to_end(index)
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            raise TypeError("BlockCache only supports slicing")
+        start, stop, _ = key.indices(self.source.size)
+        if stop <= start:
+            return b''
+        first, last = start // self.block_size, (stop - 1) // self.block_size
+        self._load(first, last)
+        data = b''.join(self._blocks[i] for i in range(first, last + 1))
+        while len(self._blocks) > max(self.max_blocks, last - first + 1):
+            self._blocks.popitem(last=False)
+        offset = first * self.block_size
+        return data[start - offset:stop - offset]
+
+
+def main(argv=None):
+    import argparse
+    import time
+    from pkg_reader import read_pkg_files_with_suffix
+    parser = argparse.ArgumentParser(description='Read song data from a PKG through byte-range reads and '
+                                                 'report how much of the file was transferred')
+    parser.add_argument('pkg', help='Local PKG path, or \\\\server\\share\\...\\file.pkg (needs smbprotocol)')
+    parser.add_argument('--suffix', default='.songdta_ps4', help='Files to read from the inner PFS')
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE)
+    args = parser.parse_args(argv)
+
+    source = SmbRangeSource(args.pkg) if args.pkg.startswith('\\\\') else FileRangeSource(args.pkg)
+    start = time.perf_counter()
+    with BlockCache(source, args.block_size) as buf:
+        files = read_pkg_files_with_suffix(args.pkg, args.suffix, buffer=buf)
+        print(f"{len(files)} file(s), {sum(len(d) for _, d in files):,} bytes of {args.suffix}")
+        print(f"Transferred {buf.bytes_fetched:,} of {len(buf):,} bytes "
+              f"({100 * buf.bytes_fetched / max(len(buf), 1):.3f}%) in {buf.requests} request(s), "
+              f"{time.perf_counter() - start:.3f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
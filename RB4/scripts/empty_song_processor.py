@@ -76,30 +76,22 @@ def apply_empty_song_fallback(songs, baseline=None):
 def get_songs_with_fallback(metadata_dir, baseline=None):
     """Load all metadata JSONs from a directory and apply fallback.
     
+    Songs are read through the consolidated store (metadata_store.py), which
+    only re-parses JSON files that changed since the last load.
+    
     Args:
         metadata_dir: Directory containing metadata_*.json files
         baseline: Optional pre-loaded baseline
         
     Returns:
-        List of all songs with fallback applied
+        List of all songs (each tagged with its '_pkg_file') with fallback applied
     """
-    import glob
+    from metadata_store import load_metadata_songs
     
     if baseline is None:
         baseline = load_empty_songs_baseline()
     
-    songs = []
-    for f in sorted(glob.glob(os.path.join(metadata_dir, 'metadata_*.json'))):
-        # Add pkg filename from metadata filename
-        pkg_name = os.path.basename(f).replace('metadata_', '').replace('.json', '')
-        with open(f) as fp:
-            loaded_songs = json.load(fp)
-        # Add pkg to ALL songs in this file
-        for song in loaded_songs:
-            song['_pkg_file'] = pkg_name
-        songs.extend(loaded_songs)
-    
-    return apply_empty_song_fallback(songs, baseline)
+    return apply_empty_song_fallback(load_metadata_songs(metadata_dir), baseline)
 
 if __name__ == '__main__':
     import sys
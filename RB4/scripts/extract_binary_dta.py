@@ -1,14 +1,47 @@
 #!/usr/bin/env python3
 """
 extract_binary_dta.py — Extract song metadata from Rock Band 4 binary .songdta_ps4 files.
-Uses exact field offsets from LibForge's 010 Editor template.
+Uses exact field offsets from LibForge's 010 Editor template, decoded in one
+struct unpack per file through the layout tables in songdta_schema.py.
+
+The duration fallbacks scan every float32 in the file. With NumPy installed
+(imported on the first scan, not with the module) the scans run vectorized
+over numpy.frombuffer views; without it they use struct.iter_unpack. The
+any-offset scan first reads the header offset by offset, where real files
+hit, so only files without a hit there pay for the bulk scan. All give the
+same results as a per-offset struct.unpack loop.
+
+Usage:
+    python3 extract_binary_dta.py <dir-or-file>... <output.json> [--source NAME]
+        [--jobs N] [--ndjson] [--progress-interval SECONDS]
+
+Results are written as they complete (in input order), so memory stays flat
+for large batches. --jobs N reads and parses in N processes (0 = one per CPU);
+--ndjson (or an output ending in .ndjson/.jsonl) writes one object per line,
+and '-' streams to stdout with progress on stderr.
 """
 
 import sys
 import json
 import os
 import argparse
+import functools
+import multiprocessing
 import struct
+import time
+
+from songdta_schema import DEFAULT_LAYOUT, decode_songdta
+
+
+@functools.lru_cache(maxsize=None)
+def _np():
+    """NumPy, imported on first use so importing the parser stays cheap; None if not installed."""
+    try:
+        import numpy
+    except ImportError:  # optional: the float scans fall back to struct.iter_unpack
+        return None
+    return numpy
+
 
 _FRIENDLY_SOURCES = {
     'rb1': 'Rock Band 1', 'rb2': 'Rock Band 2', 'rb3': 'Rock Band 3',
@@ -31,50 +64,10 @@ _INSTRUMENT_EMOJI = {
     'real_keys': '🎹',
 }
 
-# Field offsets from LibForge 010/songdta.bt template
-OFFSETS = {
-    'songdta_type': 0,
-    'song_id': 4,
-    'version': 8,
-    'game_origin': 10,
-    'preview_start': 28,
-    'preview_end': 32,
-    'name': 36,
-    'artist': 292,
-    'album_name': 548,
-    'album_track_number': 804,
-    'album_year': 808,
-    'original_year': 812,
-    'genre': 816,
-    'song_length': 880,
-    'guitar': 884,
-    'bass': 888,
-    'vocals': 892,
-    'drum': 896,
-    'band': 900,
-    'keys': 904,
-    'real_keys': 908,
-    'tutorial': 912,
-    'album_art': 913,
-    'cover': 914,
-    'vocal_gender': 915,
-    'anim_tempo': 916,
-    'has_markup': 932,
-    'vocal_parts': 936,
-    'solos': 940,
-    'fake': 944,
-    'shortname': 945,
-}
+# Field offsets from LibForge 010/songdta.bt template (see songdta_schema.RB4_FIELDS)
+OFFSETS = DEFAULT_LAYOUT.offsets
 
-SIZES = {
-    'game_origin': 18,
-    'name': 256,
-    'artist': 256,
-    'album_name': 256,
-    'genre': 64,
-    'anim_tempo': 16,
-    'shortname': 256,
-}
+SIZES = {f.name: f.size for f in DEFAULT_LAYOUT.fields if f.type == 'str'}
 
 
 def _read_string(data: bytes, offset: int, max_size: int) -> str:
@@ -82,49 +75,12 @@ def _read_string(data: bytes, offset: int, max_size: int) -> str:
     try:
         if offset + max_size > len(data):
             return ""
-        chunk = data[offset:offset + max_size]
+        chunk = bytes(data[offset:offset + max_size])
         return chunk.split(b'\x00')[0].decode('utf-8', errors='replace').strip()
     except Exception:
         return ""
 
 
-def _read_int(data: bytes, offset: int) -> int:
-    """Read a 4-byte little-endian integer."""
-    try:
-        if offset + 4 > len(data):
-            return 0
-        return struct.unpack('<I', data[offset:offset + 4])[0]
-    except Exception:
-        return 0
-
-
-def _read_short(data: bytes, offset: int) -> int:
-    """Read a 2-byte little-endian short."""
-    try:
-        if offset + 2 > len(data):
-            return 0
-        return struct.unpack('<h', data[offset:offset + 2])[0]
-    except Exception:
-        return 0
-
-
-def _read_float(data: bytes, offset: int) -> float:
-    """Read a 4-byte float."""
-    try:
-        if offset + 4 > len(data):
-            return 0.0
-        return struct.unpack('<f', data[offset:offset + 4])[0]
-    except Exception:
-        return 0.0
-
-
-def _read_byte(data: bytes, offset: int) -> int:
-    """Read a single byte."""
-    if offset >= len(data):
-        return 0
-    return data[offset]
-
-
 def _scan_for_strings(data: bytes, min_len: int = 3) -> dict:
     """Scan binary data for embedded strings at known positions."""
     result = {
@@ -221,43 +177,105 @@ def _try_alternative_parsing(filepath: str, data: bytes, default_source: str) ->
     return result
 
 
+def _float_words(data: bytes, phase: int = 0):
+    """float32 values at offsets phase, phase + 4, ... below len(data) - 4.
+    
+    Returns a float64 NumPy array, or a list of floats without NumPy.
+    """
+    count = max(len(data) - 1 - phase, 0) // 4
+    np = _np()
+    if np is not None:
+        if not count:
+            return np.empty(0)
+        with np.errstate(invalid='ignore'):  # signalling NaN bit patterns stay NaN (never in range)
+            return np.frombuffer(data, dtype='<f4', count=count, offset=phase).astype(np.float64)
+    return [val for (val,) in struct.iter_unpack('<f', data[phase:phase + count * 4])]
+
+
+def _min_in_range(values, low: float, high: float):
+    """Smallest value in [low, high], or None."""
+    np = _np()
+    if np is not None:
+        hits = values[(values >= low) & (values <= high)]
+        return float(hits.min()) if hits.size else None
+    return min((val for val in values if low <= val <= high), default=None)
+
+
+def _first_in_range(values, low: float, high: float):
+    """Index of the first value in [low, high], or None."""
+    np = _np()
+    if np is not None:
+        hits = np.flatnonzero((values >= low) & (values <= high))
+        return int(hits[0]) if hits.size else None
+    return next((i for i, val in enumerate(values) if low <= val <= high), None)
+
+
 def _calculate_duration_ms(data: bytes) -> int:
     """Calculate duration from floats in the file. Find min float in range 60-500 as duration."""
-    floats_in_range = []
-    for i in range(0, len(data) - 4, 4):
-        try:
-            val = struct.unpack('<f', data[i:i+4])[0]
-            if 60.0 <= val <= 500.0:
-                floats_in_range.append(val)
-        except Exception:
-            pass
-    
-    if floats_in_range:
-        duration_seconds = min(floats_in_range)
+    duration_seconds = _min_in_range(_float_words(data), 60.0, 500.0)
+    if duration_seconds is not None:
         return int(duration_seconds * 1000)
     return 0
 
 
+_F32 = struct.Struct('<f')
+_SCAN_PREFIX = 256  # real files hit within the header; scanned offset by offset before the bulk scan
+
+
+def _scan_duration_any_offset(data: bytes, low: float = 30.0, high: float = 600.0) -> int:
+    """First float in [low, high] at any byte offset (aligned or not), as milliseconds; 0 if none.
+    
+    The first _SCAN_PREFIX offsets are read in order, stopping at the first
+    hit; only files without one there pay for the bulk scan of all four phases.
+    """
+    end = min(_SCAN_PREFIX, len(data) - 4)
+    for offset in range(end):
+        (val,) = _F32.unpack_from(data, offset)
+        if low <= val <= high:
+            return int(val * 1000)
+    if end < _SCAN_PREFIX:
+        return 0  # the whole file was in the prefix
+    first = None  # (offset, seconds)
+    for phase in range(4):
+        values = _float_words(data, phase)
+        if first is not None:
+            values = values[:(first[0] - phase) // 4 + 1]  # only offsets before the best hit so far
+        index = _first_in_range(values, low, high)
+        if index is not None and (first is None or phase + 4 * index < first[0]):
+            first = (phase + 4 * index, float(values[index]))
+    return int(first[1] * 1000) if first else 0
+
+
 def parse_songdta(filepath: str, default_source: str = "Custom") -> dict:
     """Parse .songdta_ps4 file using exact field offsets."""
     with open(filepath, 'rb') as f:
         data = f.read()
+    return parse_songdta_bytes(data, filepath, default_source)
+
 
+def parse_songdta_bytes(data: bytes, filepath: str, default_source: str = "Custom") -> dict:
+    """Parse .songdta_ps4 contents already in memory (filepath is only used for naming).
+
+    data can be bytes, bytearray, memoryview or mmap; nothing is copied for the header.
+    """
     if len(data) < 100:
         return _create_empty_result(filepath, default_source)
 
     # === EXTRACT ALL FIELDS ===
     
+    # One unpack of the whole header with the layout for this songdta version
+    fields = decode_songdta(data)
+    
     # Basic identification
-    songdta_type = _read_int(data, OFFSETS['songdta_type'])
-    song_id = _read_int(data, OFFSETS['song_id'])
-    version = _read_short(data, OFFSETS['version'])
-    game_origin = _read_string(data, OFFSETS['game_origin'], SIZES['game_origin'])
-    shortname = _read_string(data, OFFSETS['shortname'], SIZES['shortname'])
+    songdta_type = fields['songdta_type']
+    song_id = fields['song_id']
+    version = fields['version']
+    game_origin = fields['game_origin']
+    shortname = fields['shortname']
     
     # Core metadata
-    name = _read_string(data, OFFSETS['name'], SIZES['name'])
-    artist = _read_string(data, OFFSETS['artist'], SIZES['artist'])
+    name = fields['name']
+    artist = fields['artist']
     
     # If basic fields are empty, try alternative parsing
     if not name and not artist and not shortname:
@@ -268,65 +286,51 @@ def parse_songdta(filepath: str, default_source: str = "Custom") -> dict:
             return alt_result
     
     # Preview times
-    preview_start = _read_float(data, OFFSETS['preview_start'])
-    preview_end = _read_float(data, OFFSETS['preview_end'])
+    preview_start = fields['preview_start']
+    preview_end = fields['preview_end']
     
-    # Core metadata
-    name = _read_string(data, OFFSETS['name'], SIZES['name'])
-    artist = _read_string(data, OFFSETS['artist'], SIZES['artist'])
-    album_name = _read_string(data, OFFSETS['album_name'], SIZES['album_name'])
-    album_track_number = _read_short(data, OFFSETS['album_track_number'])
-    album_year = _read_int(data, OFFSETS['album_year'])
-    original_year = _read_int(data, OFFSETS['original_year'])
-    genre = _read_string(data, OFFSETS['genre'], SIZES['genre'])
+    album_name = fields['album_name']
+    album_track_number = fields['album_track_number']
+    album_year = fields['album_year']
+    original_year = fields['original_year']
+    genre = fields['genre']
     
     # Song length - try multiple methods
     duration_ms = _calculate_duration_ms(data)
     
-    # Fallback 1: try uint32 at offset 880 as milliseconds
+    # Fallback 1: song_length (uint32 at offset 880) as milliseconds
     if duration_ms == 0:
-        try:
-            val = struct.unpack('<I', data[880:884])[0]
-            if 60000 <= val <= 600000:  # 1-10 minutes in ms
-                duration_ms = val
-        except:
-            pass
+        if 60000 <= fields['song_length'] <= 600000:  # 1-10 minutes in ms
+            duration_ms = fields['song_length']
     
     # Fallback 2: try float at guitar offset (could be duration in seconds)
     if duration_ms == 0:
-        duration_float = _read_float(data, OFFSETS['guitar'])
+        duration_float = fields['guitar']
         if 60.0 <= duration_float <= 500.0:
             duration_ms = int(duration_float * 1000)
     
     # Fallback 3: scan entire file for float in reasonable range (for truncated WIP files)
     if duration_ms == 0:
-        for i in range(len(data) - 4):
-            try:
-                val = struct.unpack('<f', data[i:i+4])[0]
-                if 30.0 <= val <= 600.0:  # 30 seconds to 10 minutes
-                    duration_ms = int(val * 1000)
-                    break
-            except:
-                pass
+        duration_ms = _scan_duration_any_offset(data, 30.0, 600.0)  # 30 seconds to 10 minutes
     
     # Difficulty ratings (as floats)
-    guitar = _read_float(data, OFFSETS['guitar'])
-    bass = _read_float(data, OFFSETS['bass'])
-    vocals = _read_float(data, OFFSETS['vocals'])
-    drum = _read_float(data, OFFSETS['drum'])
-    band = _read_float(data, OFFSETS['band'])
-    keys = _read_float(data, OFFSETS['keys'])
-    real_keys = _read_float(data, OFFSETS['real_keys'])
+    guitar = fields['guitar']
+    bass = fields['bass']
+    vocals = fields['vocals']
+    drum = fields['drum']
+    band = fields['band']
+    keys = fields['keys']
+    real_keys = fields['real_keys']
     
     # Additional metadata
-    tutorial = _read_byte(data, OFFSETS['tutorial'])
-    album_art = _read_byte(data, OFFSETS['album_art'])
-    cover = _read_byte(data, OFFSETS['cover'])
-    vocal_gender = _read_byte(data, OFFSETS['vocal_gender'])
-    anim_tempo = _read_string(data, OFFSETS['anim_tempo'], 16)
-    has_markup = _read_byte(data, OFFSETS['has_markup'])
-    vocal_parts = _read_byte(data, OFFSETS['vocal_parts'])
-    fake = _read_byte(data, OFFSETS['fake'])
+    tutorial = fields['tutorial']
+    album_art = fields['album_art']
+    cover = fields['cover']
+    vocal_gender = fields['vocal_gender']
+    anim_tempo = fields['anim_tempo']
+    has_markup = fields['has_markup']
+    vocal_parts = fields['vocal_parts']
+    fake = fields['fake']
     
     # === DERIVE ADDITIONAL FIELDS ===
     
@@ -454,14 +458,66 @@ def _create_empty_result(filepath: str, default_source: str) -> dict:
     }
 
 
+def _parse_file(filepath: str, default_source: str = "Custom"):
+    """(filepath, result, error) for one file; runs in the --jobs worker processes."""
+    try:
+        with open(filepath, 'rb') as f:
+            data = f.read()
+        return filepath, parse_songdta_bytes(data, filepath, default_source), None
+    except Exception as e:
+        return filepath, None, str(e)
+
+
+def iter_parsed(files, default_source: str = "Custom", jobs: int = 1, chunksize: int = 64):
+    """Yield (filepath, result, error) for files, in input order.
+
+    With jobs > 1 the files are read and parsed in a process pool; results
+    are yielded as soon as they (and everything before them) are done.
+    """
+    work = functools.partial(_parse_file, default_source=default_source)
+    if jobs <= 1:
+        yield from map(work, files)
+        return
+    with multiprocessing.Pool(jobs) as pool:
+        yield from pool.imap(work, files, chunksize)
+
+
+class ResultWriter:
+    """Writes results as they arrive: a JSON array (json.dump indent=2 layout) or NDJSON."""
+
+    def __init__(self, f, ndjson: bool = False):
+        self.f = f
+        self.ndjson = ndjson
+        self.count = 0
+
+    def write(self, result: dict):
+        if self.ndjson:
+            self.f.write(json.dumps(result) + '\n')
+        else:
+            self.f.write(',\n' if self.count else '[\n')
+            self.f.write('\n'.join('  ' + line for line in json.dumps(result, indent=2).split('\n')))
+        self.count += 1
+
+    def close(self):
+        if not self.ndjson:
+            self.f.write('\n]' if self.count else '[]')
+        self.f.flush()
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('input', nargs='+', help='Input directories or files')
     parser.add_argument('--source', default='Custom', help='Default source name')
-    parser.add_argument('output', help='Output JSON file')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Parser processes (0 = one per CPU; default: 1, in-process)')
+    parser.add_argument('--ndjson', action='store_true',
+                        help='Write one JSON object per line instead of a JSON array '
+                             '(default for .ndjson/.jsonl outputs)')
+    parser.add_argument('--progress-interval', type=float, default=1.0,
+                        help='Seconds between progress lines (default: 1)')
+    parser.add_argument('output', help="Output JSON file ('-' for stdout)")
     args = parser.parse_args()
 
-    results = []
     files = []
     for path in args.input:
         if os.path.isdir(path):
@@ -472,21 +528,37 @@ def main():
         else:
             files.append(path)
 
-    print(f"\tFound {len(files)} .songdta_ps4 files to process...")
-    
-    for i, filepath in enumerate(files):
-        print(f"\t[{i+1}/{len(files)}] Processing {os.path.basename(filepath)}...")
-        try:
-            result = parse_songdta(filepath, args.source)
-            results.append(result)
-        except Exception as e:
-            print(f"\tERROR parsing {filepath}: {e}", file=sys.stderr)
-
-    print(f"\tDone. Extracted {len(results)} songs.")
-    print(f"\tWriting to {args.output}...")
-    with open(args.output, 'w') as f:
-        json.dump(results, f, indent=2)
-    print("\tDone!")
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    jobs = min(jobs, max(len(files), 1))
+    ndjson = args.ndjson or args.output.endswith(('.ndjson', '.jsonl'))
+    # Progress goes to stderr when the results are streamed to stdout
+    log = sys.stderr if args.output == '-' else sys.stdout
+
+    print(f"\tFound {len(files)} .songdta_ps4 files to process"
+          f"{f' with {jobs} processes' if jobs > 1 else ''}...", file=log)
+    print(f"\tWriting to {args.output}...", file=log)
+
+    out = sys.stdout if args.output == '-' else open(args.output, 'w')
+    writer = ResultWriter(out, ndjson)
+    start = last_progress = time.monotonic()
+    try:
+        for i, (filepath, result, error) in enumerate(iter_parsed(files, args.source, jobs), 1):
+            if error is not None:
+                print(f"\tERROR parsing {filepath}: {error}", file=sys.stderr)
+            else:
+                writer.write(result)
+            now = time.monotonic()
+            if now - last_progress >= args.progress_interval or i == len(files):
+                last_progress = now
+                print(f"\t[{i}/{len(files)}] Processing {os.path.basename(filepath)}... "
+                      f"({i / max(now - start, 1e-9):,.0f} files/s)", file=log)
+        writer.close()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(f"\tDone. Extracted {writer.count} songs.", file=log)
+    print("\tDone!", file=log)
 
 
 if __name__ == '__main__':
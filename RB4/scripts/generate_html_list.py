@@ -20,8 +20,24 @@ INSTRUMENT_ICONS = {
     'real_keys': '🎹',
 }
 
-def generate_html(metadata_dir, output_file, page_title=None):
-    """Generate HTML file from metadata directory."""
+CONFIG_PATH = '/workspace/.devcontainer/rb4_dlc_config.sh'
+
+def load_page_title(title=None):
+    """Page title: the given one, else HTML_PAGE_TITLE from the devcontainer config, else None."""
+    if not title and os.path.exists(CONFIG_PATH):
+        with open(CONFIG_PATH) as f:
+            for line in f:
+                if line.startswith('HTML_PAGE_TITLE='):
+                    title = line.split('=', 1)[1].strip().strip('"')
+                    break
+    return title
+
+def generate_html(metadata_dir, output_file, page_title=None, songs=None):
+    """Generate HTML file from metadata directory.
+    
+    songs: already-loaded catalog (get_songs_with_fallback output) to render
+    instead of re-reading metadata_dir; it is not modified.
+    """
     
     if page_title is None:
         page_title = DEFAULT_HTML_PAGE_TITLE
@@ -43,14 +59,15 @@ def generate_html(metadata_dir, output_file, page_title=None):
     except:
         last_updated = now.strftime('%A, %B %d, %Y at %I:%M %p')
     
-    baseline = load_empty_songs_baseline()
-    songs = get_songs_with_fallback(metadata_dir, baseline)
+    if songs is None:
+        songs = get_songs_with_fallback(metadata_dir, load_empty_songs_baseline())
     
     # Also load and merge baseline songs (rb4songlistWithRivals.txt)
     baseline_file = '/workspace/RB4/rb4songlistWithRivals.txt'
     baseline_songs = []
     if os.path.exists(baseline_file):
         import re
+        extracted_keys = {f"{s.get('artist','')}|{s.get('title','')}".lower() for s in songs}
         with open(baseline_file, 'r') as f:
             for line in f:
                 line = line.strip()
@@ -64,7 +81,7 @@ def generate_html(metadata_dir, output_file, page_title=None):
                     year = int(m.group(4))
                     # Check if this song already exists in extracted songs
                     key = f"{artist}|{title}".lower()
-                    exists = any(f"{s.get('artist','')}|{s.get('title','')}".lower() == key for s in songs)
+                    exists = key in extracted_keys
                     if not exists:
                         # Extract source name (e.g., "Rock Band 4 v1.00") - after the last " - "
                         line_parts = line.split(' - ')
@@ -93,7 +110,7 @@ def generate_html(metadata_dir, output_file, page_title=None):
         duration_str = f"{duration_sec // 60}:{duration_sec % 60:02d}" if duration_sec else ""
         
         # Get instrument list first
-        inst_list = s.get("instrumentList", []) or []
+        inst_list = list(s.get("instrumentList", []) or [])  # copy: harmony parts are appended below
         
         # Handle baseline songs (from_baseline flag) or inferred songs with limited instruments
         is_inferred = s.get("inferred")
@@ -416,25 +433,23 @@ def generate_html(metadata_dir, output_file, page_title=None):
 </body>
 </html>'''
     
-    with open(output_file, 'w') as f:
+    # Temp file + rename, so the page is never served half-written
+    tmp_path = f"{output_file}.tmp"
+    with open(tmp_path, 'w') as f:
         f.write(html)
+    os.replace(tmp_path, output_file)
     print(f"Generated: {output_file}")
 
-if __name__ == '__main__':
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Generate HTML song list')
     parser.add_argument('metadata_dir', help='Directory with metadata JSON files')
     parser.add_argument('output_html', help='Output HTML file')
     parser.add_argument('--title', default=None, help='HTML page title')
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
     # Load config for custom title
-    config_path = '/workspace/.devcontainer/rb4_dlc_config.sh'
-    title = args.title
-    if not title and os.path.exists(config_path):
-        with open(config_path) as f:
-            for line in f:
-                if line.startswith('HTML_PAGE_TITLE='):
-                    title = line.split('=', 1)[1].strip().strip('"')
-                    break
-    
-    generate_html(args.metadata_dir, args.output_html, title)
\ No newline at end of file
+    generate_html(args.metadata_dir, args.output_html, load_page_title(args.title))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
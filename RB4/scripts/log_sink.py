@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Buffered log sink for the RB4 pipeline.
+
+log() used to open and close the log file for every line, including every
+streamed line of PkgTool.Core output. LogSink keeps the files open on one
+background thread and writes queued lines in batches, flushing on a timer
+(every flush_interval seconds), when a batch fills up, and on close().
+
+Two outputs:
+
+    <name>.log            the human-readable stream (same text as the console,
+                          with ANSI colour codes stripped)
+    <name>.events.jsonl   structured events, one JSON object per line:
+                          {"ts": ..., "elapsed": <s since start>, "event": "stage",
+                           "stage": "parse", "pkg": "...", "seconds": 0.01, "bytes": 1265}
+
+Console output is still printed immediately by the caller so it stays in
+order with other prints and progress bars.
+"""
+
+import json
+import os
+import queue
+import re
+import threading
+import time
+from datetime import datetime
+
+_STOP = object()
+_ANSI = re.compile(r'\x1b\[[0-9;]*m')
+
+
+def events_file_for(log_file):
+    """Events path next to a log file: run.log -> run.events.jsonl."""
+    return f"{os.path.splitext(log_file)[0]}.events.jsonl"
+
+
+class LogSink:
+    """Queue-backed writer for the text log and the JSON-lines event log."""
+
+    def __init__(self, log_file=None, events_file=None, flush_interval=1.0, batch_size=500):
+        self.log_file = log_file
+        self.events_file = events_file
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._start = time.monotonic()
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name='log-sink', daemon=True)
+        self._closed = False
+        self._thread.start()
+
+    def line(self, msg):
+        """Queue one line of human-readable log text."""
+        self._queue.put((False, msg))
+
+    def event(self, name, **fields):
+        """Queue a structured event."""
+        record = {'ts': datetime.now().isoformat(timespec='milliseconds'),
+                  'elapsed': round(time.monotonic() - self._start, 3), 'event': name}
+        record.update(fields)
+        self._queue.put((True, record))
+
+    def _run(self):
+        log_f = open(self.log_file, 'a', encoding='utf-8') if self.log_file else None
+        events_f = open(self.events_file, 'a', encoding='utf-8') if self.events_file else None
+        lines, events = [], []
+        deadline = time.monotonic() + self.flush_interval
+        stopping = False
+        try:
+            while not stopping:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    item = None
+                if item is _STOP:
+                    stopping = True
+                elif item is not None:
+                    is_event, payload = item
+                    if is_event:
+                        events.append(json.dumps(payload, default=str))
+                    else:
+                        lines.append(_ANSI.sub('', payload))
+                    if len(lines) + len(events) < self.batch_size:
+                        continue
+                # Timer expired, batch full or stopping: write what we have
+                if log_f and lines:
+                    log_f.write('\n'.join(lines) + '\n')
+                    log_f.flush()
+                if events_f and events:
+                    events_f.write('\n'.join(events) + '\n')
+                    events_f.flush()
+                lines, events = [], []
+                deadline = time.monotonic() + self.flush_interval
+        finally:
+            for f in (log_f, events_f):
+                if f:
+                    f.close()
+
+    def close(self):
+        """Flush everything queued and stop the writer (safe to call twice)."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
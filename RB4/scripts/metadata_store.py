@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Consolidated, indexed store for the per-PKG metadata_*.json files.
+
+Loading the song catalog used to glob output/PkgMetadataExtracted and
+json-parse every file, from the pipeline and again from the HTML generator.
+MetadataStore keeps the same data in one SQLite file (metadata_store.sqlite,
+inside the metadata directory):
+
+    pkgs   one row per metadata_<pkg>.json: file name, size, mtime_ns and the
+           file's song list as JSON
+    songs  one row per song: pkg, position, songId, shortName and
+           lower-cased artist/title, indexed for lookups
+
+The JSON files stay the interchange format (the pipeline writes them, the
+backup/restore scripts copy them). sync() compares them against the store by
+size and mtime with one scandir and re-imports only files that changed, so a
+full load is a directory listing plus one sequential table read, and
+lookups by songId, shortName or (artist, title) use the indexes.
+
+Usage:
+    python3 metadata_store.py <metadata_dir> [--song-id N | --short-name S | --artist A --title T]
+"""
+
+import json
+import os
+import sqlite3
+
+STORE_FILENAME = 'metadata_store.sqlite'
+_PREFIX = 'metadata_'
+_SUFFIX = '.json'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pkgs (
+    file TEXT PRIMARY KEY,
+    pkg TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    songs TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS songs (
+    pkg TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    song_id INTEGER,
+    short_name TEXT,
+    artist_key TEXT,
+    title_key TEXT,
+    PRIMARY KEY (pkg, seq)
+);
+CREATE INDEX IF NOT EXISTS songs_song_id ON songs (song_id);
+CREATE INDEX IF NOT EXISTS songs_short_name ON songs (short_name);
+CREATE INDEX IF NOT EXISTS songs_artist_title ON songs (artist_key, title_key);
+"""
+
+
+def pkg_from_metadata_file(filename):
+    """metadata_<pkg>.json -> <pkg> (same rule get_songs_with_fallback has always used)."""
+    return filename.replace(_PREFIX, '').replace(_SUFFIX, '')
+
+
+def _key(text):
+    return (text or '').strip().lower()
+
+
+class MetadataStore:
+    """SQLite index over a directory of metadata_*.json files."""
+
+    def __init__(self, metadata_dir, db_path=None):
+        self.metadata_dir = metadata_dir
+        self.db_path = db_path or os.path.join(metadata_dir, STORE_FILENAME)
+        self.db = sqlite3.connect(self.db_path)
+        self.db.executescript(_SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def sync(self):
+        """Import new/changed metadata JSONs and drop removed ones. Returns (imported, removed)."""
+        on_disk = {}
+        with os.scandir(self.metadata_dir) as it:
+            for entry in it:
+                if entry.name.startswith(_PREFIX) and entry.name.endswith(_SUFFIX) and entry.is_file():
+                    st = entry.stat()
+                    on_disk[entry.name] = (st.st_size, st.st_mtime_ns)
+        known = {file: (size, mtime) for file, size, mtime in self.db.execute('SELECT file, size, mtime_ns FROM pkgs')}
+
+        changed = [f for f, stat in on_disk.items() if known.get(f) != stat]
+        removed = [f for f in known if f not in on_disk]
+        if not changed and not removed:
+            return 0, 0
+        with self.db:
+            for file in removed:
+                self._delete(file)
+            for file in changed:
+                with open(os.path.join(self.metadata_dir, file)) as f:
+                    songs = json.load(f)
+                self._delete(file)
+                pkg = pkg_from_metadata_file(file)
+                size, mtime = on_disk[file]
+                self.db.execute('INSERT INTO pkgs VALUES (?, ?, ?, ?, ?)',
+                                (file, pkg, size, mtime, json.dumps(songs, separators=(',', ':'))))
+                self.db.executemany('INSERT INTO songs VALUES (?, ?, ?, ?, ?, ?)', [
+                    (pkg, seq, song.get('songId'), song.get('shortName') or None,
+                     _key(song.get('artist')), _key(song.get('title')))
+                    for seq, song in enumerate(songs)])
+        return len(changed), len(removed)
+
+    def _delete(self, file):
+        row = self.db.execute('SELECT pkg FROM pkgs WHERE file = ?', (file,)).fetchone()
+        if row:
+            self.db.execute('DELETE FROM songs WHERE pkg = ?', (row[0],))
+            self.db.execute('DELETE FROM pkgs WHERE file = ?', (file,))
+
+    def load_all(self):
+        """Every song, tagged with _pkg_file, in metadata file name order."""
+        songs = []
+        for _file, pkg, data in sorted(self.db.execute('SELECT file, pkg, songs FROM pkgs')):
+            for song in json.loads(data):
+                song['_pkg_file'] = pkg
+                songs.append(song)
+        return songs
+
+    def _fetch(self, where, params):
+        rows = self.db.execute(
+            f'SELECT s.pkg, s.seq, p.songs FROM songs s JOIN pkgs p ON p.pkg = s.pkg WHERE {where} '
+            'ORDER BY s.pkg, s.seq', params).fetchall()
+        found = []
+        for pkg, seq, data in rows:
+            song = json.loads(data)[seq]
+            song['_pkg_file'] = pkg
+            found.append(song)
+        return found
+
+    def by_song_id(self, song_id):
+        return self._fetch('s.song_id = ?', (song_id,))
+
+    def by_short_name(self, short_name):
+        return self._fetch('s.short_name = ?', (short_name,))
+
+    def by_artist_title(self, artist, title):
+        return self._fetch('s.artist_key = ? AND s.title_key = ?', (_key(artist), _key(title)))
+
+    def stats(self):
+        pkgs, = self.db.execute('SELECT COUNT(*) FROM pkgs').fetchone()
+        songs, = self.db.execute('SELECT COUNT(*) FROM songs').fetchone()
+        return {'pkgs': pkgs, 'songs': songs}
+
+
+def load_metadata_songs(metadata_dir):
+    """All songs from metadata_dir via the store, or by reading every JSON if SQLite is unusable."""
+    try:
+        with MetadataStore(metadata_dir) as store:
+            store.sync()
+            return store.load_all()
+    except (sqlite3.Error, OSError):
+        pass  # e.g. read-only metadata dir
+    songs = []
+    for name in sorted(n for n in os.listdir(metadata_dir) if n.startswith(_PREFIX) and n.endswith(_SUFFIX)):
+        with open(os.path.join(metadata_dir, name)) as f:
+            loaded = json.load(f)
+        for song in loaded:
+            song['_pkg_file'] = pkg_from_metadata_file(name)
+        songs.extend(loaded)
+    return songs
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Query the consolidated RB4 metadata store')
+    parser.add_argument('metadata_dir', help='Directory with metadata_*.json files')
+    parser.add_argument('--song-id', type=int, help='Find songs by songId')
+    parser.add_argument('--short-name', help='Find songs by shortName')
+    parser.add_argument('--artist', help='Find songs by artist (with --title)')
+    parser.add_argument('--title', help='Find songs by title (with --artist)')
+    args = parser.parse_args(argv)
+
+    with MetadataStore(args.metadata_dir) as store:
+        imported, removed = store.sync()
+        print(f"Store: {store.db_path} ({imported} file(s) imported, {removed} removed)")
+        if args.song_id is not None:
+            found = store.by_song_id(args.song_id)
+        elif args.short_name:
+            found = store.by_short_name(args.short_name)
+        elif args.artist and args.title:
+            found = store.by_artist_title(args.artist, args.title)
+        else:
+            stats = store.stats()
+            print(f"{stats['pkgs']} PKGs, {stats['songs']} songs")
+            return 0
+    for song in found:
+        print(f"{song.get('artist')} - {song.get('title')} [{song.get('shortName')}] <{song['_pkg_file']}>")
+    return 0 if found else 1
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Background writer for per-PKG metadata JSON files.
+
+Parsing happens in-process, so the metadata_<pkg>.json files are only a cache
+for later runs (--reprocess-cached-metadata, the HTML generator). Writing them
+on a background thread keeps JSON encoding and disk I/O off the extraction
+path. Each file is written to a temp name and renamed into place, so readers
+never see a half-written file. close() drains the queue before returning.
+"""
+
+import json
+import os
+import queue
+import threading
+
+_STOP = object()
+
+
+def write_json_atomic(path, data, indent=2):
+    """Write data as JSON to path via a temp file + os.replace."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=indent)
+    os.replace(tmp_path, path)
+
+
+class MetadataWriter:
+    """Queue-backed JSON writer running on one daemon thread."""
+
+    def __init__(self, max_pending=64):
+        self._queue = queue.Queue(maxsize=max_pending)
+        self.written = 0
+        self.errors = []  # (path, exception)
+        self._thread = threading.Thread(target=self._run, name='metadata-writer', daemon=True)
+        self._thread.start()
+
+    def write(self, path, songs):
+        """Queue songs for writing to path (shallow copies, so callers may keep tagging them)."""
+        self._queue.put((path, [dict(s) for s in songs]))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                path, songs = item
+                write_json_atomic(path, songs)
+                self.written += 1
+            except Exception as e:
+                self.errors.append((item[0], e))
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Block until every queued file has been written."""
+        self._queue.join()
+
+    def close(self):
+        """Write everything still queued and stop the thread."""
+        self._queue.put(_STOP)
+        self._thread.join()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Per-PKG performance records and run report.
+
+PerfRecorder collects, for every PKG in a run: its size, the seconds spent
+in each stage (fetch, pkg_read, inner_extract, pfs_extract, parse, cleanup),
+the bytes written to the temp directory and the number of songs extracted.
+At the end of the extraction phase the generator:
+
+    - writes a per-run report next to the log file (rb4_extract_<ts>.perf.json)
+    - appends one line per PKG to <temp_dir>/perf_history.jsonl
+    - prints a summary: MB/s, songs/min, per-stage totals, the slowest PKGs and
+      PKGs that got markedly slower than in previous runs
+
+A PKG counts as a regression when it took more than REGRESSION_FACTOR times
+the median of its previous successful runs (same name and size) and at least
+REGRESSION_MIN_SECONDS longer.
+
+Usage (summarise an existing history without running the pipeline):
+    python3 perf_report.py rb4_temp/perf_history.jsonl [--top 10]
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from statistics import median
+
+MB = 1024 * 1024
+REGRESSION_FACTOR = 2.0
+REGRESSION_MIN_SECONDS = 5.0
+STAGE_ORDER = ('fetch', 'pkg_read', 'inner_extract', 'pfs_extract', 'parse', 'cleanup')
+
+
+class PerfRecorder:
+    """Thread-safe collector of per-PKG timings for one run."""
+
+    def __init__(self):
+        self.pkgs = {}  # pkg name -> record
+        self.started = datetime.now()
+        self._lock = threading.Lock()
+
+    def _record(self, pkg):
+        record = self.pkgs.get(pkg)
+        if record is None:
+            record = self.pkgs[pkg] = {'pkg': pkg, 'status': None, 'size': None, 'seconds': None,
+                                       'songs': 0, 'written': 0, 'stages': {}}
+        return record
+
+    def stage(self, pkg, stage, seconds, written=None):
+        """Add time spent by pkg in stage (and bytes it wrote to temp)."""
+        with self._lock:
+            record = self._record(pkg)
+            record['stages'][stage] = round(record['stages'].get(stage, 0.0) + seconds, 3)
+            record['written'] += written or 0
+
+    def pkg_done(self, pkg, status, size=None, seconds=None, songs=0):
+        with self._lock:
+            record = self._record(pkg)
+            record.update(status=status, size=size, songs=songs or 0,
+                          seconds=round(seconds, 3) if seconds is not None else None)
+
+    def records(self):
+        with self._lock:
+            return [dict(r, stages=dict(r['stages'])) for r in self.pkgs.values() if r['status']]
+
+
+def load_history(history_file):
+    """Previous records grouped by PKG name (torn lines are skipped)."""
+    history = {}
+    if not history_file or not os.path.exists(history_file):
+        return history
+    with open(history_file, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            history.setdefault(record.get('pkg'), []).append(record)
+    return history
+
+
+def append_history(history_file, records, run_id):
+    with open(history_file, 'a', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(dict(record, run=run_id)) + '\n')
+
+
+def find_regressions(records, history):
+    """[(record, baseline_seconds)] for PKGs much slower than their previous runs."""
+    regressions = []
+    for record in records:
+        if record['status'] != 'done' or not record['seconds']:
+            continue
+        previous = [r['seconds'] for r in history.get(record['pkg'], [])
+                    if r.get('status') == 'done' and r.get('seconds') and r.get('size') == record['size']]
+        if not previous:
+            continue
+        baseline = median(previous)
+        if (record['seconds'] > baseline * REGRESSION_FACTOR and
+                record['seconds'] - baseline >= REGRESSION_MIN_SECONDS):
+            regressions.append((record, baseline))
+    return sorted(regressions, key=lambda item: item[0]['seconds'] - item[1], reverse=True)
+
+
+def _rate(nbytes, seconds):
+    return f"{nbytes / MB / seconds:,.1f} MB/s" if seconds and nbytes else "-"
+
+
+def summarize(records, wall_seconds, history=None, top=5):
+    """Human-readable summary lines for a run."""
+    done = [r for r in records if r['status'] == 'done']
+    total_bytes = sum(r['size'] or 0 for r in done)
+    total_songs = sum(r['songs'] for r in done)
+    lines = [
+        f"PKGs: {len(done)} done, {len(records) - len(done)} failed in {wall_seconds:,.1f}s",
+        f"Throughput: {total_bytes / MB:,.1f} MB at {_rate(total_bytes, wall_seconds)}, "
+        f"{total_songs / (wall_seconds / 60):,.1f} songs/min" if wall_seconds else "Throughput: -",
+        f"Temp bytes written: {sum(r['written'] for r in records) / MB:,.1f} MB",
+    ]
+
+    stage_totals = {}
+    for r in records:
+        for stage, seconds in r['stages'].items():
+            stage_totals[stage] = stage_totals.get(stage, 0.0) + seconds
+    if stage_totals:
+        ordered = sorted(stage_totals, key=lambda s: STAGE_ORDER.index(s) if s in STAGE_ORDER else len(STAGE_ORDER))
+        lines.append("Stage time: " + ", ".join(f"{s} {stage_totals[s]:,.1f}s" for s in ordered))
+
+    slowest = sorted((r for r in records if r['seconds']), key=lambda r: r['seconds'], reverse=True)[:top]
+    if slowest:
+        lines.append(f"Slowest {len(slowest)} PKGs:")
+        for r in slowest:
+            worst = max(r['stages'], key=r['stages'].get) if r['stages'] else '-'
+            lines.append(f"  {r['seconds']:>8,.1f}s  {(r['size'] or 0) / MB:>9,.1f} MB  "
+                         f"{_rate(r['size'] or 0, r['seconds']):>12}  {worst:<13} {r['pkg']}")
+
+    if history:
+        regressions = find_regressions(records, history)
+        if regressions:
+            lines.append(f"Slower than previous runs ({len(regressions)}):")
+            for r, baseline in regressions[:top]:
+                lines.append(f"  {r['seconds']:>8,.1f}s (was ~{baseline:,.1f}s)  {r['pkg']}")
+    return lines
+
+
+def write_report(report_file, records, summary_lines, wall_seconds, run_id):
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump({'run': run_id, 'wall_seconds': round(wall_seconds, 3),
+                   'summary': summary_lines, 'pkgs': records}, f, indent=2)
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Summarise RB4 per-PKG performance history')
+    parser.add_argument('history', help='perf_history.jsonl')
+    parser.add_argument('--top', type=int, default=10, help='Number of slowest PKGs to show (default: 10)')
+    args = parser.parse_args(argv)
+
+    history = load_history(args.history)
+    runs = {}
+    for records in history.values():
+        for r in records:
+            runs.setdefault(r.get('run'), []).append(r)
+    if not runs:
+        print("No history yet")
+        return 1
+    last_run = max(run for run in runs if run)
+    previous = {}
+    for run, records in runs.items():
+        if run != last_run:
+            for r in records:
+                previous.setdefault(r['pkg'], []).append(r)
+    records = runs[last_run]
+    wall = sum(r.get('seconds') or 0 for r in records)
+    print(f"Run {last_run} (wall time approximated by the sum of PKG times)")
+    for line in summarize(records, wall, previous, top=args.top):
+        print(line)
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
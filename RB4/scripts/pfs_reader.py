@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+pfs_reader.py — Minimal read-only PS4 PFS reader.
+
+Reads the directory tree of an (unencrypted) PFS image such as the inner.pfs
+written by `PkgTool.Core pkg_extractinnerpfs`, and pulls individual files out
+of it without extracting the whole image. The pipeline uses it to read just
+the .songdta_ps4 files instead of running `PkgTool.Core pfs_extract`, which
+writes every audio/asset file to disk.
+
+Layout (from LibOrbisPkg's PfsHeader/inode/PfsDirent):
+
+    block 0               header (magic 20130315, block size, inode counts, superroot ino)
+    blocks 1..N           inode table, packed per block (never crossing a block)
+    superroot inode       directory containing "flat_path_table" and "uroot"
+    uroot inode           the real root directory
+    directory blocks      dirents: ino u32, type i32, name_len i32, ent_size i32, name
+
+File data is stored contiguously from the inode's first direct block, the same
+assumption PkgTool makes. Encrypted images, compressed (PFSC) files and inode
+layouts other than D32/S32/S64 raise PfsFormatError so callers can fall back
+to PkgTool.
+
+Usage:
+    python3 pfs_reader.py <inner.pfs> [--suffix .songdta_ps4] [--extract <dir>]
+"""
+
+import mmap
+import os
+import struct
+import sys
+
+PFS_MAGIC = 20130315
+
+# PfsMode flags
+MODE_SIGNED = 0x1
+MODE_64BIT = 0x2
+MODE_ENCRYPTED = 0x4
+
+# Inode mode / flags
+INODE_MODE_DIR = 0x4000
+INODE_MODE_FILE = 0x8000
+INODE_FLAG_COMPRESSED = 0x1
+
+# Dirent types
+DIRENT_FILE = 2
+DIRENT_DIR = 3
+DIRENT_DOT = 4
+DIRENT_DOTDOT = 5
+
+_HEADER = struct.Struct('<qqqBBBBHHIIqqqqq')
+_INODE_HEAD = struct.Struct('<HHIqq4q4I2I2QI')  # 0x64 bytes
+_DIRENT = struct.Struct('<Iiii')
+
+# (signed, 64-bit) -> (inode size, offset of db[0] block number, block number format)
+_INODE_LAYOUTS = {
+    (False, False): (0xA8, 0x64, '<i'),        # DinodeD32
+    (True, False): (0x2C8, 0x64 + 32, '<i'),   # DinodeS32: 32-byte signature before each block
+    (True, True): (0x310, 0x64 + 32, '<q'),    # DinodeS64
+}
+
+
+class PfsFormatError(Exception):
+    """The image uses a PFS feature this reader does not handle."""
+
+
+class PfsInode:
+    __slots__ = ('ino', 'mode', 'flags', 'size', 'size_compressed', 'blocks', 'start_block')
+
+    def __init__(self, ino, mode, flags, size, size_compressed, blocks, start_block):
+        self.ino = ino
+        self.mode = mode
+        self.flags = flags
+        self.size = size
+        self.size_compressed = size_compressed
+        self.blocks = blocks
+        self.start_block = start_block
+
+    @property
+    def is_dir(self):
+        return bool(self.mode & INODE_MODE_DIR)
+
+
+class PfsEntry:
+    """A file or directory found while walking the image."""
+    __slots__ = ('path', 'name', 'inode')
+
+    def __init__(self, path, name, inode):
+        self.path = path
+        self.name = name
+        self.inode = inode
+
+    @property
+    def is_dir(self):
+        return self.inode.is_dir
+
+    @property
+    def size(self):
+        return self.inode.size
+
+    def __repr__(self):
+        return f"PfsEntry({self.path!r}, size={self.size})"
+
+
+class PfsReader:
+    """Random-access reader over a PFS image held in any sliceable buffer.
+
+    Args:
+        image: bytes, memoryview, mmap, or any object supporting len() and
+               slicing that returns bytes-like data
+        offset: Byte offset of the PFS header inside image
+    """
+
+    def __init__(self, image, offset=0):
+        self.image = image
+        self.offset = offset
+        self._mmap = None
+        self._file = None
+
+        header = bytes(self._read(0, _HEADER.size))
+        if len(header) < _HEADER.size:
+            raise PfsFormatError("image too small for a PFS header")
+        (self.version, magic, self.id, self.fmode, self.clean, self.read_only, _rsv,
+         self.mode, _unk1, self.block_size, _nbackup, self.nblock, self.dinode_count,
+         self.ndblock, self.dinode_block_count, self.superroot_ino) = _HEADER.unpack(header)
+
+        if magic != PFS_MAGIC:
+            raise PfsFormatError(f"bad PFS magic {magic}")
+        if self.mode & MODE_ENCRYPTED:
+            raise PfsFormatError("encrypted PFS images are not supported")
+        layout = _INODE_LAYOUTS.get((bool(self.mode & MODE_SIGNED), bool(self.mode & MODE_64BIT)))
+        if layout is None:
+            raise PfsFormatError(f"unsupported inode layout (mode 0x{self.mode:x})")
+        if not self.block_size or self.block_size & (self.block_size - 1):
+            raise PfsFormatError(f"bad block size {self.block_size}")
+        self._inode_size, self._db_offset, db_fmt = layout
+        self._db = struct.Struct(db_fmt)
+        self._inodes = self._read_inodes()
+
+    @classmethod
+    def open(cls, path):
+        """Open a PFS image file via mmap (nothing is read until it is needed)."""
+        f = open(path, 'rb')
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            f.close()
+            raise PfsFormatError(f"cannot map {path}")
+        try:
+            reader = cls(mm)
+        except Exception:
+            mm.close()
+            f.close()
+            raise
+        reader._mmap, reader._file = mm, f
+        return reader
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+            self._mmap = self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _read(self, pos, size):
+        start = self.offset + pos
+        return self.image[start:start + size]
+
+    def _read_inodes(self):
+        per_block = self.block_size // self._inode_size
+        inodes = []
+        for block in range(self.dinode_block_count):
+            data = bytes(self._read(self.block_size * (1 + block), self.block_size))
+            for i in range(per_block):
+                if len(inodes) >= self.dinode_count:
+                    return inodes
+                pos = i * self._inode_size
+                if pos + self._inode_size > len(data):
+                    raise PfsFormatError("inode table truncated")
+                head = _INODE_HEAD.unpack_from(data, pos)
+                mode, _nlink, flags, size, size_compressed = head[:5]
+                blocks = head[-1]
+                start_block = self._db.unpack_from(data, pos + self._db_offset)[0]
+                inodes.append(PfsInode(len(inodes), mode, flags, size, size_compressed, blocks, start_block))
+        return inodes
+
+    def _inode(self, ino):
+        if ino >= len(self._inodes):
+            raise PfsFormatError(f"inode {ino} out of range")
+        return self._inodes[ino]
+
+    def _dirents(self, inode):
+        """Yield (name, type, ino) for a directory inode."""
+        for b in range(inode.blocks):
+            block = bytes(self._read((inode.start_block + b) * self.block_size, self.block_size))
+            pos = 0
+            while pos + _DIRENT.size <= len(block):
+                ino, dtype, name_len, ent_size = _DIRENT.unpack_from(block, pos)
+                if ent_size <= 0:
+                    break
+                name = block[pos + _DIRENT.size:pos + _DIRENT.size + name_len].decode('utf-8', errors='replace')
+                yield name, dtype, ino
+                pos += ent_size
+
+    def root(self):
+        """The uroot directory inode (the image's visible root)."""
+        superroot = self._inode(self.superroot_ino)
+        for name, dtype, ino in self._dirents(superroot):
+            if name == 'uroot':
+                return self._inode(ino)
+        raise PfsFormatError("no uroot directory in superroot")
+
+    def walk(self):
+        """Yield every PfsEntry below uroot (depth-first, paths use '/')."""
+        stack = [('', self.root())]
+        seen = set()
+        while stack:
+            prefix, dir_inode = stack.pop()
+            if dir_inode.ino in seen:
+                continue
+            seen.add(dir_inode.ino)
+            for name, dtype, ino in self._dirents(dir_inode):
+                if dtype in (DIRENT_DOT, DIRENT_DOTDOT) or name in ('.', '..'):
+                    continue
+                entry = PfsEntry(f"{prefix}{name}", name, self._inode(ino))
+                yield entry
+                if entry.is_dir:
+                    stack.append((entry.path + '/', entry.inode))
+
+    def find(self, suffix):
+        """All file entries whose name ends with suffix."""
+        return [e for e in self.walk() if not e.is_dir and e.name.endswith(suffix)]
+
+    def read_file(self, entry):
+        """Read a file's bytes straight from its data blocks."""
+        inode = entry.inode
+        if inode.flags & INODE_FLAG_COMPRESSED:
+            raise PfsFormatError(f"{entry.path} is PFSC-compressed")
+        if inode.size > inode.blocks * self.block_size:
+            raise PfsFormatError(f"{entry.path} spans more blocks than allocated")
+        data = self._read(inode.start_block * self.block_size, inode.size)
+        if len(data) != inode.size:
+            raise PfsFormatError(f"{entry.path} extends past end of image")
+        return bytes(data)
+
+    def read_files(self, suffix):
+        """Return [(inner_path, bytes)] for every file ending with suffix."""
+        return [(entry.path, self.read_file(entry)) for entry in self.find(suffix)]
+
+
+def read_files_with_suffix(pfs_path, suffix='.songdta_ps4'):
+    """Return [(inner_path, bytes)] for every file in a PFS image ending with suffix."""
+    with PfsReader.open(pfs_path) as reader:
+        return reader.read_files(suffix)
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='List or extract files from a PS4 PFS image')
+    parser.add_argument('image', help='PFS image (e.g. inner.pfs from pkg_extractinnerpfs)')
+    parser.add_argument('--suffix', default='', help='Only files ending with this suffix')
+    parser.add_argument('--extract', metavar='DIR', help='Write matching files under DIR')
+    args = parser.parse_args(argv)
+
+    with PfsReader.open(args.image) as reader:
+        entries = [e for e in reader.walk() if not e.is_dir and e.name.endswith(args.suffix)]
+        for entry in entries:
+            print(f"{entry.size:>12}  {entry.path}")
+            if args.extract:
+                out_path = os.path.join(args.extract, *entry.path.split('/'))
+                os.makedirs(os.path.dirname(out_path), exist_ok=True)
+                with open(out_path, 'wb') as f:
+                    f.write(reader.read_file(entry))
+        print(f"{len(entries)} file(s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Staged PKG pipeline: stages connected by bounded queues.
+
+Each stage runs on its own worker thread(s) and hands jobs to the next stage
+through a queue.Queue with a small maxsize, so a slow stage applies
+back-pressure instead of letting work pile up. With the RB4 stages
+
+    fetch → inner PFS extract → PFS extract → parse → cleanup → merge
+
+the next PKG downloads while the current one is being extracted.
+
+A job that fails in one stage keeps flowing (so later stages can skip it and
+cleanup still runs); stages marked run_on_error=True see failed jobs too.
+The final results are delivered on the calling thread (the "merge" step).
+
+Every stage keeps throughput counters (jobs, bytes, busy/idle time) that are
+printed at the end of a run.
+"""
+
+import queue
+import threading
+import time
+
+_STOP = object()
+
+
+class PkgJob:
+    """State for one PKG as it moves through the pipeline."""
+
+    def __init__(self, pkg_name, label='', size_hint=None):
+        self.pkg_name = pkg_name
+        self.label = label
+        self.size_hint = size_hint
+        self.pkg_path = None        # local path once fetched (stays None if read remotely)
+        self.source = None
+        self.work_dir = None
+        self.pfs_file = None
+        self.pfs_extract_dir = None
+        self.songdta_files = []
+        self.songs = None
+        self.reserved_bytes = 0
+        self.bytes = 0              # bytes handled by the most recent stage
+        self.error = None
+        self.failed_stage = None
+        self.skipped = False        # e.g. fetch failed: no songs, but not an extraction error
+        self.started = None         # perf_counter() when the first stage picked it up
+
+
+class StageStats:
+    """Throughput counters for one stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.jobs = 0
+        self.errors = 0
+        self.bytes = 0
+        self.busy_seconds = 0.0
+        self.idle_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, busy, idle, nbytes, failed):
+        with self._lock:
+            self.jobs += 1
+            self.errors += 1 if failed else 0
+            self.bytes += nbytes
+            self.busy_seconds += busy
+            self.idle_seconds += idle
+
+    def summary(self, workers=1):
+        mb = self.bytes / (1024 * 1024)
+        rate = f"{mb / self.busy_seconds:,.1f} MB/s" if self.busy_seconds and self.bytes else "-"
+        per_job = f"{self.busy_seconds / self.jobs:,.1f}s/job" if self.jobs else "-"
+        total = self.busy_seconds + self.idle_seconds
+        busy_pct = f"{100 * self.busy_seconds / total:.0f}% busy" if total else "idle"
+        return (f"{self.name:<14} {self.jobs:>4} jobs ({self.errors} failed) | {mb:>10,.1f} MB | "
+                f"{per_job:>12} | {rate:>12} | {busy_pct} x{workers}")
+
+
+class Stage:
+    """A named pipeline step: func(job) mutates the job in place."""
+
+    def __init__(self, name, func, workers=1, run_on_error=False):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.run_on_error = run_on_error
+        self.stats = StageStats(name)
+
+
+class StagedPipeline:
+    """Run jobs through stages connected by bounded queues."""
+
+    def __init__(self, stages, queue_depth=1):
+        self.stages = stages
+        self.queue_depth = max(1, queue_depth)
+
+    def _worker(self, stage, in_q, out_q, remaining, lock, next_workers):
+        while True:
+            wait_start = time.perf_counter()
+            job = in_q.get()
+            idle = time.perf_counter() - wait_start
+            if job is _STOP:
+                break
+            if (job.error is None and not job.skipped) or stage.run_on_error:
+                job.bytes = 0
+                start = time.perf_counter()
+                try:
+                    stage.func(job)
+                except Exception as e:
+                    if job.error is None:
+                        job.error = e
+                        job.failed_stage = stage.name
+                stage.stats.record(time.perf_counter() - start, idle, job.bytes,
+                                   job.failed_stage == stage.name)
+            out_q.put(job)
+
+        # Last worker of this stage out tells the next stage to stop
+        with lock:
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                for _ in range(next_workers):
+                    out_q.put(_STOP)
+
+    def run(self, jobs, on_result):
+        """Feed jobs through all stages; on_result(job) runs on this thread as each job finishes."""
+        queues = [queue.Queue(maxsize=self.queue_depth) for _ in self.stages]
+        results = queue.Queue(maxsize=self.queue_depth)
+        threads = []
+
+        for i, stage in enumerate(self.stages):
+            out_q = queues[i + 1] if i + 1 < len(self.stages) else results
+            next_workers = self.stages[i + 1].workers if i + 1 < len(self.stages) else 1
+            remaining, lock = [stage.workers], threading.Lock()
+            for n in range(stage.workers):
+                t = threading.Thread(target=self._worker, name=f"{stage.name}-{n}", daemon=True,
+                                     args=(stage, queues[i], out_q, remaining, lock, next_workers))
+                t.start()
+                threads.append(t)
+
+        def feed():
+            for job in jobs:
+                queues[0].put(job)
+            for _ in range(self.stages[0].workers):
+                queues[0].put(_STOP)
+
+        feeder = threading.Thread(target=feed, name="feeder", daemon=True)
+        feeder.start()
+
+        while True:
+            job = results.get()
+            if job is _STOP:
+                break
+            on_result(job)
+
+        for t in threads + [feeder]:
+            t.join()
+
+    def summary_lines(self):
+        return [stage.stats.summary(stage.workers) for stage in self.stages]
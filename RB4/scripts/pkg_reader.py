@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+pkg_reader.py — Read-only PS4 PKG container reader.
+
+Parses the PKG header, entry table and param.sfo, and exposes the PFS images
+inside the .pkg without writing them out first. `PkgTool.Core
+pkg_extractinnerpfs` copies the whole inner PFS to work_dir/inner.pfs before
+anything can be read; this reader instead maps the .pkg and hands pfs_reader
+a view at an offset inside it:
+
+    .pkg (mmap)
+      └─ outer PFS image       at header pfs_image_offset
+           └─ pfs_image.dat    the inner PFS (uroot with songs/, etc.)
+
+When pfs_image.dat is stored uncompressed the inner PfsReader reads straight
+from the mapping (zero copies). When it is PFSC-compressed, blocks are
+inflated on demand through PfscImage. Encrypted outer images (most retail
+and many fake PKGs) raise PfsFormatError/PkgFormatError so callers fall back
+to PkgTool.Core.
+
+Instead of mapping a local file, PkgReader can read any sliceable buffer,
+e.g. a byte_source.BlockCache over a PKG on the SMB share, so that only the
+header, entry table, PFS metadata and the wanted files are transferred.
+
+Header layout follows LibOrbisPkg's PkgHeader (all fields big-endian).
+
+Usage:
+    python3 pkg_reader.py <file.pkg> [--list] [--suffix .songdta_ps4]
+"""
+
+import mmap
+import struct
+import sys
+import zlib
+from collections import OrderedDict
+
+from pfs_reader import INODE_FLAG_COMPRESSED, PfsFormatError, PfsReader
+
+PKG_MAGIC = b'\x7fCNT'
+
+# Entry ids
+ENTRY_ENTRY_NAMES = 0x0200
+ENTRY_PARAM_SFO = 0x1000
+
+ENTRY_FLAG_ENCRYPTED = 0x80000000
+
+_HEADER = struct.Struct('>4sIIIIHHIIQQQQ')        # 0x00-0x40
+_CONTENT_ID = slice(0x40, 0x64)
+_PFS_IMAGE = struct.Struct('>QQ')                # 0x410: pfs_image_offset, pfs_image_size
+_PFS_IMAGE_POS = 0x410
+_ENTRY = struct.Struct('>IIIIII8x')              # 32 bytes
+
+PFSC_MAGIC = 0x43534650  # "PFSC"
+_PFSC_HEADER = struct.Struct('<IIIIQQQQ')
+
+INNER_IMAGE_NAME = 'pfs_image.dat'
+
+
+class PkgFormatError(Exception):
+    """The file is not a PKG this reader understands."""
+
+
+class PkgEntry:
+    __slots__ = ('id', 'name_offset', 'flags1', 'flags2', 'offset', 'size')
+
+    def __init__(self, id, name_offset, flags1, flags2, offset, size):
+        self.id = id
+        self.name_offset = name_offset
+        self.flags1 = flags1
+        self.flags2 = flags2
+        self.offset = offset
+        self.size = size
+
+    @property
+    def encrypted(self):
+        return bool(self.flags1 & ENTRY_FLAG_ENCRYPTED)
+
+    def __repr__(self):
+        return f"PkgEntry(0x{self.id:04x}, offset=0x{self.offset:x}, size={self.size})"
+
+
+def parse_sfo(data):
+    """Parse a param.sfo blob into {key: str|int}."""
+    if data[:4] != b'\0PSF':
+        raise PkgFormatError("bad param.sfo magic")
+    _version, key_table, data_table, count = struct.unpack_from('<IIII', data, 4)
+    values = {}
+    for i in range(count):
+        key_off, fmt, length, _max_len, data_off = struct.unpack_from('<HHIII', data, 0x14 + i * 16)
+        key_start = key_table + key_off
+        key = data[key_start:data.index(b'\0', key_start)].decode('ascii', errors='replace')
+        raw = data[data_table + data_off:data_table + data_off + length]
+        if fmt == 0x0404:
+            values[key] = struct.unpack('<I', raw[:4])[0]
+        else:
+            values[key] = raw.rstrip(b'\0').decode('utf-8', errors='replace')
+    return values
+
+
+class PfscImage:
+    """Sliceable view of a PFSC-compressed image, inflating blocks on demand.
+
+    Args:
+        buf: Buffer holding the compressed file (usually the PKG mmap)
+        offset: Byte offset of the PFSC header inside buf
+        cache_blocks: Number of inflated blocks kept in memory
+    """
+
+    def __init__(self, buf, offset, cache_blocks=16):
+        self.buf = buf
+        self.offset = offset
+        header = bytes(buf[offset:offset + _PFSC_HEADER.size])
+        if len(header) < _PFSC_HEADER.size:
+            raise PfsFormatError("truncated PFSC header")
+        (magic, _unk4, _unk8, self.block_size, block_size2, offsets_pos,
+         _data_start, self.length) = _PFSC_HEADER.unpack(header)
+        if magic != PFSC_MAGIC:
+            raise PfsFormatError("not a PFSC image")
+        if not self.block_size or block_size2 != self.block_size:
+            raise PfsFormatError(f"unsupported PFSC block size {self.block_size}/{block_size2}")
+        count = -(-self.length // self.block_size) + 1
+        table = bytes(buf[offset + offsets_pos:offset + offsets_pos + count * 8])
+        if len(table) != count * 8:
+            raise PfsFormatError("truncated PFSC block table")
+        self._offsets = struct.unpack(f'<{count}Q', table)
+        self._cache = OrderedDict()
+        self._cache_blocks = cache_blocks
+
+    def __len__(self):
+        return self.length
+
+    def _block(self, index):
+        block = self._cache.get(index)
+        if block is not None:
+            self._cache.move_to_end(index)
+            return block
+        start, end = self._offsets[index], self._offsets[index + 1]
+        raw = bytes(self.buf[self.offset + start:self.offset + end])
+        if len(raw) == self.block_size:
+            block = raw
+        elif not raw:
+            block = b'\0' * self.block_size
+        else:
+            try:
+                block = zlib.decompress(raw)
+            except zlib.error as e:
+                raise PfsFormatError(f"PFSC block {index}: {e}")
+        self._cache[index] = block
+        if len(self._cache) > self._cache_blocks:
+            self._cache.popitem(last=False)
+        return block
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            raise TypeError("PfscImage only supports slicing")
+        start, stop, _ = key.indices(self.length)
+        if stop <= start:
+            return b''
+        parts = []
+        pos = start
+        while pos < stop:
+            index, within = divmod(pos, self.block_size)
+            block = self._block(index)
+            take = min(stop - pos, len(block) - within)
+            if take <= 0:
+                break
+            parts.append(block[within:within + take])
+            pos += take
+        return b''.join(parts)
+
+
+class PkgReader:
+    """Reader for a PS4 .pkg file, memory-mapped or over a caller-supplied buffer.
+
+    Args:
+        path: PKG file (only used for messages when buffer is given)
+        buffer: Sliceable object with len() holding the PKG bytes; the caller
+                keeps ownership (close() does not close it)
+    """
+
+    def __init__(self, path, buffer=None):
+        self.path = path
+        self._file = None
+        if buffer is not None:
+            self.mm = buffer
+        else:
+            self._file = open(path, 'rb')
+            try:
+                self.mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                self._file.close()
+                raise PkgFormatError(f"cannot map {path}")
+        try:
+            self._parse_header()
+        except Exception:
+            self.close()
+            raise
+        self._sfo = None
+
+    def _parse_header(self):
+        if len(self.mm) < _PFS_IMAGE_POS + _PFS_IMAGE.size:
+            raise PkgFormatError("file too small for a PKG header")
+        (magic, self.flags, _unk8, _unkc, self.entry_count, _sc_count, _count2,
+         self.entry_table_offset, _ent_data_size, self.body_offset, self.body_size,
+         self.content_offset, self.content_size) = _HEADER.unpack(bytes(self.mm[0:_HEADER.size]))
+        if magic != PKG_MAGIC:
+            raise PkgFormatError("bad PKG magic")
+        self.content_id = self.mm[_CONTENT_ID].rstrip(b'\0').decode('ascii', errors='replace')
+        self.pfs_image_offset, self.pfs_image_size = _PFS_IMAGE.unpack(
+            bytes(self.mm[_PFS_IMAGE_POS:_PFS_IMAGE_POS + _PFS_IMAGE.size]))
+
+        table_end = self.entry_table_offset + self.entry_count * _ENTRY.size
+        if table_end > len(self.mm):
+            raise PkgFormatError("entry table past end of file")
+        table = bytes(self.mm[self.entry_table_offset:table_end])
+        self.entries = [PkgEntry(*_ENTRY.unpack_from(table, i * _ENTRY.size)) for i in range(self.entry_count)]
+        if self.pfs_image_offset + self.pfs_image_size > len(self.mm):
+            raise PkgFormatError("PFS image past end of file")
+
+    def close(self):
+        if self._file is None:
+            self.mm = None
+            return
+        if getattr(self, 'mm', None) is not None:
+            self.mm.close()
+            self.mm = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def entry(self, entry_id):
+        for e in self.entries:
+            if e.id == entry_id:
+                return e
+        return None
+
+    def read_entry(self, entry):
+        if entry.encrypted:
+            raise PkgFormatError(f"entry 0x{entry.id:04x} is encrypted")
+        return bytes(self.mm[entry.offset:entry.offset + entry.size])
+
+    @property
+    def param_sfo(self):
+        """param.sfo values ({} if the PKG has none)."""
+        if self._sfo is None:
+            entry = self.entry(ENTRY_PARAM_SFO)
+            self._sfo = parse_sfo(self.read_entry(entry)) if entry else {}
+        return self._sfo
+
+    def outer_pfs(self):
+        """PfsReader over the outer PFS image, read in place from the mapping."""
+        return PfsReader(self.mm, offset=self.pfs_image_offset)
+
+    def inner_pfs(self):
+        """PfsReader over the inner PFS (pfs_image.dat) without extracting it.
+
+        Raises PfsFormatError when the layout needs PkgTool (e.g. encrypted).
+        """
+        outer = self.outer_pfs()
+        for entry in outer.walk():
+            if entry.name == INNER_IMAGE_NAME and not entry.is_dir:
+                break
+        else:
+            raise PfsFormatError(f"no {INNER_IMAGE_NAME} in outer PFS")
+
+        inode = entry.inode
+        compressed = bool(inode.flags & INODE_FLAG_COMPRESSED)
+        stored_size = inode.size_compressed if compressed else inode.size
+        data_offset = self.pfs_image_offset + inode.start_block * outer.block_size
+        if stored_size > inode.blocks * outer.block_size:
+            raise PfsFormatError(f"{INNER_IMAGE_NAME} spans more blocks than allocated")
+        if data_offset + stored_size > len(self.mm):
+            raise PfsFormatError(f"{INNER_IMAGE_NAME} extends past end of PKG")
+        if compressed:
+            return PfsReader(PfscImage(self.mm, data_offset))
+        return PfsReader(self.mm, offset=data_offset)
+
+
+def read_pkg_files_with_suffix(pkg_path, suffix='.songdta_ps4', buffer=None):
+    """Return [(inner_path, bytes)] for files in a PKG's inner PFS ending with suffix."""
+    with PkgReader(pkg_path, buffer) as pkg:
+        return pkg.inner_pfs().read_files(suffix)
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Inspect a PS4 PKG without extracting it')
+    parser.add_argument('pkg', help='PKG file')
+    parser.add_argument('--list', action='store_true', help='List inner PFS files')
+    parser.add_argument('--suffix', default='', help='Only list files ending with this suffix')
+    args = parser.parse_args(argv)
+
+    with PkgReader(args.pkg) as pkg:
+        print(f"Content ID: {pkg.content_id}")
+        print(f"Entries:    {len(pkg.entries)}")
+        print(f"PFS image:  offset 0x{pkg.pfs_image_offset:x}, {pkg.pfs_image_size:,} bytes")
+        try:
+            for key in ('TITLE', 'APP_VER', 'VERSION'):
+                if key in pkg.param_sfo:
+                    print(f"{key + ':':<12}{pkg.param_sfo[key]}")
+        except PkgFormatError as e:
+            print(f"param.sfo:  {e}")
+        try:
+            inner = pkg.inner_pfs()
+        except PfsFormatError as e:
+            print(f"Inner PFS:  not readable in place ({e})")
+            return 1
+        kind = 'PFSC-compressed' if isinstance(inner.image, PfscImage) else 'in place'
+        print(f"Inner PFS:  readable ({kind})")
+        if args.list:
+            for entry in inner.walk():
+                if not entry.is_dir and entry.name.endswith(args.suffix):
+                    print(f"{entry.size:>12}  {entry.path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Disk-aware PKG scheduler for parallel extraction.
+
+Runs several PKG jobs at once on a thread pool (each job mostly waits on a
+PkgTool.Core subprocess), but only admits the next PKG when the free space in
+the temp directory covers its estimated extraction footprint:
+
+    inner PFS image (~PKG size) + extracted PFS contents (~PKG size)
+    + the PKG itself when it has to be downloaded first (SMB mode)
+
+Space reserved by running jobs is subtracted from the free space reported by
+shutil.disk_usage, so the estimate is conservative while jobs are writing.
+If nothing is running, the next PKG is always admitted so a single oversized
+PKG behaves exactly like serial mode.
+
+Results are handed back to the caller on the scheduling thread, so per-PKG
+bookkeeping (processed_pkgs.json, ErrorTracker) needs no extra locking.
+"""
+
+import os
+import shutil
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from settings_defaults import DEFAULT_PKG_SIZE_ESTIMATE_MB
+
+MB = 1024 * 1024
+
+
+def estimate_inner_pfs_size(pkg_path, size_hint=None):
+    """Estimate the inner PFS image size of a PKG (roughly the PKG size)."""
+    if size_hint:
+        return size_hint
+    try:
+        return os.path.getsize(pkg_path)
+    except OSError:
+        return DEFAULT_PKG_SIZE_ESTIMATE_MB * MB
+
+
+def estimate_pkg_footprint(pkg_path, downloaded=False, size_hint=None):
+    """Estimate temp-dir bytes needed to process one PKG."""
+    inner = estimate_inner_pfs_size(pkg_path, size_hint)
+    footprint = inner * 2  # inner.pfs + pfs_contents/
+    if downloaded:
+        footprint += size_hint or inner
+    return footprint
+
+
+class DiskAwareScheduler:
+    """Run PKG jobs in parallel, admitting each only when temp disk space allows."""
+
+    def __init__(self, temp_dir, workers, headroom_bytes=0, poll_interval=5.0, log=print):
+        self.temp_dir = temp_dir
+        self.workers = max(1, workers)
+        self.headroom_bytes = headroom_bytes
+        self.poll_interval = poll_interval
+        self.log = log
+        self.reserved = 0
+
+    def available_bytes(self):
+        """Free bytes in temp_dir not already promised to running jobs."""
+        free = shutil.disk_usage(self.temp_dir).free
+        return free - self.reserved - self.headroom_bytes
+
+    def run(self, items, job, estimate, on_done):
+        """Process items with job(item), calling on_done(item, result, exc) as each finishes.
+
+        Args:
+            items: Iterable of work items (PKG paths or names), processed in order
+            job: Callable run on a worker thread, returns the item's result
+            estimate: Callable returning the estimated temp-dir bytes for an item
+            on_done: Callback run on this thread with (item, result, exception)
+        """
+        pending = deque(items)
+        running = {}  # future -> (item, reserved_bytes)
+        waiting_logged = None
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='pkg-worker') as pool:
+            while pending or running:
+                while pending and len(running) < self.workers:
+                    item = pending[0]
+                    need = estimate(item)
+                    available = self.available_bytes()
+                    if need > available and running:
+                        if waiting_logged is not item:
+                            self.log(f"\tWaiting for disk space: {os.path.basename(str(item))} needs "
+                                     f"~{need // MB:,} MB, {max(0, available) // MB:,} MB available")
+                            waiting_logged = item
+                        break
+                    if need > available:
+                        self.log(f"\tWARNING: {os.path.basename(str(item))} needs ~{need // MB:,} MB but only "
+                                 f"{max(0, available) // MB:,} MB is free; running it alone")
+                    pending.popleft()
+                    self.reserved += need
+                    running[pool.submit(job, item)] = (item, need)
+
+                done, _ = wait(list(running), timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item, need = running.pop(future)
+                    self.reserved -= need
+                    exc = future.exception()
+                    on_done(item, None if exc else future.result(), exc)
+
+
+class DiskBudget:
+    """Blocking byte reservations against the free space in temp_dir.
+
+    Used by the staged pipeline: the fetch stage acquires a PKG's footprint
+    before downloading it and the cleanup stage releases it, so the number of
+    PKGs in flight is capped by disk space rather than a fixed count.
+    """
+
+    def __init__(self, temp_dir, headroom_bytes=0, poll_interval=5.0):
+        self.temp_dir = temp_dir
+        self.headroom_bytes = headroom_bytes
+        self.poll_interval = poll_interval
+        self.reserved = 0
+        self._cond = threading.Condition()
+
+    def available_bytes(self):
+        """Free bytes in temp_dir not already promised to PKGs in flight."""
+        free = shutil.disk_usage(self.temp_dir).free
+        return free - self.reserved - self.headroom_bytes
+
+    def acquire(self, nbytes, on_wait=None):
+        """Reserve nbytes, blocking until they fit (always granted when nothing is reserved)."""
+        with self._cond:
+            waited = False
+            while self.reserved and nbytes > self.available_bytes():
+                if on_wait and not waited:
+                    on_wait(nbytes, max(0, self.available_bytes()))
+                    waited = True
+                self._cond.wait(self.poll_interval)
+            self.reserved += nbytes
+
+    def release(self, nbytes):
+        with self._cond:
+            self.reserved -= nbytes
+            self._cond.notify_all()
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Remote PKG transports: list and fetch PKGs from a share.
+
+smb_pkg_finder used to start a new smbclient process for every listing and
+every download, ran a second listing when the first came back empty, and
+threw away the sizes and dates smbclient prints. A transport keeps one
+session open for the whole run and returns structured listings:
+
+    with SmbClientTransport('192.168.100.135', 'incoming/temp/Rb4Dlc') as remote:
+        for entry in remote.list():          # RemoteEntry(name, size, mtime)
+            remote.fetch(entry.name, '/workspace/rb4_temp', size=entry.size)
+
+SmbClientTransport drives a single interactive `smbclient` process through
+its stdin. Each command is followed by `pwd`, whose "Current directory is"
+line marks the end of that command's output. If the process dies (server
+restart, dropped connection) it is restarted once per command.
+
+Downloads go to <name>.part with `reget`, which continues a partial file,
+and are renamed into place once the size matches the listing. A fetch
+interrupted by a timeout or a crash resumes on the next attempt (e.g. from
+the retry queue) instead of starting over.
+
+LocalTransport implements the same interface over a local directory, so the
+SMB code path (download to temp, extract, delete) can be tested and
+benchmarked without a share: --smb --transport local --pkg-dir <dir>.
+
+open_range(name) returns a byte_source.BlockCache over the remote file for
+reading a PKG in place (only the blocks pkg_reader touches are transferred),
+or None when the transport can't do byte-range reads. smbclient has no
+ranged get, so SmbClientTransport needs the optional smbprotocol package.
+"""
+
+import os
+import queue
+import re
+import subprocess
+import threading
+import time
+from collections import namedtuple
+
+from byte_source import BlockCache, FileRangeSource, SmbRangeSource
+
+RemoteEntry = namedtuple('RemoteEntry', 'name size mtime')
+
+CHUNK_SIZE = 1 << 20
+COMMAND_TIMEOUT = 3600
+
+# "  UP8802-...-V0100.pkg      A 2853699584  Mon Jan 15 10:20:30 2024"
+_LS_LINE_RE = re.compile(r'^\s{2}(.+?)\s+([A-Z]*)\s+(\d+)\s+(\w{3} \w{3} [ \d]\d \d{2}:\d{2}:\d{2} \d{4})\s*$')
+_PROMPT_RE = re.compile(r'^(?:smb: \S*> ?)+')
+_PWD_MARK = 'Current directory is'
+
+
+class TransportError(Exception):
+    pass
+
+
+def is_pkg_name(name):
+    return name.endswith('.pkg') and not name.startswith('._')
+
+
+def parse_ls_line(line):
+    """RemoteEntry for a file line of smbclient `ls` output, None for directories and other lines."""
+    match = _LS_LINE_RE.match(line)
+    if not match or 'D' in match.group(2):
+        return None
+    try:
+        mtime = time.mktime(time.strptime(' '.join(match.group(4).split()), '%a %b %d %H:%M:%S %Y'))
+    except ValueError:
+        mtime = None
+    return RemoteEntry(match.group(1), int(match.group(3)), mtime)
+
+
+def _finish_part(part, dest, size):
+    """Rename a completed .part download into place (False if it is short)."""
+    if size is not None and os.path.getsize(part) != size:
+        return False
+    os.replace(part, dest)
+    return True
+
+
+class LocalTransport:
+    """Transport over a local directory (offline stand-in for the share)."""
+
+    def __init__(self, root):
+        self.root = root
+        self.listed = {}  # name -> RemoteEntry from the last list()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        pass
+
+    def list(self):
+        """RemoteEntry for every PKG in the directory, sorted by name."""
+        entries = []
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if entry.is_file() and is_pkg_name(entry.name):
+                    st = entry.stat()
+                    entries.append(RemoteEntry(entry.name, st.st_size, st.st_mtime))
+        self.listed = {e.name: e for e in entries}
+        return sorted(entries)
+
+    def fetch(self, name, dest_dir, size=None):
+        """Copy name into dest_dir, continuing a partial <name>.part. Returns True on success."""
+        src = os.path.join(self.root, name)
+        dest = os.path.join(dest_dir, name)
+        part = f"{dest}.part"
+        try:
+            size = os.path.getsize(src) if size is None else size
+            if os.path.exists(part) and os.path.getsize(part) > size:
+                os.remove(part)  # left over from a different version of the file
+            with open(src, 'rb') as fin, open(part, 'ab') as fout:
+                fin.seek(fout.tell())
+                for chunk in iter(lambda: fin.read(CHUNK_SIZE), b''):
+                    fout.write(chunk)
+            return _finish_part(part, dest, size)
+        except OSError:
+            return False
+
+    def open_range(self, name):
+        """BlockCache over name for in-place reads."""
+        return BlockCache(FileRangeSource(os.path.join(self.root, name)))
+
+    def fetch_many(self, names, dest_dir, sizes=None):
+        """{name: ok} for several downloads."""
+        sizes = sizes or {}
+        return {name: self.fetch(name, dest_dir, sizes.get(name)) for name in names}
+
+
+class SmbClientTransport:
+    """One persistent smbclient session on //server/share[/sub/path]."""
+
+    def __init__(self, server, share, command_timeout=COMMAND_TIMEOUT):
+        parts = share.strip('/').split('/')
+        self.unc_root = '\\\\' + '\\'.join([server] + parts)
+        self.service = f"//{server}/{parts[0]}"
+        self.sub_path = '/'.join(parts[1:])
+        self.command_timeout = command_timeout
+        self._proc = None
+        self._lines = None
+        self._lock = threading.Lock()  # one command at a time on the session
+        self.listed = {}  # name -> RemoteEntry from the last list()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _start(self):
+        try:
+            self._proc = subprocess.Popen(['smbclient', self.service, '-N'], stdin=subprocess.PIPE,
+                                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
+        except OSError as e:
+            raise TransportError(f"cannot start smbclient: {e}")
+        self._lines = queue.Queue()
+        threading.Thread(target=self._read, args=(self._proc.stdout, self._lines), daemon=True).start()
+        if self.sub_path:
+            self._send(f"cd {_quote(self.sub_path)}")
+
+    @staticmethod
+    def _read(stream, lines):
+        for line in stream:
+            lines.put(line.rstrip('\n'))
+        lines.put(None)  # EOF: the process exited
+
+    def _send(self, command):
+        """Run one command on the live session and return its output lines."""
+        try:
+            self._proc.stdin.write(f"{command}\npwd\n")
+            self._proc.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise TransportError(f"smbclient session closed: {e}")
+        output = []
+        deadline = time.monotonic() + self.command_timeout
+        while True:
+            try:
+                line = self._lines.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                self.close()
+                raise TransportError(f"smbclient timed out on: {command}")
+            if line is None:
+                raise TransportError(f"smbclient exited during: {command}: " + ' | '.join(output[-5:]))
+            line = _PROMPT_RE.sub('', line)
+            if line.startswith(_PWD_MARK):
+                return output
+            output.append(line)
+
+    def run(self, command):
+        """Output lines of command, (re)connecting as needed."""
+        with self._lock:
+            for attempt in (1, 2):
+                try:
+                    if self._proc is None or self._proc.poll() is not None:
+                        self._start()
+                    return self._send(command)
+                except TransportError:
+                    self.close()
+                    if attempt == 2:
+                        raise
+
+    def close(self):
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        try:
+            if proc.poll() is None:
+                proc.stdin.write("quit\n")
+                proc.stdin.flush()
+                proc.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            proc.kill()
+
+    def list(self):
+        """RemoteEntry for every PKG in the share directory, sorted by name."""
+        entries = (parse_ls_line(line) for line in self.run('ls'))
+        entries = sorted(e for e in entries if e and is_pkg_name(e.name))
+        self.listed = {e.name: e for e in entries}
+        return entries
+
+    def open_range(self, name):
+        """BlockCache over name on the share, or None without smbprotocol (or if it can't connect)."""
+        listed = self.listed.get(name)
+        try:
+            source = SmbRangeSource(f"{self.unc_root}\\{name}", size=listed.size if listed else None)
+        except Exception:  # ImportError without smbprotocol, or its own auth/connection errors
+            return None
+        return BlockCache(source)
+
+    def fetch(self, name, dest_dir, size=None):
+        """Download name into dest_dir, resuming a partial <name>.part. Returns True on success.
+
+        size defaults to the size from the last list(); a download of another size fails.
+        """
+        return self.fetch_many([name], dest_dir, {name: size} if size is not None else None)[name]
+
+    def fetch_many(self, names, dest_dir, sizes=None):
+        """{name: ok} for several downloads over the session."""
+        sizes = sizes or {}
+        results = {}
+        for name in names:
+            listed = self.listed.get(name)
+            size = sizes.get(name, listed.size if listed else None)
+            dest = os.path.join(dest_dir, name)
+            part = f"{dest}.part"
+            if size is not None and os.path.exists(part) and os.path.getsize(part) > size:
+                os.remove(part)  # left over from a different version of the file
+            try:
+                output = self.run(f"reget {_quote(name)} {_quote(part)}")
+            except TransportError:
+                results[name] = False
+                continue
+            failed = any('NT_STATUS_' in line for line in output)
+            results[name] = not failed and os.path.exists(part) and _finish_part(part, dest, size)
+        return results
+
+
+def _quote(arg):
+    """smbclient's command parser takes double-quoted arguments."""
+    return '"' + arg.replace('"', '') + '"'
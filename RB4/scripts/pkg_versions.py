@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+PKG version index: group PKGs by content ID and keep the newest version.
+
+The share holds several versions of the same content, e.g.
+
+    UP8802-CUSA02084_00-CREQ0000000001-V0100.pkg
+    UP8802-CUSA02084_00-CREQ0000000001-V0200.pkg
+
+and each one used to be extracted as independent (multi-GB) work. The content
+ID (XXnnnn-CUSAnnnnn_nn-<label of up to 16 chars>) and version are parsed
+from the file name (-Annnn app version, -Vnnnn package version). Local PKGs
+whose name carries no content ID are identified from the PKG header instead
+(content ID plus param.sfo APP_VER/VERSION). PKGs that cannot be identified
+either way are kept as their own group.
+
+select_latest() returns the newest version of each content ID; the pipeline
+extracts only those unless --all-versions is given. diff_versions() compares
+the .songdta_ps4 files of consecutive versions of a content ID (read in place
+with pkg_reader, so unencrypted local PKGs only).
+
+Usage:
+    python3 pkg_versions.py <pkg_dir> [--diff] [--no-header]
+"""
+
+import os
+import re
+
+_CONTENT_ID_RE = re.compile(r'([A-Z]{2}\d{4}-[A-Z]{4}\d{5}_\d{2}-[A-Z0-9]{1,16})(.*)\.pkg$', re.IGNORECASE)
+_VERSION_RE = re.compile(r'-([AV])(\d{4})(?=-|$)', re.IGNORECASE)
+_SFO_VERSION_RE = re.compile(r'^(\d{1,2})\.(\d{2})$')
+
+
+class PkgVersion:
+    __slots__ = ('path', 'name', 'content_id', 'version', 'source')
+
+    def __init__(self, path, content_id=None, version=(0, 0), source=None):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.content_id = content_id
+        self.version = version  # (app version, package version), e.g. (0, 200) for -V0200
+        self.source = source  # 'name', 'header' or None (unidentified)
+
+    @property
+    def label(self):
+        app, pkg = self.version
+        return f"A{app:04d}-V{pkg:04d}" if app else f"V{pkg:04d}"
+
+    def __repr__(self):
+        return f"PkgVersion({self.name!r}, {self.content_id!r}, {self.label})"
+
+
+def parse_pkg_name(name):
+    """(content_id, (app_ver, pkg_ver)) from a PKG file name, or (None, (0, 0))."""
+    match = _CONTENT_ID_RE.search(os.path.basename(name))
+    if not match:
+        return None, (0, 0)
+    found = {kind.upper(): int(number) for kind, number in _VERSION_RE.findall(match.group(2))}
+    return match.group(1).upper(), (found.get('A', 0), found.get('V', 0))
+
+
+def _sfo_version(text):
+    """'01.00' -> 100"""
+    match = _SFO_VERSION_RE.match(str(text or '').strip())
+    return int(match.group(1)) * 100 + int(match.group(2)) if match else 0
+
+
+def read_header_version(path):
+    """(content_id, (app_ver, pkg_ver)) from the PKG header, or None if it can't be read."""
+    import struct
+    from pkg_reader import PkgFormatError, PkgReader
+    try:
+        with PkgReader(path) as pkg:
+            content_id = pkg.content_id
+            try:
+                sfo = pkg.param_sfo
+            except (PkgFormatError, struct.error, ValueError):
+                sfo = {}
+    except (PkgFormatError, struct.error, OSError, ValueError):
+        return None
+    if not _CONTENT_ID_RE.match(content_id + '.pkg'):
+        return None
+    return content_id.upper(), (_sfo_version(sfo.get('APP_VER')), _sfo_version(sfo.get('VERSION')))
+
+
+def identify(path, read_header=False):
+    """PkgVersion for path, from its name or (with read_header) its header."""
+    content_id, version = parse_pkg_name(path)
+    if content_id:
+        return PkgVersion(path, content_id, version, 'name')
+    if read_header:
+        found = read_header_version(path)
+        if found:
+            return PkgVersion(path, found[0], found[1], 'header')
+    return PkgVersion(path)
+
+
+def group_versions(paths, read_header=False):
+    """{content ID (or file name if unidentified): [PkgVersion, oldest first]}."""
+    groups = {}
+    for path in paths:
+        pkg = identify(path, read_header)
+        groups.setdefault(pkg.content_id or pkg.name, []).append(pkg)
+    for versions in groups.values():
+        versions.sort(key=lambda p: (p.version, p.name))
+    return groups
+
+
+def select_latest(paths, read_header=False):
+    """Newest version of each content ID.
+
+    Returns (latest, superseded): latest keeps the order of paths, superseded
+    maps each older path to the path that replaces it.
+    """
+    keep, superseded = set(), {}
+    for versions in group_versions(paths, read_header).values():
+        newest = versions[-1].path
+        keep.add(newest)
+        for older in versions[:-1]:
+            superseded[older.path] = newest
+    return [p for p in paths if p in keep], superseded
+
+
+def _songdta_by_name(path):
+    from pkg_reader import read_pkg_files_with_suffix
+    return {os.path.basename(inner): data for inner, data in read_pkg_files_with_suffix(path, '.songdta_ps4')}
+
+
+def _song_fields(name, data):
+    from extract_binary_dta import parse_songdta_bytes
+    return {k: v for k, v in parse_songdta_bytes(data, name).items() if not k.startswith('_')}
+
+
+def diff_songdta(old, new):
+    """Compare {file name: songdta bytes} of two versions.
+
+    Returns {'added': [names], 'removed': [names], 'changed': {name: {field: (old, new)}}}.
+    Files whose bytes differ but parse to the same fields are listed with an empty dict.
+    """
+    changed = {}
+    for name in sorted(old.keys() & new.keys()):
+        if old[name] == new[name]:
+            continue
+        before, after = _song_fields(name, old[name]), _song_fields(name, new[name])
+        changed[name] = {field: (before.get(field), after.get(field))
+                         for field in sorted(before.keys() | after.keys())
+                         if before.get(field) != after.get(field)}
+    return {'added': sorted(new.keys() - old.keys()), 'removed': sorted(old.keys() - new.keys()),
+            'changed': changed}
+
+
+def diff_versions(versions, read=_songdta_by_name):
+    """[(older PkgVersion, newer PkgVersion, diff or error string)] for consecutive versions."""
+    results = []
+    loaded = {}
+
+    def songdta(pkg):
+        if pkg.path not in loaded:
+            try:
+                loaded[pkg.path] = read(pkg.path)
+            except Exception as e:  # encrypted / unreadable PKG: report and move on
+                loaded[pkg.path] = f"{type(e).__name__}: {e}"
+        return loaded[pkg.path]
+
+    for older, newer in zip(versions, versions[1:]):
+        old, new = songdta(older), songdta(newer)
+        if isinstance(old, str) or isinstance(new, str):
+            results.append((older, newer, old if isinstance(old, str) else new))
+        else:
+            results.append((older, newer, diff_songdta(old, new)))
+    return results
+
+
+def format_diff(older, newer, diff):
+    """Report lines for one diff_versions() result."""
+    lines = [f"{older.content_id}: {older.label} -> {newer.label}"]
+    if isinstance(diff, str):
+        return lines + [f"  not readable in place: {diff}"]
+    if not (diff['added'] or diff['removed'] or diff['changed']):
+        return lines + ["  song data identical"]
+    lines += [f"  + {name}" for name in diff['added']]
+    lines += [f"  - {name}" for name in diff['removed']]
+    for name, fields in diff['changed'].items():
+        lines.append(f"  ~ {name}" + ("" if fields else " (bytes differ, parsed fields identical)"))
+        lines += [f"      {field}: {before!r} -> {after!r}" for field, (before, after) in fields.items()]
+    return lines
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Group RB4 PKGs by content ID and version')
+    parser.add_argument('pkg_dir', help='Directory with .pkg files')
+    parser.add_argument('--diff', action='store_true', help='Diff song data between versions of each content ID')
+    parser.add_argument('--no-header', action='store_false', dest='read_header',
+                        help='Identify PKGs by file name only')
+    args = parser.parse_args(argv)
+
+    paths = sorted(os.path.join(args.pkg_dir, f) for f in os.listdir(args.pkg_dir)
+                   if f.endswith('.pkg') and not f.startswith('._'))
+    groups = group_versions(paths, args.read_header)
+    multi = {cid: versions for cid, versions in groups.items() if len(versions) > 1}
+    print(f"{len(paths)} PKGs, {len(groups)} content IDs, {sum(len(v) - 1 for v in multi.values())} superseded")
+    for cid, versions in sorted(multi.items()):
+        if args.diff:
+            for older, newer, diff in diff_versions(versions):
+                print('\n'.join(format_diff(older, newer, diff)))
+        else:
+            print(f"{cid}: " + ", ".join(p.label for p in versions) + f" (newest: {versions[-1].name})")
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
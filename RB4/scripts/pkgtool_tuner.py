@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Adaptive DOTNET_ProcessorCount for `PkgTool.Core pfs_extract`.
+
+pfs_extract used to run with DOTNET_ProcessorCount=2 for every PKG and drop
+to 1 after a failure (file locks, memory-mapped file errors). PkgToolTuner
+records the outcome of every pfs_extract run by storage type (local PKG
+directory vs. SMB download in temp) and PFS image size class:
+
+    rb4_temp/pkgtool_tuning.json
+    {"local/large": {"2": {"ok": 14, "fail": 0, "bytes": ..., "seconds": ...},
+                     "4": {"ok": 3, "fail": 1, ...}}}
+
+choose() returns the setting with the best measured throughput among the
+stable ones (at most MAX_FAIL_RATE of runs failed). Once a setting has
+succeeded EXPLORE_AFTER times, the next higher candidate is tried, up to
+EXPLORE_TRIALS runs, unless it has ever failed. With no data, the old default
+of 2 is used. Retries after a failure always use 1 thread and are recorded
+as well. A fixed count (--pkgtool-threads) overrides choose() but outcomes
+are still recorded.
+
+Usage (show what has been learned):
+    python3 pkgtool_tuner.py rb4_temp/pkgtool_tuning.json
+"""
+
+import json
+import os
+import threading
+
+GB = 1024 ** 3
+SIZE_CLASSES = ((1 * GB, 'small'), (4 * GB, 'medium'), (float('inf'), 'large'))
+DEFAULT_PROCESSOR_COUNT = 2
+MAX_FAIL_RATE = 0.1
+EXPLORE_AFTER = 2
+EXPLORE_TRIALS = 3
+
+
+def size_class(nbytes):
+    for limit, name in SIZE_CLASSES:
+        if (nbytes or 0) < limit:
+            return name
+    return SIZE_CLASSES[-1][1]
+
+
+def candidate_counts(cpu_count=None):
+    """Processor counts worth trying on this host: 1, 2, 4, ... up to the CPU count."""
+    cpus = cpu_count or os.cpu_count() or 1
+    counts, n = [1], 2
+    while n < cpus:
+        counts.append(n)
+        n *= 2
+    if cpus > 1:
+        counts.append(cpus)
+    return counts
+
+
+class PkgToolTuner:
+    """Per (storage, size class) record of pfs_extract outcomes, persisted as JSON."""
+
+    def __init__(self, path, storage='local', cpu_count=None, fixed=None):
+        self.path = path
+        self.storage = storage
+        self.fixed = fixed
+        self.candidates = candidate_counts(cpu_count)
+        self._lock = threading.Lock()
+        self.state = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                state = json.load(f)
+            return state if isinstance(state, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def bucket_key(self, nbytes):
+        return f"{self.storage}/{size_class(nbytes)}"
+
+    def _stats(self, bucket, count):
+        return bucket.get(str(count), {'ok': 0, 'fail': 0, 'bytes': 0, 'seconds': 0.0})
+
+    def _stable(self, stats):
+        runs = stats['ok'] + stats['fail']
+        return stats['ok'] > 0 and stats['fail'] / runs <= MAX_FAIL_RATE
+
+    def choose(self, nbytes):
+        """DOTNET_ProcessorCount to use for a PFS image of nbytes."""
+        if self.fixed:
+            return self.fixed
+        with self._lock:
+            bucket = self.state.get(self.bucket_key(nbytes), {})
+            stable = [n for n in self.candidates if self._stable(self._stats(bucket, n))]
+            if stable:
+                def throughput(n):
+                    s = self._stats(bucket, n)
+                    return s['bytes'] / s['seconds'] if s['seconds'] > 0 else 0.0
+                choice = max(stable, key=lambda n: (throughput(n), n))
+            elif not self._stats(bucket, DEFAULT_PROCESSOR_COUNT)['fail'] and DEFAULT_PROCESSOR_COUNT in self.candidates:
+                return DEFAULT_PROCESSOR_COUNT
+            else:
+                return 1
+            higher = [n for n in self.candidates if n > choice]
+            if higher and self._stats(bucket, choice)['ok'] >= EXPLORE_AFTER:
+                trial = self._stats(bucket, higher[0])
+                if not trial['fail'] and trial['ok'] < EXPLORE_TRIALS:
+                    return higher[0]
+            return choice
+
+    def record(self, nbytes, count, ok, seconds=None):
+        """Record one pfs_extract run with DOTNET_ProcessorCount=count."""
+        with self._lock:
+            bucket = self.state.setdefault(self.bucket_key(nbytes), {})
+            stats = bucket.setdefault(str(count), self._stats(bucket, count))
+            if ok:
+                stats['ok'] += 1
+                if seconds:
+                    stats['bytes'] += nbytes or 0
+                    stats['seconds'] = round(stats['seconds'] + seconds, 3)
+            else:
+                stats['fail'] += 1
+            try:
+                self._save()
+            except OSError:
+                pass  # tuning data is an optimisation; never fail an extraction over it
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Show learned PkgTool.Core processor-count settings')
+    parser.add_argument('state_file', help='pkgtool_tuning.json')
+    args = parser.parse_args(argv)
+
+    tuner = PkgToolTuner(args.state_file)
+    if not tuner.state:
+        print("No tuning data yet")
+        return 1
+    class_floor = dict(zip((name for _, name in SIZE_CLASSES), [0] + [limit for limit, _ in SIZE_CLASSES[:-1]]))
+    for key in sorted(tuner.state):
+        storage, size = key.split('/', 1)
+        tuner.storage = storage
+        print(f"{key}: next choice DOTNET_ProcessorCount={tuner.choose(class_floor.get(size, 0))}")
+        for count, s in sorted(tuner.state[key].items(), key=lambda item: int(item[0])):
+            rate = f"{s['bytes'] / s['seconds'] / (1024 * 1024):,.1f} MB/s" if s['seconds'] else '-'
+            print(f"  {count:>3} threads: {s['ok']} ok, {s['fail']} failed, {rate}")
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
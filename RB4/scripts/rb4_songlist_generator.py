@@ -18,10 +18,14 @@ import sys
 import json
 import subprocess
 import argparse
+import atexit
 import shutil
 import re
+import struct
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
-import logging
 
 # Import console styling
 from console_styling import (
@@ -29,16 +33,6 @@ from console_styling import (
     progress_bar, Spinner
 )
 
-# Override the imported log to also write to LOG_FILE
-import console_styling as cs_module
-
-def log(msg):
-    """Log to both console and file (plain text for log file)."""
-    print(msg)
-    if LOG_FILE:
-        with open(LOG_FILE, 'a', encoding='utf-8') as f:
-            f.write(msg + '\n')
-
 # Import settings defaults
 from settings_defaults import (
     DEFAULT_PKG_DIR,
@@ -47,23 +41,81 @@ from settings_defaults import (
     DEFAULT_SONGLIST_DIR,
     DEFAULT_METADATA_DIR,
     DEFAULT_PROGRESS_BAR_LENGTH,
+    DEFAULT_WORKERS,
+    DEFAULT_DISK_HEADROOM_MB,
+    DEFAULT_PKG_ORDER,
+    DEFAULT_PUBLISH_EVERY,
+    DEFAULT_PUBLISH_MINUTES,
     get_processed_pkgs_file,
     get_update_history_file,
     get_error_log_file,
+    get_songdta_cache_dir,
+    get_state_journal_file,
+    get_perf_history_file,
+    get_tail_state_file,
+    get_retry_queue_file,
+    get_pkgtool_tuning_file,
+    DEFAULT_RETRY_ATTEMPTS,
 )
 
 LOG_FILE = None
+LOG_SINK = None  # Set in main(); buffers LOG_FILE and the JSON-lines event log
 PROCESSED_PKGS_FILE = None  # Set in main()
 UPDATE_HISTORY_FILE = None  # Set in main()
 ERROR_LOG_FILE = None  # Set in main()
+METADATA_WRITER = None  # Set in main(); metadata JSONs are written synchronously without it
+SONGDTA_CACHE = None  # Set in main(); raw song data kept for --reparse
+PKGTOOL_TUNER = None  # Set in main(); picks DOTNET_ProcessorCount for pfs_extract
+TRANSPORT = None  # Set in main() in SMB mode; lists and fetches remote PKGs (pkg_transport.py)
+PERF_RECORDER = None  # Set in main(); per-PKG stage timings for the perf report
+TRACE = None  # Set in main() with --trace; Chrome trace-event spans
 
 
 def log(msg):
-    """Log to both console and file."""
+    """Log to the console, and to LOG_FILE via the buffered sink."""
     print(msg)
-    if LOG_FILE:
-        with open(LOG_FILE, 'a', encoding='utf-8') as f:
-            f.write(msg + '\n')
+    if LOG_SINK:
+        LOG_SINK.line(msg)
+
+
+def log_event(name, **fields):
+    """Record a structured event (stage, pkg, seconds, bytes, ...) in the event log."""
+    if LOG_SINK:
+        LOG_SINK.event(name, **fields)
+
+
+@contextmanager
+def stage_event(stage, pkg_name, **fields):
+    """Time a pipeline stage and log it as a 'stage' event; set fields['bytes'] etc. inside.
+    
+    fields['written'] is the number of bytes the stage wrote to the temp dir.
+    pkg_name is None for whole-run stages (node lists, HTML, backup, ...).
+    """
+    start = time.perf_counter()
+    try:
+        yield fields
+    except Exception as e:
+        fields['error'] = str(e)[:200]
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        log_event('stage', stage=stage, pkg=pkg_name, seconds=round(seconds, 3), **fields)
+        if PERF_RECORDER and pkg_name:
+            PERF_RECORDER.stage(pkg_name, stage, seconds, fields.get('written'))
+        if TRACE:
+            TRACE.span(stage, start, seconds, cat='pkg' if pkg_name else 'pipeline', pkg=pkg_name, **fields)
+
+
+def dir_size(path):
+    """Total size in bytes of the files under path."""
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(root, f))
+            except OSError:
+                pass
+    return total
 
 
 def load_empty_songs_baseline():
@@ -80,19 +132,6 @@ def load_empty_songs_baseline():
             log(f"Warning: Failed to load empty songs baseline: {e}")
     return {}
 
-def load_processed_pkgs(processed_pkgs_file):
-    """Load list of already-processed PKGs."""
-    if processed_pkgs_file and os.path.exists(processed_pkgs_file):
-        with open(processed_pkgs_file) as f:
-            return set(json.load(f))
-    return set()
-
-def save_processed_pkgs(processed, processed_pkgs_file):
-    """Save list of processed PKGs."""
-    if processed_pkgs_file:
-        with open(processed_pkgs_file, 'w') as f:
-            json.dump(sorted(processed), f, indent=2)
-
 def load_update_history():
     """Load update history."""
     if UPDATE_HISTORY_FILE and os.path.exists(UPDATE_HISTORY_FILE):
@@ -103,6 +142,7 @@ def load_update_history():
 # Error tracking for pipeline failures
 class ErrorTracker:
     def __init__(self):
+        self._lock = threading.Lock()  # parallel workers record errors too
         self.errors = {
             'pkg_download_failed': [],
             'pfs_image_extract_failed': [],  # Step 1: extracting inner PFS image
@@ -119,23 +159,26 @@ class ErrorTracker:
             'no_songdta_found': [],
             'empty_metadata': [],
             'unknown_source': [],
+            'metadata_write_failed': [],
         }
     
     def add_error(self, error_type, pkg_name, details=''):
         if error_type in self.errors:
-            self.errors[error_type].append({
-                'pkg': pkg_name,
-                'details': details,
-                'timestamp': datetime.now().isoformat()
-            })
+            with self._lock:
+                self.errors[error_type].append({
+                    'pkg': pkg_name,
+                    'details': details,
+                    'timestamp': datetime.now().isoformat()
+                })
     
     def add_warning(self, warning_type, pkg_name, details=''):
         if warning_type in self.warnings:
-            self.warnings[warning_type].append({
-                'pkg': pkg_name,
-                'details': details,
-                'timestamp': datetime.now().isoformat()
-            })
+            with self._lock:
+                self.warnings[warning_type].append({
+                    'pkg': pkg_name,
+                    'details': details,
+                    'timestamp': datetime.now().isoformat()
+                })
     
     def save(self):
         if ERROR_LOG_FILE:
@@ -195,18 +238,42 @@ def get_pkg_source(pkg_path):
         return "unexportable"
     return "unknown"
 
+# --order source: PKG sources in processing order
+SOURCE_PRIORITY = ('custom', 'rb4', 'rb2', 'greenday', 'delisted', 'unreleased', 'unexportable', 'unknown')
+PKG_ORDERS = ('name', 'smallest', 'newest', 'source')
+
+def order_pkgs(pkg_files, order, remote=None):
+    """Sort PKGs for processing: by name, smallest file first, newest file first, or by source.
+    
+    remote maps SMB PKG names to their RemoteEntry (size and date from the listing).
+    """
+    if order == 'source':
+        return sorted(pkg_files, key=lambda p: (SOURCE_PRIORITY.index(get_pkg_source(p)), p))
+    if order == 'name':
+        return sorted(pkg_files)
+    if remote is not None:
+        size, mtime = (lambda p: remote[p].size), (lambda p: remote[p].mtime or 0)
+    else:
+        size, mtime = os.path.getsize, (lambda p: os.stat(p).st_mtime)
+    if order == 'smallest':
+        return sorted(pkg_files, key=lambda p: (size(p), p))
+    return sorted(pkg_files, key=lambda p: (-mtime(p), p))  # newest
+
 def run_cmd(cmd, check=True, capture=True, show_output=False, indent="\t\t", timeout=None):
     """Run command and return output. Use show_output=True for realtime feedback with indent."""
     import subprocess
     import threading
     
     if show_output:
+        from collections import deque
         process = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=False, bufsize=1)
+        tail = deque(maxlen=20)  # last lines go into the error, for categorize_pkg_error
         
         def stream_output(stream):
             try:
                 for line in stream:
                     decoded_line = line.decode('utf-8', errors='replace').rstrip()
+                    tail.append(decoded_line)
                     log(f"{indent}{decoded_line}")
                     sys.stdout.flush()
             except Exception as e:
@@ -225,7 +292,7 @@ def run_cmd(cmd, check=True, capture=True, show_output=False, indent="\t\t", tim
         thread.join(timeout=5)
         
         if check and process.returncode != 0:
-            raise RuntimeError(f"Command failed: {cmd}")
+            raise RuntimeError(f"Command failed: {cmd}" + "".join(f"\n{line}" for line in tail))
         return ""
     
     result = subprocess.run(cmd, shell=True, capture_output=capture, text=True, timeout=timeout)
@@ -236,107 +303,631 @@ def run_cmd(cmd, check=True, capture=True, show_output=False, indent="\t\t", tim
         raise RuntimeError(f"Command failed: {cmd}")
     return result.stdout if capture else ""
 
-def extract_songdta_from_pkg(pkg_path, source_name, temp_dir, metadata_dir=None, empty_baseline=None, error_tracker=None):
-    """Extract only .songdta_ps4 files from a PKG using two-step extraction."""
+PKGTOOL_ENV = 'DOTNET_SYSTEM_GLOBALIZATION_INVARIANT=1 DOTNET_BUNDLE_EXTRACT_BASE_DIR=/tmp/dotnet_extract'
+
+
+def get_work_dir(pkg_name, temp_dir):
+    """Per-PKG scratch directory for the inner PFS image and its contents."""
+    basename = pkg_name.replace('.pkg', '')
+    return os.path.join(temp_dir, 'pfs_extract_' + basename)
+
+
+def extract_inner_pfs(pkg_path, work_dir):
+    """Step 1: extract the inner PFS image from a PKG. Returns the image path."""
+    pfs_file = os.path.join(work_dir, "inner.pfs")
+    os.makedirs(work_dir, exist_ok=True)
+    log(f"\t\t{icon('floppy')} [2/4] Extracting PFS image...")
+    sys.stdout.flush()
+    with stage_event('inner_extract', os.path.basename(pkg_path)) as ev:
+        run_cmd(f'{PKGTOOL_ENV} PkgTool.Core pkg_extractinnerpfs "{pkg_path}" {pfs_file}', show_output=True, indent="\t\t", timeout=3600)
+        ev['bytes'] = ev['written'] = os.path.getsize(pfs_file)
+    return pfs_file
+
+
+def extract_pfs_contents(pfs_file, pfs_extract_dir, pkg_name, error_tracker=None):
+    """Step 2: extract the PFS contents, retrying single-threaded on failure.
+    
+    PkgTool's thread count (DOTNET_ProcessorCount) comes from PKGTOOL_TUNER,
+    which learns per storage type and PFS size which settings run without
+    file lock errors; every outcome is fed back to it.
+    """
+    nbytes = os.path.getsize(pfs_file)
+    threads = PKGTOOL_TUNER.choose(nbytes) if PKGTOOL_TUNER else 2
+    log(f"\t\t{icon('music')} [3/4] Extracting song data from PFS ({threads} thread(s))...")
+    sys.stdout.flush()
+    
+    def pfs_extract(count):
+        start = time.perf_counter()
+        try:
+            run_cmd(f'{PKGTOOL_ENV} DOTNET_ThreadPool_UnfairSemaphoreSpinLimit=0 DOTNET_ProcessorCount={count} PkgTool.Core pfs_extract {pfs_file} {pfs_extract_dir}', show_output=True, indent="\t\t\t", timeout=3600)
+        except RuntimeError:
+            if PKGTOOL_TUNER:
+                PKGTOOL_TUNER.record(nbytes, count, ok=False)
+            raise
+        if PKGTOOL_TUNER:
+            PKGTOOL_TUNER.record(nbytes, count, ok=True, seconds=time.perf_counter() - start)
+    
+    try:
+        pfs_extract(threads)
+    except RuntimeError as e:
+        if error_tracker:
+            error_tracker.add_error('pfs_extraction_failed', pkg_name, str(e))
+        log(f"\t\tFirst attempt failed: {e}")
+        log("\t\tRetrying with single thread...")
+        pfs_extract(1)
+
+
+def find_songdta_files(pfs_extract_dir):
+    """Find all .songdta_ps4 files under an extracted PFS."""
+    songdta_files = []
+    for root, dirs, files in os.walk(pfs_extract_dir):
+        for f in files:
+            if f.endswith('.songdta_ps4'):
+                songdta_files.append(os.path.join(root, f))
+    return songdta_files
+
+
+def extract_songdta_files(pfs_file, pfs_extract_dir, pkg_name, error_tracker=None, use_pfs_reader=True):
+    """Step 2: return the PKG's .songdta_ps4 files as [(path, bytes)].
+    
+    Reads just those files out of the PFS image with pfs_reader when the image
+    layout allows it, otherwise falls back to a full `PkgTool.Core pfs_extract`
+    into pfs_extract_dir.
+    """
+    from pfs_reader import PfsFormatError, read_files_with_suffix
+    with stage_event('pfs_extract', pkg_name, method='pfs_reader') as ev:
+        if use_pfs_reader:
+            try:
+                found = read_files_with_suffix(pfs_file, '.songdta_ps4')
+            except (PfsFormatError, struct.error, OSError, ValueError) as e:
+                log(f"\t\tPFS reader unavailable ({e}); falling back to pfs_extract")
+            else:
+                log(f"\t\t{icon('music')} [3/4] Read {len(found)} song data file(s) directly from PFS image")
+                ev['bytes'] = sum(len(data) for _, data in found)
+                return found
+        
+        ev['method'] = 'pkgtool'
+        extract_pfs_contents(pfs_file, pfs_extract_dir, pkg_name, error_tracker)
+        found = read_songdta_paths(find_songdta_files(pfs_extract_dir), pfs_extract_dir)
+        ev['bytes'] = sum(len(data) for _, data in found)
+        ev['written'] = dir_size(pfs_extract_dir)
+        return found
+
+
+def read_songdta_paths(paths, root):
+    """Load extracted .songdta_ps4 files as [(path relative to root, bytes)]."""
+    songdta = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            songdta.append((os.path.relpath(path, root).replace(os.sep, '/'), f.read()))
+    return songdta
+
+
+def read_songdta_from_pkg(pkg_path):
+    """Steps 1+2 without PkgTool: read .songdta_ps4 files from the PKG's inner PFS in place.
+    
+    Returns [(inner_path, bytes)], or None when the PKG layout (e.g. an
+    encrypted outer PFS) needs `pkg_extractinnerpfs`.
+    """
+    from pfs_reader import PfsFormatError
+    from pkg_reader import PkgFormatError, read_pkg_files_with_suffix
+    with stage_event('pkg_read', os.path.basename(pkg_path)) as ev:
+        try:
+            found = read_pkg_files_with_suffix(pkg_path, '.songdta_ps4')
+        except (PkgFormatError, PfsFormatError, struct.error, OSError, ValueError) as e:
+            log(f"\t\tPKG not readable in place ({e}); using pkg_extractinnerpfs")
+            ev['fallback'] = str(e)[:200]
+            return None
+        log(f"\t\t{icon('music')} [2/4] Read {len(found)} song data file(s) directly from PKG")
+        ev['bytes'] = sum(len(data) for _, data in found)
+        return found
+
+
+def read_songdta_remote(pkg_name):
+    """SMB mode: read .songdta_ps4 files with byte-range reads instead of downloading the PKG.
+    
+    Returns [(inner_path, bytes)], or None when the transport has no range
+    reads (smbclient without smbprotocol) or the PKG needs PkgTool.
+    """
+    from pfs_reader import PfsFormatError
+    from pkg_reader import PkgFormatError, read_pkg_files_with_suffix
+    buf = TRANSPORT.open_range(pkg_name)
+    if buf is None:
+        return None
+    with stage_event('remote_read', pkg_name) as ev, buf:
+        try:
+            found = read_pkg_files_with_suffix(pkg_name, '.songdta_ps4', buffer=buf)
+        except (PkgFormatError, PfsFormatError, struct.error, OSError, ValueError) as e:
+            log(f"\t\tPKG not readable remotely ({e}); downloading it")
+            ev['fallback'] = str(e)[:200]
+            return None
+        finally:
+            ev['fetched'] = buf.bytes_fetched
+        log(f"\t\t{icon('music')} Read {len(found)} song data file(s) from the share "
+            f"({buf.bytes_fetched / (1024 * 1024):,.1f} of {len(buf) / (1024 * 1024):,.1f} MB transferred)")
+        ev['bytes'] = sum(len(data) for _, data in found)
+        return found
+
+
+def remote_identity(pkg_name):
+    """(size, None) of an SMB PKG from the listing, for the song data cache."""
+    entry = TRANSPORT.listed.get(pkg_name)
+    return (entry.size if entry else None), None
+
+
+def parse_songdta_files(songdta_files, pkg_name, source_name, temp_dir, metadata_dir=None, empty_baseline=None):
+    """Parse [(path, bytes)] songdta files into song dicts, apply the empty-song baseline and tag the source.
+    
+    The raw parser output is also cached as metadata_<pkg>.json (in the
+    background when METADATA_WRITER is running).
+    """
+    from extract_binary_dta import parse_songdta_bytes
+    from metadata_writer import write_json_atomic
+    basename = pkg_name.replace('.pkg', '')
+    
+    # Write to metadata_dir if provided, otherwise temp_dir
+    if metadata_dir:
+        os.makedirs(metadata_dir, exist_ok=True)
+        temp_output = os.path.join(metadata_dir, f'metadata_{basename}.json')
+    else:
+        temp_output = os.path.join(temp_dir, f'metadata_{basename}.json')
+    
+    songs = []
+    with stage_event('parse', pkg_name, bytes=sum(len(data) for _, data in songdta_files)) as ev:
+        for path, data in songdta_files:
+            try:
+                songs.append(parse_songdta_bytes(data, path))
+            except Exception as e:
+                log(f"\t\tERROR parsing {os.path.basename(path)}: {e}")
+        ev['songs'] = len(songs)
+    
+    if METADATA_WRITER:
+        METADATA_WRITER.write(temp_output, songs)
+    else:
+        write_json_atomic(temp_output, songs)
+    
+    # Handle empty songs using baseline if provided
+    if empty_baseline:
+        for song in songs:
+            # Use _debug_file (filename) as the key for the baseline mapping
+            filename = song.get('_debug_file', '')
+            short_name = filename.replace('.songdta_ps4', '')
+            
+            if not song.get('artist') or song.get('artist') == 'Unknown':
+                if short_name in empty_baseline:
+                    baseline_info = empty_baseline[short_name]
+                    # Use baseline if current is empty or 'Unknown'
+                    current_title = song.get('title')
+                    current_artist = song.get('artist')
+                    
+                    if not current_title or current_title == short_name:
+                        song['title'] = baseline_info.get('title') or current_title
+                    if not current_artist or current_artist == 'Unknown':
+                        song['artist'] = baseline_info.get('artist') or current_artist
+                    # Mark as inferred so we know it came from fallback
+                    song['inferred'] = True
+
+    for song in songs:
+        binary_source = song.get('source', '')
+        use_pkg_source = (
+            source_name not in ('unknown', 'Custom') or 
+            binary_source in ('Custom', 'unknown', '')
+        )
+        if use_pkg_source:
+            song['source'] = source_name
+    
+    log(f"\t\tExtracted {len(songs)} songs")
+    return songs
+
+
+def cache_songdta(pkg_name, songdta_files, source_name, identity=(None, None)):
+    """Keep a PKG's raw song data so --reparse can re-run the parser without re-extracting."""
+    if SONGDTA_CACHE is None or not songdta_files:
+        return
+    size, mtime = identity
+    try:
+        SONGDTA_CACHE.put(pkg_name, songdta_files, source=source_name, size=size, mtime=mtime)
+    except OSError as e:
+        log(warning(f"Could not cache song data for {pkg_name}: {e}"))
+
+
+def cache_and_parse_songdta(songdta_files, pkg_name, source_name, identity, temp_dir, metadata_dir, empty_baseline):
+    """Cache and parse a PKG's song data; [] when the PKG has none."""
+    if not songdta_files:
+        log("\t\tNo songdta files found!")
+        return []
+    cache_songdta(pkg_name, songdta_files, source_name, identity)
+    return parse_songdta_files(songdta_files, pkg_name, source_name, temp_dir, metadata_dir, empty_baseline)
+
+
+def reparse_cached_songdta(args, empty_baseline):
+    """--reparse: rebuild every metadata_<pkg>.json from the raw song data cache."""
+    log(f"{icon('cached')} Reparsing cached song data for {len(SONGDTA_CACHE)} PKGs...")
+    start = datetime.now()
+    total = 0
+    for pkg_name, record, songdta_files in SONGDTA_CACHE.items():
+        source = record.get('source') or get_pkg_source(pkg_name)
+        total += len(parse_songdta_files(songdta_files, pkg_name, source, args.temp_dir,
+                                         args.metadata_dir, empty_baseline))
+    elapsed = (datetime.now() - start).total_seconds()
+    log(success(f"Reparsed {total} songs from {len(SONGDTA_CACHE)} cached PKGs in {elapsed:.1f}s"))
+
+
+def cleanup_work_dir(work_dir, pkg_name):
+    """Remove a PKG's scratch directory to free disk space."""
+    log(f"\t\t{icon('wrench')} [4/4] Cleaning up extraction files...")
+    sys.stdout.flush()
+    with stage_event('cleanup', pkg_name):
+        shutil.rmtree(work_dir, ignore_errors=True)
+    log(success(f"Done: {pkg_name}"))
+
+
+def extract_songdta_from_pkg(pkg_path, source_name, temp_dir, metadata_dir=None, empty_baseline=None, error_tracker=None,
+                             use_pfs_reader=True, identity=None):
+    """Extract only .songdta_ps4 files from a PKG using two-step extraction.
+    
+    identity is the PKG's (size, mtime) for the song data cache (default: stat pkg_path).
+    """
+    from songdta_cache import pkg_identity
     pkg_name = os.path.basename(pkg_path)
     log(style(f"[1/4] Extracting: {pkg_name}", color_name='cyan'))
     log(f"\t\t{icon('gear')} [1/4] Extracting: {pkg_name}")
     sys.stdout.flush()
     
-    basename = pkg_name.replace('.pkg', '')
-    work_dir = os.path.join(temp_dir, 'pfs_extract_' + basename)
-    pfs_file = os.path.join(work_dir, "inner.pfs")
+    work_dir = get_work_dir(pkg_name, temp_dir)
     pfs_extract_dir = os.path.join(work_dir, "pfs_contents")
     
-    os.makedirs(work_dir, exist_ok=True)
-    
     try:
-        # Step 1: Extract inner PFS image
-        log(f"\t\t{icon('floppy')} [2/4] Extracting PFS image...")
-        sys.stdout.flush()
-        run_cmd(f'DOTNET_SYSTEM_GLOBALIZATION_INVARIANT=1 DOTNET_BUNDLE_EXTRACT_BASE_DIR=/tmp/dotnet_extract PkgTool.Core pkg_extractinnerpfs "{pkg_path}" {pfs_file}', show_output=True, indent="\t\t", timeout=3600)
+        songdta_files = read_songdta_from_pkg(pkg_path) if use_pfs_reader else None
+        if songdta_files is None:
+            pfs_file = extract_inner_pfs(pkg_path, work_dir)
+            songdta_files = extract_songdta_files(pfs_file, pfs_extract_dir, pkg_name, error_tracker, use_pfs_reader)
+        return cache_and_parse_songdta(songdta_files, pkg_name, source_name, identity or pkg_identity(pkg_path),
+                                       temp_dir, metadata_dir, empty_baseline)
         
-        # Step 2: Extract PFS contents with limited parallelism to avoid file lock errors
-        # Using environment variables to limit thread pool size and avoid parallel extraction
-        log(f"\t\t{icon('music')} [3/4] Extracting song data from PFS...")
+    finally:
+        # Clean up to free disk space
+        cleanup_work_dir(work_dir, pkg_name)
+
+
+def categorize_pkg_error(error_tracker, pkg_name, e):
+    """Record a PKG failure under the ErrorTracker category matching what failed; returns the category.
+    
+    Transient causes (memory-mapped files, file locks, timeouts) are checked
+    first, since those failures are retried (retry_queue.py).
+    """
+    error_msg = str(e)
+    if 'UnauthorizedAccessException' in error_msg or 'MemoryMapped' in error_msg:
+        category = 'memory_map_error'
+    elif 'being used by another process' in error_msg or ('IOException' in error_msg and 'lock' in error_msg.lower()):
+        category = 'file_lock_errors'
+    elif 'timed out' in error_msg or isinstance(e, (TimeoutError, subprocess.TimeoutExpired)):
+        category = 'timeout_errors'
+    elif 'pkg_extractinnerpfs' in error_msg:
+        category = 'pfs_image_extract_failed'
+    elif 'pfs_extract' in error_msg:
+        category = 'pfs_contents_extract_failed'
+    else:
+        category = 'pkg_processing_failed'
+    error_tracker.add_error(category, pkg_name, error_msg)
+    return category
+
+
+def process_pkg(pkg_path, args, empty_baseline, error_tracker, label=''):
+    """Fetch (SMB mode) and extract a single PKG.
+    
+    Returns the extracted songs, or None if the PKG could not be fetched.
+    Extraction errors are raised for the caller to categorize.
+    """
+    from songdta_cache import pkg_identity
+    source = get_pkg_source(pkg_path)
+    pkg_name = os.path.basename(pkg_path)
+    
+    # For SMB mode: read the song data in place if possible, else fetch the PKG
+    if args.smb and args.pfs_reader:
+        log(f"{label} Reading: {pkg_name}")
+        songdta_files = read_songdta_remote(pkg_name)
+        if songdta_files is not None:
+            return cache_and_parse_songdta(songdta_files, pkg_name, source, remote_identity(pkg_name),
+                                           args.temp_dir, args.metadata_dir, empty_baseline)
+    
+    if args.smb:
+        log(f"{label} Fetching: {pkg_name}")
         sys.stdout.flush()
-        try:
-            # Limit to 2 threads to reduce file lock conflicts
-            run_cmd(f'DOTNET_SYSTEM_GLOBALIZATION_INVARIANT=1 DOTNET_BUNDLE_EXTRACT_BASE_DIR=/tmp/dotnet_extract DOTNET_ThreadPool_UnfairSemaphoreSpinLimit=0 DOTNET_ProcessorCount=2 PkgTool.Core pfs_extract {pfs_file} {pfs_extract_dir}', show_output=True, indent="\t\t\t", timeout=3600)
-        except RuntimeError as e:
-            if error_tracker:
-                error_tracker.add_error('pfs_extraction_failed', pkg_name, str(e))
-            log(f"\t\tFirst attempt failed: {e}")
-            log("\t\tRetrying with single thread...")
-            run_cmd(f'DOTNET_SYSTEM_GLOBALIZATION_INVARIANT=1 DOTNET_BUNDLE_EXTRACT_BASE_DIR=/tmp/dotnet_extract DOTNET_ThreadPool_UnfairSemaphoreSpinLimit=0 DOTNET_ProcessorCount=1 PkgTool.Core pfs_extract {pfs_file} {pfs_extract_dir}', show_output=True, indent="\t\t\t", timeout=3600)
         
-        # Find all .songdta_ps4 files
-        songdta_files = []
-        for root, dirs, files in os.walk(pfs_extract_dir):
-            for f in files:
-                if f.endswith('.songdta_ps4'):
-                    songdta_files.append(os.path.join(root, f))
-        
-        if not songdta_files:
-            log(f"\t\tNo songdta files found!")
-            return []
-        
-        # Extract metadata using Python script
-        # Write to metadata_dir if provided, otherwise temp_dir
-        if metadata_dir:
-            os.makedirs(metadata_dir, exist_ok=True)
-            temp_output = os.path.join(metadata_dir, f'metadata_{basename}.json')
-        else:
-            temp_output = os.path.join(temp_dir, f'metadata_{basename}.json')
-        files_arg = ' '.join(f'"{f}"' for f in songdta_files)
-        run_cmd(f'python3 /workspace/RB4/scripts/extract_binary_dta.py {files_arg} {temp_output}', show_output=True, indent="\t\t", timeout=300)
+        # Fetch from SMB to temp dir (resumes a partial download)
+        with stage_event('fetch', pkg_name) as ev:
+            fetch_ok = TRANSPORT.fetch(pkg_name, args.temp_dir)
+            ev['ok'] = bool(fetch_ok)
+            if fetch_ok:
+                ev['written'] = os.path.getsize(os.path.join(args.temp_dir, pkg_name))
         
-        # Load and tag with source
-        with open(temp_output) as f:
-            songs = json.load(f)
+        if not fetch_ok:
+            error_tracker.add_error('pkg_download_failed', pkg_name)
+            log(f"  ERROR: Failed to fetch {pkg_name} from SMB")
+            return None
         
-        # Handle empty songs using baseline if provided
-        if empty_baseline:
-            for song in songs:
-                # Use _debug_file (filename) as the key for the baseline mapping
-                filename = song.get('_debug_file', '')
-                short_name = filename.replace('.songdta_ps4', '')
-                
-                if not song.get('artist') or song.get('artist') == 'Unknown':
-                    if short_name in empty_baseline:
-                        baseline_info = empty_baseline[short_name]
-                        # Use baseline if current is empty or 'Unknown'
-                        current_title = song.get('title')
-                        current_artist = song.get('artist')
-                        
-                        if not current_title or current_title == short_name:
-                            song['title'] = baseline_info.get('title') or current_title
-                        if not current_artist or current_artist == 'Unknown':
-                            song['artist'] = baseline_info.get('artist') or current_artist
-                        # Mark as inferred so we know it came from fallback
-                        song['inferred'] = True
+        # Use the fetched file
+        pkg_path = os.path.join(args.temp_dir, pkg_name)
     
-        for song in songs:
-            binary_source = song.get('source', '')
-            use_pkg_source = (
-                source_name not in ('unknown', 'Custom') or 
-                binary_source in ('Custom', 'unknown', '')
-            )
-            if use_pkg_source:
-                song['source'] = source_name
-        
-        log(f"\t\tExtracted {len(songs)} songs")
-        return songs
-        
-    finally:
-        # Clean up to free disk space
-        log(f"\t\t{icon('wrench')} [4/4] Cleaning up extraction files...")
-        sys.stdout.flush()
-        shutil.rmtree(work_dir, ignore_errors=True)
-        log(success(f"Done: {pkg_name}"))
+    log(f"{label} Processing: {pkg_name}")
+    sys.stdout.flush()
+    
+    songs = extract_songdta_from_pkg(pkg_path, source, args.temp_dir, args.metadata_dir, empty_baseline, error_tracker,
+                                     use_pfs_reader=args.pfs_reader,
+                                     identity=pkg_identity(pkg_path, include_mtime=not args.smb))
+    
+    # For SMB mode: clean up immediately after processing to free space
+    if args.smb and os.path.exists(pkg_path):
+        os.remove(pkg_path)
+        log(f"\tCleaned up {pkg_name} to free space")
+    
+    return songs
+
+
+def run_pkg_pipeline(pkg_names, args, empty_baseline, error_tracker, on_pkg_done):
+    """Process SMB PKGs as a staged pipeline so downloads overlap extraction.
+    
+    Stages: fetch → inner PFS extract → PFS extract → parse → cleanup, with the
+    merge (on_pkg_done bookkeeping) on this thread. PKGs in flight are capped by
+    a disk budget acquired before each download and released at cleanup. When
+    the transport supports byte-range reads, fetch first tries to read the song
+    data in place; PKGs read that way skip the download and extract stages.
+    """
+    from pkg_pipeline import PkgJob, Stage, StagedPipeline
+    from pkg_scheduler import DiskBudget, estimate_pkg_footprint
+    from songdta_cache import pkg_identity
+    budget = DiskBudget(args.temp_dir, headroom_bytes=args.disk_headroom_mb * 1024 * 1024)
+    
+    def fetch(job):
+        job.started = time.perf_counter()
+        job.source = get_pkg_source(job.pkg_name)
+        if args.pfs_reader:
+            log(f"{job.label} Reading: {job.pkg_name}")
+            songdta_files = read_songdta_remote(job.pkg_name)
+            if songdta_files is not None:
+                job.songdta_files = songdta_files
+                job.bytes = sum(len(data) for _, data in songdta_files)
+                return
+        need = estimate_pkg_footprint(job.pkg_name, downloaded=True, size_hint=job.size_hint)
+        budget.acquire(need, on_wait=lambda n, avail: log(
+            f"\tWaiting for disk space: {job.pkg_name} needs ~{n // (1024 * 1024):,} MB, {avail // (1024 * 1024):,} MB available"))
+        job.reserved_bytes = need
+        log(f"{job.label} Fetching: {job.pkg_name}")
+        with stage_event('fetch', job.pkg_name) as ev:
+            ev['ok'] = fetch_ok = bool(TRANSPORT.fetch(job.pkg_name, args.temp_dir))
+            if fetch_ok:
+                ev['written'] = os.path.getsize(os.path.join(args.temp_dir, job.pkg_name))
+        if not fetch_ok:
+            error_tracker.add_error('pkg_download_failed', job.pkg_name)
+            log(f"  ERROR: Failed to fetch {job.pkg_name} from SMB")
+            job.skipped = True
+            return
+        job.pkg_path = os.path.join(args.temp_dir, job.pkg_name)
+        job.source = get_pkg_source(job.pkg_path)
+        job.bytes = job.size_hint = os.path.getsize(job.pkg_path)
+    
+    def inner_extract(job):
+        if job.pkg_path is None:
+            return  # song data already read from the share
+        log(f"{job.label} Processing: {job.pkg_name}")
+        log(style(f"[1/4] Extracting: {job.pkg_name}", color_name='cyan'))
+        job.work_dir = get_work_dir(job.pkg_name, args.temp_dir)
+        job.pfs_extract_dir = os.path.join(job.work_dir, "pfs_contents")
+        if args.pfs_reader:
+            songdta_files = read_songdta_from_pkg(job.pkg_path)
+            if songdta_files is not None:
+                job.songdta_files = songdta_files
+                job.bytes = os.path.getsize(job.pkg_path)
+                return
+        job.pfs_file = extract_inner_pfs(job.pkg_path, job.work_dir)
+        job.bytes = os.path.getsize(job.pfs_file)
+    
+    def pfs_extract(job):
+        if job.pfs_file is None:
+            return  # already read in place by inner_extract
+        job.songdta_files = extract_songdta_files(job.pfs_file, job.pfs_extract_dir, job.pkg_name,
+                                                  error_tracker, args.pfs_reader)
+        job.bytes = os.path.getsize(job.pfs_file)
+    
+    def parse(job):
+        identity = pkg_identity(job.pkg_path, include_mtime=False) if job.pkg_path else remote_identity(job.pkg_name)
+        job.songs = cache_and_parse_songdta(job.songdta_files, job.pkg_name, job.source, identity,
+                                            args.temp_dir, args.metadata_dir, empty_baseline)
+        if job.songdta_files:
+            job.bytes = sum(len(data) for _, data in job.songdta_files)
+    
+    def cleanup(job):
+        try:
+            if job.work_dir:
+                cleanup_work_dir(job.work_dir, job.pkg_name)
+            if job.pkg_path and os.path.exists(job.pkg_path):
+                os.remove(job.pkg_path)
+                log(f"\tCleaned up {job.pkg_name} to free space")
+        finally:
+            budget.release(job.reserved_bytes)
+    
+    pipeline = StagedPipeline([
+        Stage('fetch', fetch),
+        Stage('inner_extract', inner_extract, workers=args.workers),
+        Stage('pfs_extract', pfs_extract, workers=args.workers),
+        Stage('parse', parse),
+        Stage('cleanup', cleanup, run_on_error=True),
+    ])
+    
+    total = len(pkg_names)
+    jobs = (PkgJob(name, label=f"[{i}/{total}]",
+                   size_hint=TRANSPORT.listed[name].size if name in TRANSPORT.listed else None)
+            for i, name in enumerate(pkg_names, 1))
+    
+    def merge(job):
+        on_pkg_done(job.pkg_name, job.songs, job.error,
+                    seconds=time.perf_counter() - job.started if job.started else None, size=job.size_hint)
+    
+    pipeline.run(jobs, merge)
+    
+    log(f"\n{icon('chart')} Pipeline stage throughput:")
+    for line in pipeline.summary_lines():
+        log(f"   {line}")
+
+
+def write_perf_report(recorder, wall_seconds, temp_dir):
+    """Save the run's per-PKG perf records, append them to the history and log the summary."""
+    import perf_report
+    records = recorder.records()
+    if not records:
+        return
+    history_file = get_perf_history_file(temp_dir)
+    report_file = f"{os.path.splitext(LOG_FILE)[0]}.perf.json"
+    run_id = recorder.started.isoformat(timespec='seconds')
+    try:
+        history = perf_report.load_history(history_file)
+        summary = perf_report.summarize(records, wall_seconds, history)
+        perf_report.write_report(report_file, records, summary, wall_seconds, run_id)
+        perf_report.append_history(history_file, records, run_id)
+    except (OSError, ValueError) as e:
+        log(warning(f"Could not write performance report: {e}"))
+        return
+    log(f"\n{icon('chart')} Performance report ({report_file}):")
+    for line in summary:
+        log(f"   {line}")
+
+
+def publish_partial(args, processed_pkgs):
+    """Republish the text lists, HTML and docs copy from the songs extracted so far.
+    
+    Every file is written to a temp name and renamed into place, so readers
+    never see a missing or half-written list while extraction continues.
+    """
+    from rb4_text_lists import generate_song_lists
+    from empty_song_processor import get_songs_with_fallback
+    from generate_html_list import generate_html, load_page_title
+    
+    rb4_dir = '/workspace/RB4'
+    html_output = f"{args.songlist_dir}/RB4SongList.html"
+    docs_index = "/workspace/docs/RB4SongList.html"
+    if METADATA_WRITER:
+        METADATA_WRITER.flush()  # metadata of finished PKGs must be on disk
+    with stage_event('publish', None) as ev:
+        songs = get_songs_with_fallback(args.metadata_dir)
+        generate_song_lists(args.baseline, songs, os.path.join(rb4_dir, 'output'), sorted(processed_pkgs),
+                            rb4_dir=rb4_dir, atomic=True)
+        generate_html(args.metadata_dir, html_output, load_page_title(), songs=songs)
+        if os.path.isdir(os.path.dirname(docs_index)):
+            shutil.copy(html_output, f"{docs_index}.tmp")
+            os.replace(f"{docs_index}.tmp", docs_index)
+        ev['songs'] = len(songs)
+    log(f"{icon('html')} Published partial song lists and HTML ({len(songs)} songs)")
 
 
-def main():
+def run_tail_stages(args, processed_pkgs_file, custom_songs=None, rebuild_output_json=False, force=False):
+    """Generate song lists, HTML, the docs copy and the backup, skipping stages whose inputs are unchanged.
+    
+    The song catalog (metadata JSONs with the empty-song fallback applied) is
+    loaded at most once and shared by the output JSON, text list and HTML
+    stages, which all render in-process. custom_songs are the songs just
+    written to output_json (default: the catalog). With rebuild_output_json
+    (no new PKGs), output_json is first rebuilt from the catalog. State is
+    kept in <temp_dir>/tail_stages.json.
+    """
+    from metadata_store import STORE_FILENAME as METADATA_STORE_FILENAME
+    from rb4_text_lists import generate_song_lists
+    from song_index import delta_path, write_songs
+    from stage_graph import StageGraph, STATUS_RAN
+    from empty_song_processor import get_songs_with_fallback
+    from generate_html_list import generate_html, load_page_title, CONFIG_PATH
+    
+    rb4_dir = '/workspace/RB4'
+    scripts_dir = os.path.dirname(os.path.abspath(__file__))
+    html_output = f"{args.songlist_dir}/RB4SongList.html"
+    docs_index = "/workspace/docs/RB4SongList.html"
+    backup_script = os.path.join(os.path.dirname(__file__), 'backup_rb4_run.sh')
+    song_lists = [os.path.join(rb4_dir, 'output', f'SongListSortedBy{key}{clean}.txt')
+                  for key in ('Artist', 'SongName') for clean in ('', 'Clean')]
+    node_cmd = (f'cd {rb4_dir} && node generate_rb4_song_list.js --baseline {args.baseline} '
+                f'--custom {args.output_json} --processed {processed_pkgs_file}')
+    empty_songs_baseline = os.path.join(rb4_dir, 'rb4_empty_songs_full.json')
+    catalog_cache = []
+    
+    def catalog():
+        if not catalog_cache:
+            log(f"{icon('loading')} Loading songs from {args.metadata_dir}...")
+            with stage_event('load_catalog', None) as ev:
+                catalog_cache.append(get_songs_with_fallback(args.metadata_dir))
+                ev['songs'] = len(catalog_cache[0])
+        return catalog_cache[0]
+    
+    def output_json():
+        songs = catalog()
+        with stage_event('write_output', None):
+            write_songs(args.output_json, songs)
+        log(f"Saved {len(songs)} songs to {args.output_json}")
+    
+    def text_lists():
+        with stage_event('song_lists', None):
+            if args.node_lists:
+                run_cmd(node_cmd)
+                return
+            processed = []
+            if os.path.exists(processed_pkgs_file):
+                with open(processed_pkgs_file) as f:
+                    processed = json.load(f)
+            stats = generate_song_lists(args.baseline, custom_songs if custom_songs is not None else catalog(),
+                                        os.path.join(rb4_dir, 'output'), processed, rb4_dir=rb4_dir)
+        log(f"\tBaseline: {stats['baseline']} songs, custom: {stats['custom']} songs "
+            f"({stats['replaced']} baseline songs replaced), {stats['unique']} unique, {stats['duplicates']} duplicates")
+    
+    def html():
+        songs = catalog()
+        log(f"{icon('html')} Generating HTML song list...")
+        with stage_event('html', None):
+            generate_html(args.metadata_dir, html_output, load_page_title(), songs=songs)
+    
+    def docs_copy():
+        if os.path.exists(html_output):
+            with stage_event('docs_copy', None):
+                shutil.copy(html_output, docs_index)
+            log(f"{icon('docs')} Copied HTML to docs for GitHub Pages: {docs_index}")
+    
+    def backup():
+        log(f"\n{icon('backup')} Running automatic backup...")
+        if os.path.exists(backup_script):
+            with stage_event('backup', None):
+                run_cmd(f'bash {backup_script}')
+            log(f"{icon('backup')} Backup complete!")
+    
+    graph = StageGraph(get_tail_state_file(args.temp_dir), log=log, ignore=(METADATA_STORE_FILENAME,))
+    if rebuild_output_json:
+        graph.add('output_json', output_json,
+                  inputs=[args.metadata_dir, empty_songs_baseline, os.path.join(scripts_dir, 'empty_song_processor.py')],
+                  outputs=[args.output_json, delta_path(args.output_json)])
+    renderer = os.path.join(rb4_dir, 'generate_rb4_song_list.js') if args.node_lists else os.path.join(scripts_dir, 'rb4_text_lists.py')
+    graph.add('song_lists', text_lists,
+              inputs=[args.output_json, delta_path(args.output_json), processed_pkgs_file, args.baseline, renderer,
+                      os.path.join(rb4_dir, 'update_history.json')],
+              outputs=song_lists, params=node_cmd if args.node_lists else 'python')
+    graph.add('html', html,
+              inputs=[args.metadata_dir, empty_songs_baseline, os.path.join(rb4_dir, 'rb4songlistWithRivals.txt'), CONFIG_PATH] +
+                     [os.path.join(scripts_dir, f) for f in ('generate_html_list.py', 'html_themes.py', 'empty_song_processor.py')],
+              outputs=[html_output])
+    graph.add('docs_copy', docs_copy, inputs=[html_output], outputs=[docs_index])
+    graph.add('backup', backup,
+              inputs=song_lists + [html_output, args.output_json, delta_path(args.output_json), processed_pkgs_file,
+                                   get_state_journal_file(args.temp_dir), get_update_history_file(args.temp_dir),
+                                   backup_script])
+    
+    start = time.perf_counter()
+    results = graph.run(force=force)
+    ran = [name for name, status in results.items() if status == STATUS_RAN]
+    if ran:
+        log(f"{icon('check')} Ran {', '.join(ran)} in {time.perf_counter() - start:.1f}s")
+    else:
+        log(f"{icon('check')} Song lists, HTML and backup are up to date")
+    log_event('tail_stages', **results)
+    return results
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser(
         description='Extract song metadata from Rock Band 4 PKG files',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -373,16 +964,61 @@ Examples:
                         help='Disable incremental mode - re-process all PKGs')
     parser.add_argument('--reprocess-cached-metadata', action='store_true',
                         help='Skip PKG extraction, reprocess existing metadata files only')
+    parser.add_argument('--reparse', action='store_true',
+                        help='Re-run the songdta parser over cached raw song data (no PKG extraction), then regenerate lists')
     parser.add_argument('-v', '--verbose', action='store_true',
                         help='Verbose output')
     parser.add_argument('--smb', action='store_true',
                         help='PKGs are on SMB share (use smbclient to access)')
+    parser.add_argument('--transport', choices=['smbclient', 'local'], default='smbclient',
+                        help="How --smb reaches the PKGs: one smbclient session (default), or 'local' to serve "
+                             "--pkg-dir through the SMB download path (offline testing/benchmarks)")
     parser.add_argument('--log', default=None,
                         help='Log file path (default: temp_dir/rb4_extract_<timestamp>.log)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Number of PKGs to extract in parallel (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--disk-headroom-mb', type=int, default=DEFAULT_DISK_HEADROOM_MB,
+                        help=f'Free space (MB) to keep in --temp-dir when admitting parallel PKGs (default: {DEFAULT_DISK_HEADROOM_MB})')
+    parser.add_argument('--no-pfs-reader', action='store_false', dest='pfs_reader',
+                        help='Always use PkgTool.Core (pkg_extractinnerpfs + pfs_extract) instead of reading songdta files from the PKG/PFS directly')
+    parser.add_argument('--force-lists', action='store_true',
+                        help='Regenerate song lists, HTML, docs copy and backup even if their inputs are unchanged')
+    parser.add_argument('--node-lists', action='store_true',
+                        help='Generate the text song lists with node generate_rb4_song_list.js instead of in-process')
+    parser.add_argument('--trace', metavar='OUT_JSON', default=None,
+                        help='Write a Chrome trace-event timeline of the run (open in Perfetto or chrome://tracing)')
+    parser.add_argument('--all-versions', action='store_true',
+                        help='Extract every version of a content ID, not just the newest (e.g. -V0100 and -V0200)')
+    parser.add_argument('--diff-versions', action='store_true',
+                        help='Print song data differences between versions of each content ID and exit (local PKGs)')
+    parser.add_argument('--pkgtool-threads', type=int, default=None, metavar='N',
+                        help='Fixed DOTNET_ProcessorCount for PkgTool pfs_extract (default: learned per storage type and PKG size)')
+    parser.add_argument('--retry-attempts', type=int, default=DEFAULT_RETRY_ATTEMPTS, metavar='N',
+                        help=f'Attempts per PKG for transient failures (file locks, memory-map errors, timeouts) '
+                             f'before giving up; 0 disables the retry queue (default: {DEFAULT_RETRY_ATTEMPTS})')
+    parser.add_argument('--order', choices=PKG_ORDERS, default=DEFAULT_PKG_ORDER,
+                        help=f'PKG processing order (default: {DEFAULT_PKG_ORDER})')
+    parser.add_argument('--publish-every', type=int, default=DEFAULT_PUBLISH_EVERY, metavar='N',
+                        help='Republish the song lists and HTML from the songs so far every N PKGs (default: off)')
+    parser.add_argument('--publish-minutes', type=float, default=DEFAULT_PUBLISH_MINUTES, metavar='M',
+                        help='Republish the song lists and HTML at most every M minutes (default: off)')
     parser.add_argument('--progress-length', type=int, default=DEFAULT_PROGRESS_BAR_LENGTH,
                         help=f'Progress bar length in characters (default: {DEFAULT_PROGRESS_BAR_LENGTH})')
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+
+    # Pipeline modules load only once the arguments are parsed, so --help stays fast
+    import perf_report
+    from log_sink import LogSink, events_file_for
+    from metadata_writer import MetadataWriter
+    from pkg_scheduler import DiskAwareScheduler, estimate_pkg_footprint
+    from pkg_versions import select_latest, group_versions, diff_versions, format_diff
+    from pkgtool_tuner import PkgToolTuner
+    from retry_queue import RetryQueue
+    from song_index import SongIndex, ADDED, UPDATED, UNCHANGED, delta_path, song_key
+    from songdta_cache import SongdtaCache, pkg_identity
+    from state_journal import StateJournal, STATUS_DONE, STATUS_FAILED
+    from trace_writer import TraceWriter
 
     # Ensure directories exist on fresh checkout
     os.makedirs(args.temp_dir, exist_ok=True)
@@ -390,26 +1026,37 @@ Examples:
     os.makedirs(args.songlist_dir, exist_ok=True)
     os.makedirs(os.path.dirname(args.output_json), exist_ok=True)
     
-    global LOG_FILE
+    global LOG_FILE, LOG_SINK, METADATA_WRITER, SONGDTA_CACHE, PERF_RECORDER, TRACE, PKGTOOL_TUNER, TRANSPORT
     if args.log:
         LOG_FILE = args.log
     else:
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
         LOG_FILE = os.path.join(args.temp_dir, f'rb4_extract_{ts}.log')
+    LOG_SINK = LogSink(LOG_FILE, events_file_for(LOG_FILE))
+    atexit.register(LOG_SINK.close)  # flush buffered log lines on every exit path
+    if args.trace:
+        TRACE = TraceWriter(args.trace)
+        atexit.register(TRACE.close)  # runs before LOG_SINK.close (atexit is LIFO)
     
     # Derive state file paths from temp_dir
     PROCESSED_PKGS_FILE = get_processed_pkgs_file(args.temp_dir)
+    STATE_JOURNAL_FILE = get_state_journal_file(args.temp_dir)
     UPDATE_HISTORY_FILE = get_update_history_file(args.temp_dir)
     ERROR_LOG_FILE = get_error_log_file(args.temp_dir)
     
-    log(f"{icon('floppy')} Logging to: {LOG_FILE}")
+    log(f"{icon('floppy')} Logging to: {LOG_FILE} (events: {events_file_for(LOG_FILE)})")
+    if TRACE:
+        log(f"{icon('chart')} Writing trace timeline to: {args.trace}")
     log(f"{icon('clock')} Started at {datetime.now().isoformat()}")
+    log_event('run_start', argv=sys.argv[1:] if argv is None else list(argv),
+              workers=args.workers, smb=args.smb, incremental=args.incremental)
     
     # Initialize error tracker
     error_tracker = ErrorTracker()
     if not args.incremental:
         log(f"{icon('wrench')} Full rebuild mode - clearing previous state...")
-        for f in [PROCESSED_PKGS_FILE, UPDATE_HISTORY_FILE, args.output_json]:
+        for f in [PROCESSED_PKGS_FILE, STATE_JOURNAL_FILE, UPDATE_HISTORY_FILE, get_tail_state_file(args.temp_dir), get_retry_queue_file(args.temp_dir),
+                  args.output_json, delta_path(args.output_json)]:
             if os.path.exists(f):
                 os.remove(f)
         # Clear output directory BEFORE generating (skip directories)
@@ -423,30 +1070,46 @@ Examples:
     empty_baseline = load_empty_songs_baseline()
     if empty_baseline:
         log(f"Loaded empty songs baseline with {len(empty_baseline)} entries")
+    
+    SONGDTA_CACHE = SongdtaCache(get_songdta_cache_dir(args.temp_dir))
+    if SONGDTA_CACHE.stale:
+        log(warning(f"Cached song data of {len(SONGDTA_CACHE.stale)} PKGs is missing from a truncated "
+                    f"{SONGDTA_CACHE.pack_path}; they will be extracted again"))
+    PKGTOOL_TUNER = PkgToolTuner(get_pkgtool_tuning_file(args.temp_dir), storage='smb' if args.smb else 'local',
+                                 fixed=args.pkgtool_threads)
+    if args.reparse:
+        reparse_cached_songdta(args, empty_baseline)
+        args.reprocess_cached_metadata = True
 
-    if args.smb:
-        # Use smbclient to list PKGs from SMB share
-        log("Accessing PKGs via SMB...")
+    remote = {}  # SMB mode: PKG name -> RemoteEntry (size, mtime) from the listing
+    # Handle --reprocess-cached-metadata / --reparse: skip PKG scanning entirely
+    if args.reprocess_cached_metadata:
+        log(f"{icon('cached')} Reprocessing cached metadata (skipping PKG scan)...")
+        pkg_files = []
+    elif args.smb:
+        # One smbclient session lists the share and fetches each PKG in turn
+        log(f"Accessing PKGs via SMB ({args.transport} transport)...")
         sys.path.insert(0, '/workspace/RB4/scripts')
-        from smb_pkg_finder import list_pkgs as smb_list_pkgs
-        pkg_names = smb_list_pkgs()
-        pkg_files = pkg_names  # Store just names, we'll fetch one at a time
+        from smb_pkg_finder import list_pkg_entries, open_transport
+        from pkg_transport import TransportError
+        TRANSPORT = open_transport(args.transport, args.pkg_dir)
+        try:
+            remote = {e.name: e for e in list_pkg_entries(TRANSPORT)}
+        except TransportError as e:
+            log(error(f"Could not list the SMB share: {e}"))
+            sys.exit(1)
+        pkg_files = sorted(remote)  # Store just names, we'll fetch one at a time
     else:
-        # Handle --reprocess-cached-metadata: skip PKG scanning entirely
-        if args.reprocess_cached_metadata:
-            log(f"{icon('cached')} Reprocessing cached metadata (skipping PKG scan)...")
-            pkg_files = []
-        else:
-            # Local directory - filter out macOS hidden files (starting with ._)
-            if not os.path.isdir(args.pkg_dir):
-                log(f"ERROR: PKG directory not found: {args.pkg_dir}")
-                sys.exit(1)
-            
-            pkg_files = [
-                os.path.join(args.pkg_dir, f) 
-                for f in os.listdir(args.pkg_dir) 
-                if f.endswith('.pkg') and not f.startswith('._')
-            ]
+        # Local directory - filter out macOS hidden files (starting with ._)
+        if not os.path.isdir(args.pkg_dir):
+            log(f"ERROR: PKG directory not found: {args.pkg_dir}")
+            sys.exit(1)
+        
+        pkg_files = [
+            os.path.join(args.pkg_dir, f) 
+            for f in os.listdir(args.pkg_dir) 
+            if f.endswith('.pkg') and not f.startswith('._')
+        ]
     
     # Skip to "no new PKGs" section for reprocess
     if args.reprocess_cached_metadata:
@@ -454,139 +1117,256 @@ Examples:
     
     log(f"{icon('package')} Found {len(pkg_files)} PKG files in {args.pkg_dir}")
     
-    # Load processed PKGs for incremental mode
-    processed = load_processed_pkgs(PROCESSED_PKGS_FILE) if args.incremental else set()
+    if args.diff_versions:
+        if args.smb:
+            log(error("--diff-versions reads PKGs in place and needs a local --pkg-dir"))
+            sys.exit(1)
+        multi = [v for v in group_versions(sorted(pkg_files), read_header=True).values() if len(v) > 1]
+        log(f"{icon('mag')} {len(multi)} content IDs with more than one version")
+        for versions in multi:
+            for older, newer, diff in diff_versions(versions):
+                for line in format_diff(older, newer, diff):
+                    log(f"  {line}")
+        sys.exit(0)
+    
+    # Only the newest version of each content ID (a -V0200 PKG supersedes its -V0100)
+    replaces = {}  # newest PKG name -> names of the older versions it supersedes
+    if not args.all_versions and pkg_files:
+        pkg_files, superseded = select_latest(pkg_files, read_header=not args.smb)
+        if superseded:
+            log(f"  Skipping {len(superseded)} superseded PKG versions (use --all-versions to extract them)")
+            for old, new in sorted(superseded.items()):
+                log_event('pkg_superseded', pkg=os.path.basename(old), by=os.path.basename(new))
+                replaces.setdefault(os.path.basename(new), []).append(os.path.basename(old))
+    
+    # Load processed PKGs for incremental mode (compacts the journal)
+    journal = StateJournal(STATE_JOURNAL_FILE, PROCESSED_PKGS_FILE)
+    processed = journal.processed() if args.incremental else set()
     log(f"Incremental mode: {'enabled' if args.incremental else 'disabled'}")
     if processed:
         log(f"  Already processed: {len(processed)} PKGs")
     
-    # Filter out already-processed PKGs
+    # Filter out already-processed PKGs (a local PKG whose size changed, or whose
+    # cached song data was lost, is redone)
     if args.incremental:
-        new_pkgs = [p for p in pkg_files if os.path.basename(p) not in processed]
+        new_pkgs = [p for p in pkg_files
+                    if os.path.basename(p) in SONGDTA_CACHE.stale
+                    or not journal.is_done(os.path.basename(p), remote[p].size if args.smb else os.path.getsize(p))]
         skipped = len(pkg_files) - len(new_pkgs)
         if skipped > 0:
             log(f"  Skipping {skipped} already-processed PKGs")
         pkg_files = new_pkgs
     
+    # PKGs in the retry queue wait out their backoff; ones out of attempts are left alone
+    retry_queue = RetryQueue(get_retry_queue_file(args.temp_dir), args.retry_attempts) if args.retry_attempts > 0 else None
+    if retry_queue:
+        waiting = [p for p in pkg_files if not retry_queue.ready(os.path.basename(p))]
+        if waiting:
+            exhausted = sum(retry_queue.exhausted(os.path.basename(p)) for p in waiting)
+            log(f"  Skipping {len(waiting)} PKGs in the retry queue ({exhausted} out of attempts, "
+                f"{len(waiting) - exhausted} waiting for backoff; see {retry_queue.path})")
+            pkg_files = [p for p in pkg_files if p not in waiting]
+    
     if not pkg_files:
+        journal.close()
         log(f"{icon('check')} No new PKGs to process.")
         log(f"\n{icon('sparkles')} Generating song lists from existing data...")
         
-        # Load existing songs from metadata directory
-        log(f"{icon('loading')} Loading songs from {args.metadata_dir}...")
-        from empty_song_processor import get_songs_with_fallback
-        baseline_path = '/workspace/RB4/rb4_empty_songs_full.json'
-        songs = get_songs_with_fallback(args.metadata_dir)
-        
-        # Save as output JSON
-        with open(args.output_json, 'w') as f:
-            json.dump(songs, f, indent=2)
-        log(f"Saved {len(songs)} songs to {args.output_json}")
-        
-        # Generate TXT lists
-        run_cmd(f'cd /workspace/RB4 && node generate_rb4_song_list.js --baseline {args.baseline} --custom {args.output_json} --processed {PROCESSED_PKGS_FILE}')
-        
-        # Generate HTML
-        log(f"{icon('html')} Generating HTML song list...")
-        html_output = f"{args.songlist_dir}/RB4SongList.html"
-        run_cmd(f'python3 /workspace/RB4/scripts/generate_html_list.py {args.metadata_dir} {html_output}')
-        
-        # Copy to docs for GitHub Pages
-        docs_index = "/workspace/docs/RB4SongList.html"
-        if os.path.exists(html_output):
-            import shutil
-            shutil.copy(html_output, docs_index)
-            log(f"{icon('docs')} Copied HTML to docs for GitHub Pages: {docs_index}")
-        
-        # Auto-backup latest run
-        log(f"\n{icon('backup')} Running automatic backup...")
-        backup_script = os.path.join(os.path.dirname(__file__), 'backup_rb4_run.sh')
-        if os.path.exists(backup_script):
-            run_cmd(f'bash {backup_script}')
-            log(f"{icon('backup')} Backup complete!")
+        run_tail_stages(args, PROCESSED_PKGS_FILE, rebuild_output_json=True, force=not args.incremental or args.force_lists)
         
         log(success("Pipeline complete!"))
         sys.exit(0)
     
-    log(f"{icon('folder')} Processing {len(pkg_files)} new PKGs...")
+    pkg_files = order_pkgs(pkg_files, args.order, remote if args.smb else None)
+    order_note = '' if args.order == 'name' else f" ({args.order} first)"
+    log(f"{icon('folder')} Processing {len(pkg_files)} new PKGs{order_note}...")
     
     all_songs = []
     total_pkgs = len(pkg_files)
+    done_count = 0
+    
+    def on_pkg_done(pkg_path, songs, exc, seconds=None, size=None):
+        """Bookkeeping for a finished PKG (always runs on the main thread)."""
+        with stage_event('merge', os.path.basename(pkg_path)):
+            record_pkg_done(pkg_path, songs, exc, seconds, size)
     
-    for idx, pkg_path in enumerate(sorted(pkg_files), 1):
-        source = get_pkg_source(pkg_path)
+    def record_pkg_done(pkg_path, songs, exc, seconds, size):
+        nonlocal done_count
+        done_count += 1
         pkg_name = os.path.basename(pkg_path)
+        mtime = None
+        if not args.smb and os.path.exists(pkg_path):
+            size, mtime = pkg_identity(pkg_path)
+        if exc is not None:
+            category = categorize_pkg_error(error_tracker, pkg_name, exc)
+            log(error(f"ERROR processing {pkg_name}: {exc}"))
+            queue_retry(pkg_path, category, exc)
+            journal.record(pkg_name, STATUS_FAILED, size, mtime, seconds, error=exc)
+            log_event('pkg_done', pkg=pkg_name, status=STATUS_FAILED, seconds=seconds and round(seconds, 3), bytes=size, error=str(exc)[:200])
+            PERF_RECORDER.pkg_done(pkg_name, STATUS_FAILED, size, seconds)
+            return
+        if songs is None:
+            journal.record(pkg_name, STATUS_FAILED, size, mtime, seconds, error='download failed')
+            queue_retry(pkg_path, 'pkg_download_failed', 'download failed')
+            log_event('pkg_done', pkg=pkg_name, status=STATUS_FAILED, seconds=seconds and round(seconds, 3), bytes=size, error='download failed')
+            PERF_RECORDER.pkg_done(pkg_name, STATUS_FAILED, size, seconds)
+            return  # fetch failed, already recorded
+        all_songs.extend(songs)
+        drop_superseded_metadata(pkg_name, songs)
+        if retry_queue:
+            retry_queue.succeeded(pkg_name)
         
-        # For SMB mode: fetch one file at a time
-        if args.smb:
-            log(f"[{idx}/{total_pkgs}] Fetching: {pkg_name}")
-            sys.stdout.flush()
-            
-            # Fetch from SMB to temp dir
-            sys.path.insert(0, '/workspace/RB4/scripts')
-            from smb_pkg_finder import get_pkg_file
-            fetch_ok = get_pkg_file(pkg_name, args.temp_dir)
-            
-            if not fetch_ok:
-                log(f"  ERROR: Failed to fetch {pkg_name} from SMB")
-                continue
-            
-            # Use the fetched file
-            pkg_path = os.path.join(args.temp_dir, pkg_name)
+        # Mark as processed
+        journal.record(pkg_name, STATUS_DONE, size, mtime, seconds, len(songs))
+        log_event('pkg_done', pkg=pkg_name, status=STATUS_DONE, seconds=seconds and round(seconds, 3), bytes=size, songs=len(songs))
+        PERF_RECORDER.pkg_done(pkg_name, STATUS_DONE, size, seconds, len(songs))
         
-        log(f"[{idx}/{total_pkgs}] Processing: {pkg_name}")
+        log(f"{icon('chart')} {progress_bar(done_count, total_pkgs, length=args.progress_length)} | {icon('music')} {len(all_songs)} songs")
         sys.stdout.flush()
-        
+        maybe_publish()
+    
+    publish_pkgs = 0  # PKGs finished since the last partial publish
+    last_publish = time.monotonic()
+    
+    def maybe_publish():
+        """--publish-every / --publish-minutes: republish lists and HTML mid-run."""
+        nonlocal publish_pkgs, last_publish
+        publish_pkgs += 1
+        due = ((args.publish_every and publish_pkgs >= args.publish_every) or
+               (args.publish_minutes and time.monotonic() - last_publish >= args.publish_minutes * 60))
+        if not due or done_count == total_pkgs:
+            return  # the final lists follow right after the last PKG
         try:
-            songs = extract_songdta_from_pkg(pkg_path, source, args.temp_dir, args.metadata_dir, empty_baseline, error_tracker)
-            all_songs.extend(songs)
-            
-            # For SMB mode: clean up immediately after processing to free space
-            if args.smb and os.path.exists(pkg_path):
-                os.remove(pkg_path)
-                log(f"\tCleaned up {pkg_name} to free space")
-            
-            # Mark as processed
-            processed.add(pkg_name)
-            save_processed_pkgs(processed, PROCESSED_PKGS_FILE)
-            
-            pct = int(idx / total_pkgs * 100)
-            log(f"{icon('chart')} {progress_bar(idx, total_pkgs, length=args.progress_length)} | {icon('music')} {len(all_songs)} songs")
-            sys.stdout.flush()
-            
+            publish_partial(args, journal.processed())
         except Exception as e:
-            error_msg = str(e)
-            # Categorize the error based on what failed
-            if 'pkg_extractinnerpfs' in error_msg:
-                error_tracker.add_error('pfs_image_extract_failed', pkg_name, error_msg)
-            elif 'pfs_extract' in error_msg:
-                error_tracker.add_error('pfs_contents_extract_failed', pkg_name, error_msg)
-            elif 'UnauthorizedAccessException' in error_msg or 'MemoryMapped' in error_msg:
-                error_tracker.add_error('memory_map_error', pkg_name, error_msg)
-            else:
-                error_tracker.add_error('pkg_processing_failed', pkg_name, error_msg)
-            log(error(f"ERROR processing {pkg_name}: {e}"))
-            continue
+            log(warning(f"Partial publish failed: {e}"))
+        publish_pkgs = 0
+        last_publish = time.monotonic()
+    
+    def queue_retry(pkg_path, category, exc):
+        if retry_queue is None:
+            return
+        entry = retry_queue.failed(os.path.basename(pkg_path), category, exc, pkg_path)
+        if entry and retry_queue.exhausted(os.path.basename(pkg_path)):
+            log(warning(f"Giving up on {os.path.basename(pkg_path)} after {entry['attempts']} attempts ({category})"))
+        elif entry:
+            log(f"\t{icon('hourglass')} Queued for retry in {retry_queue.delay(entry['attempts']):.0f}s "
+                f"(attempt {entry['attempts']}/{retry_queue.max_attempts}, {category})")
+    
+    def retry_pkg(pkg_name, entry):
+        """Run one queued PKG again, serially, and book it like any other PKG."""
+        nonlocal total_pkgs
+        total_pkgs += 1
+        label = f"[retry {entry['attempts'] + 1}/{retry_queue.max_attempts}]"
+        start = time.perf_counter()
+        try:
+            songs = process_pkg(entry['path'], args, empty_baseline, error_tracker, label)
+        except Exception as e:
+            on_pkg_done(entry['path'], None, e, seconds=time.perf_counter() - start)
+            return
+        on_pkg_done(entry['path'], songs, None, seconds=time.perf_counter() - start)
+    
+    retired_keys = set()  # song index keys only a superseded PKG version had
+    
+    def drop_superseded_metadata(pkg_name, songs):
+        """Remove metadata of older versions so the catalog only lists the newest one.
+        
+        Songs the older version had and the new one dropped are queued in
+        retired_keys, so the song index (and the text lists) lose them too.
+        """
+        new_keys = {song_key(s) for s in songs}
+        for old in replaces.get(pkg_name, ()):
+            old_metadata = os.path.join(args.metadata_dir, f"metadata_{old.replace('.pkg', '')}.json")
+            if os.path.exists(old_metadata):
+                try:
+                    with open(old_metadata, encoding='utf-8') as f:
+                        retired_keys.update(song_key(s) for s in json.load(f) or [] if isinstance(s, dict))
+                except (OSError, ValueError) as e:
+                    log(warning(f"Could not read {os.path.basename(old_metadata)}: {e}"))
+                os.remove(old_metadata)
+                log(f"\t\tRemoved {os.path.basename(old_metadata)} (superseded by {pkg_name})")
+        retired_keys.difference_update(new_keys)
+    
+    def run_timed(pkg_path, label):
+        """process_pkg returning (songs, seconds) for the journal."""
+        start = time.perf_counter()
+        songs = process_pkg(pkg_path, args, empty_baseline, error_tracker, label)
+        return songs, time.perf_counter() - start
+    
+    def on_timed_done(pkg_path, result, exc):
+        songs, seconds = result or (None, None)
+        on_pkg_done(pkg_path, songs, exc, seconds=seconds)
+    
+    METADATA_WRITER = MetadataWriter()
+    PERF_RECORDER = perf_report.PerfRecorder()
+    extract_start = time.perf_counter()
+    try:
+        if args.smb:
+            log(f"{icon('rocket')} Pipeline mode: fetch → extract → parse ({args.workers} extract worker(s))")
+            run_pkg_pipeline(pkg_files, args, empty_baseline, error_tracker, on_pkg_done)
+        elif args.workers > 1:
+            log(f"{icon('rocket')} Parallel mode: up to {args.workers} PKGs at once (disk headroom {args.disk_headroom_mb} MB)")
+            scheduler = DiskAwareScheduler(args.temp_dir, args.workers,
+                                           headroom_bytes=args.disk_headroom_mb * 1024 * 1024, log=log)
+            labels = {p: f"[{i}/{total_pkgs}]" for i, p in enumerate(pkg_files, 1)}
+            scheduler.run(
+                pkg_files,
+                job=lambda p: run_timed(p, labels[p]),
+                estimate=lambda p: estimate_pkg_footprint(p, downloaded=args.smb),
+                on_done=on_timed_done,
+            )
+        else:
+            for idx, pkg_path in enumerate(pkg_files, 1):
+                start = time.perf_counter()
+                try:
+                    songs = process_pkg(pkg_path, args, empty_baseline, error_tracker, f"[{idx}/{total_pkgs}]")
+                except Exception as e:
+                    on_pkg_done(pkg_path, None, e, seconds=time.perf_counter() - start)
+                    continue
+                on_pkg_done(pkg_path, songs, None, seconds=time.perf_counter() - start)
+        if retry_queue and retry_queue.attempted:
+            log(f"\n{icon('hourglass')} Retrying PKGs that failed with transient errors (one at a time)...")
+            retries = retry_queue.run_pass(retry_pkg, log=log)
+            log_event('retry_pass', retries=retries, queued=len(retry_queue))
+    finally:
+        # Flush the journal and export processed_pkgs.json for the Node generator
+        journal.close()
+        # Metadata caches must be on disk before the list/HTML generators read them
+        METADATA_WRITER.close()
+        if TRANSPORT:
+            TRANSPORT.close()
+        for path, e in METADATA_WRITER.errors:
+            error_tracker.add_warning('metadata_write_failed', os.path.basename(path), str(e))
+            log(warning(f"Could not write {path}: {e}"))
+        METADATA_WRITER = None
     
     log(f"\n{icon('trophy')} Extracted {icon('music')} {len(all_songs)} songs from {icon('package')} {len(pkg_files)} PKGs")
+    log_event('extraction_done', pkgs=len(pkg_files), songs=len(all_songs))
+    write_perf_report(PERF_RECORDER, time.perf_counter() - extract_start, args.temp_dir)
+    PERF_RECORDER = None
     
-    # Load existing songs if incremental mode and file exists
-    if args.incremental and os.path.exists(args.output_json):
-        with open(args.output_json) as f:
-            existing = json.load(f)
-        # Merge (new songs will override duplicates)
-        existing_dict = {(s['artist'], s['title']): s for s in existing}
-        for song in all_songs:
-            key = (song['artist'], song['title'])
-            existing_dict[key] = song
-        all_songs = list(existing_dict.values())
-        log(f"Merged with existing: {len(all_songs)} total songs")
-    
-    # Filter out garbage entries
-    valid_songs = [s for s in all_songs if s.get('title') or s.get('artist')]
-    garbage = len(all_songs) - len(valid_songs)
+    # Merge into the song index (keyed by songId, else shortName; see song_index.py)
+    with stage_event('merge_index', None) as ev:
+        index = SongIndex.load(args.output_json) if args.incremental else SongIndex(args.output_json)
+        previous_total = len(index)
+        # Filter out garbage entries
+        valid_new = [s for s in all_songs if s.get('title') or s.get('artist')]
+        garbage = len(all_songs) - len(valid_new)
+        changes = {ADDED: [], UPDATED: []}
+        for song in valid_new:
+            status = index.upsert(song)
+            if status != UNCHANGED:
+                changes[status].append(song)
+        # Songs only a superseded PKG version had leave the index with its metadata
+        retired_keys.difference_update(song_key(s) for s in valid_new)
+        removed = [key for key in sorted(retired_keys) if index.remove(key) is not None]
+        ev.update(added=len(changes[ADDED]), updated=len(changes[UPDATED]), removed=len(removed), total=len(index))
+    if previous_total:
+        log(f"Merged with existing: {len(index)} total songs "
+            f"({len(changes[ADDED])} added, {len(changes[UPDATED])} updated, {len(removed)} removed)")
     if garbage > 0:
         log(f"Filtered out {garbage} garbage entries")
+    valid_songs = index.all_songs()
     
     # NEW: Track empty songs separately (these are REAL songs with unparseable metadata)
     # They have no title/artist because .songdta_ps4 contains only zeros
@@ -598,14 +1378,7 @@ Examples:
         log(f"Saved {len(empty_songs)} empty songs (unparseable metadata) to: {empty_output}")
     
     # Record update for history (always, to show in output)
-    # Track which songs are new in this run
-    existing_set = set()
-    if os.path.exists(args.output_json):
-        with open(args.output_json) as f:
-            existing = json.load(f)
-            existing_set = {(s['artist'], s['title']) for s in existing}
-    
-    new_only = [s for s in valid_songs if (s['artist'], s['title']) not in existing_set]
+    new_only = changes[ADDED]
     if new_only:
         record_update(new_only, len(valid_songs))
         log(f"Recorded {len(new_only)} new songs in update history")
@@ -614,43 +1387,28 @@ Examples:
         record_update(valid_songs, len(valid_songs))
         log(f"Recorded {len(valid_songs)} songs in update history (full rebuild)")
     
-    # Write JSON
-    with open(args.output_json, 'w') as f:
-        json.dump(valid_songs, f, indent=2)
-    log(f"\n{icon('floppy')} Written: {args.output_json}")
+    # Write JSON: only the changed songs, unless compaction is due or Node reads the file
+    with stage_event('write_output', None) as ev:
+        written = ev['songs'] = index.save(compact=args.node_lists)
+    if not written:
+        log(f"\n{icon('floppy')} No song changes for: {args.output_json}")
+    elif index.delta_records:
+        log(f"\n{icon('floppy')} Written: {written} changed songs to {index.delta_file}")
+    else:
+        log(f"\n{icon('floppy')} Written: {args.output_json}")
     
     # Check for issues
     zero_dur = [s for s in valid_songs if s.get('durationMs', 0) == 0]
     if zero_dur:
         log(f"\n⚠️  Songs with durationMs=0: {len(zero_dur)}")
     
-    # Generate song lists
-    log(f"\n{icon('sparkles')} Generating song lists...")
-    run_cmd(f'cd /workspace/RB4 && node generate_rb4_song_list.js --baseline {args.baseline} --custom {args.output_json} --processed {PROCESSED_PKGS_FILE}')
-    
-    # Generate HTML output
-    log(f"{icon('html')} Generating HTML song list...")
-    html_output = f"{args.songlist_dir}/RB4SongList.html"
-    run_cmd(f'python3 /workspace/RB4/scripts/generate_html_list.py {args.metadata_dir} {html_output}')
-    
-    # Copy to docs for GitHub Pages
-    docs_index = "/workspace/docs/RB4SongList.html"
-    if os.path.exists(html_output):
-        import shutil
-        shutil.copy(html_output, docs_index)
-        log(f"{icon('docs')} Copied HTML to docs for GitHub Pages: {docs_index}")
-    
     # Save error tracking report
     error_tracker.save()
     log(f"\n📊 Error Report: {error_tracker.summary()}")
     log(f"   Full report saved to: {ERROR_LOG_FILE}")
     
-    # Auto-backup latest run
-    log(f"\n{icon('backup')} Running automatic backup...")
-    backup_script = os.path.join(os.path.dirname(__file__), 'backup_rb4_run.sh')
-    if os.path.exists(backup_script):
-        run_cmd(f'bash {backup_script}')
-        log(f"{icon('backup')} Backup complete!")
+    log(f"\n{icon('sparkles')} Generating song lists...")
+    run_tail_stages(args, PROCESSED_PKGS_FILE, custom_songs=valid_songs, force=not args.incremental or args.force_lists)
     
     log("\n✅ Pipeline complete!")
     log(f"{icon('clip')} Processed PKGs saved to: {PROCESSED_PKGS_FILE}")
@@ -0,0 +1,528 @@
+#!/usr/bin/env python3
+"""
+In-process RB4 text song list renderer.
+
+Python port of generate_rb4_song_list.js, producing the same four files from
+the baseline list and an in-memory list of custom songs, so the pipeline does
+not have to write rb4_custom_songs.json, start Node and have it read the file
+back:
+
+    SongListSortedByArtist.txt        SongListSortedByArtistClean.txt
+    SongListSortedBySongName.txt      SongListSortedBySongNameClean.txt
+
+Line formats, header, de-duplication, sorting, profanity filter and the
+update-history / processed-PKG footer follow the Node script. Source and
+artist names in the header are ordered with locale_key, which mirrors Node's
+localeCompare (ICU root collation: case and accents only break ties, and
+lowercase sorts first). The Node script is still the reference and can be used
+instead with `rb4_songlist_generator.py --node-lists`.
+
+Usage:
+    python3 rb4_text_lists.py --baseline rb4songlistWithRivals.txt \\
+        --custom rb4_temp/rb4_custom_songs.json --processed rb4_temp/processed_pkgs.json
+"""
+
+import json
+import math
+import os
+import re
+import unicodedata
+from datetime import datetime
+
+RB4_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Profanity filter (mirrors generate_song_lists.py / the Node script)
+CURSE_WORDS = [
+    'shit', 'fuck', 'bitch', 'bullshit', 'motherfucker', 'mother fucker',
+    'tits', 'boobs', 'jizz',
+    'asshole', 'dumbass', 'badass', 'jackass', 'smartass',
+    'bastard', 'damn', 'dammit', 'goddamn', 'god damn',
+]
+CURSE_REGEXES = [re.compile(p, re.IGNORECASE) for p in (
+    r'\bdick\b', r'\bcock\b', r'\bcum\b', r'\bpiss(ed|ing)?\b')]
+
+SOURCE_MAP = {
+    'RB4': 'Rock Band 4',
+    'Rivals': 'Rock Band 4 Rivals',
+    'rb4': 'Rock Band 4',
+    'rbn1': 'Rock Band Network 1',
+    'rbn2': 'Rock Band Network 2',
+    'rb1': 'Rock Band 1',
+    'rb2': 'Rock Band 2',
+    'rb3': 'Rock Band 3',
+    'rb1_dlc': 'Rock Band 1 DLC',
+    'rb2_dlc': 'Rock Band 2 DLC',
+    'rb3_dlc': 'Rock Band 3 DLC',
+    'rb4_dlc': 'Rock Band 4 DLC',
+    'greenday': 'Rock Band Green Day',
+    'gdrb': 'Rock Band Green Day',
+    'beatles': 'The Beatles: Rock Band',
+    'lego': 'LEGO Rock Band',
+}
+BASELINE_SOURCE_MAP = {'RB4': 'Rock Band 4', 'Rivals': 'Rock Band 4 Rivals'}
+
+# Songs tagged "Custom" whose PKG name matches an official disc/DLC pass
+PKG_SOURCE_MAP = [
+    ('RB3ROCKBAND3PASS', 'Rock Band 3'),
+    ('RB2ROCKBAND2PASS', 'Rock Band 2'),
+    ('RB1ROCKBAND1PASS', 'Rock Band 1'),
+    ('GDRBGREENDAYPASS', 'Rock Band Green Day'),
+    ('LEGOROCKBANDPASS', 'LEGO Rock Band'),
+    ('BEACHBOYS', 'Rock Band 3'),
+    ('RB4PRESEASONPASS', 'Rock Band 4 DLC'),
+    ('RB4SEASON', 'Rock Band 4 DLC'),
+    ('RB4RBNRERELEASES', 'Rock Band Network 1'),
+    ('RBLEGACYDLCPASS1', 'Rock Band 1 DLC'),
+    ('RBLEGACYDLCPASS2', 'Rock Band 2 DLC'),
+    ('RBLEGACYDLCPASS3', 'Rock Band 3 DLC'),
+    ('RBN', 'Rock Band Network 1'),
+]
+
+FULL_BAND = '🎸 🎸 🥁 🎤'
+FULL_BAND_HARMONY = '🎸 🎸 🥁 🎤 🎤'
+
+_BASELINE_YEAR_DUR = re.compile(r'^(.*)\s\((\d{4}|\?)\s*/\s*([\d:?]+)\)\s*$')
+_BASELINE_ALBUM = re.compile(r'^(.*?)\s\(([^)]+)\)\s*$')
+_LEADING_FLOAT = re.compile(r'^\s*[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?')
+_LEADING_INT = re.compile(r'^\s*[+-]?\d+')
+
+
+def matches_curse(line):
+    low = line.lower()
+    return any(w in low for w in CURSE_WORDS) or any(r.search(line) for r in CURSE_REGEXES)
+
+
+def normalize(s):
+    """Comparison key (mirrors clean_for_comparison in Python / normalize in Node)."""
+    if not s:
+        return ''
+    return re.sub(r'["\'.,]', '', re.sub(r'\s+', ' ', s.lower().strip()))
+
+
+# Printable ASCII in Node's localeCompare order, case folded (punctuation < digits < letters)
+_LOCALE_ORDER = " _-,;:!?.'\"()[]{}@*/\\&#%`^+<=>|~$0123456789abcdefghijklmnopqrstuvwxyz"
+_LOCALE_RANK = {c: i for i, c in enumerate(_LOCALE_ORDER)}
+
+
+def locale_key(s):
+    """Sort key matching Node's String.prototype.localeCompare (ICU root collation).
+
+    Base characters are compared first, then accents, then case (lowercase
+    first). Characters outside printable ASCII sort after it by code point.
+    """
+    primary, secondary, tertiary = [], [], []
+    for ch in s:
+        decomposed = unicodedata.normalize('NFD', ch)
+        base = decomposed[0]
+        low = base.lower()
+        primary.append(_LOCALE_RANK.get(low, len(_LOCALE_RANK) + ord(low)))
+        secondary.append(decomposed[1:])
+        tertiary.append(0 if base == low else 1)
+    return primary, secondary, tertiary
+
+
+def ms_to_mm_ss(ms):
+    if ms is None or ms < 0:
+        return '?:??'
+    total_sec = math.floor(ms / 1000)
+    return f"{total_sec // 60}:{total_sec % 60:02d}"
+
+
+def mm_ss_to_ms(text):
+    if not text or text == '?:??':
+        return None
+    try:
+        m, s = (int(part) for part in text.split(':')[:2])
+    except ValueError:
+        return None
+    return (m * 60 + s) * 1000
+
+
+def _js_string(value):
+    """String(value) as JavaScript would render a JSON value."""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, list):
+        return ','.join(_js_string(v) for v in value)
+    return str(value)
+
+
+def _parse_float(value):
+    """parseFloat(value), or None for NaN."""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    m = _LEADING_FLOAT.match(str(value))
+    return float(m.group(0)) if m else None
+
+
+def parse_baseline_line(line):
+    """Parse "Artist (Album) - Song Title (Year / MM:SS) - Source" into a song dict."""
+    line = line.strip()
+    dash = line.rfind(' - ')
+    if not line or dash == -1:
+        return None
+    source = line[dash + 3:].strip()
+    rest = line[:dash].strip()
+    m = _BASELINE_YEAR_DUR.match(rest)
+    if not m:
+        return None
+    artist_album_dash = m.group(1).strip()
+    year = None if m.group(2) == '?' else int(m.group(2))
+    duration_ms = mm_ss_to_ms(m.group(3).strip())
+
+    album_dash = artist_album_dash.rfind(' - ')
+    if album_dash == -1:
+        return None
+    artist = artist_album_dash[:album_dash].strip()
+    title = artist_album_dash[album_dash + 3:].strip()
+    album = None
+    m = _BASELINE_ALBUM.match(artist)
+    if m:
+        artist, album = m.group(1).strip(), m.group(2).strip()
+    if not artist or not title:
+        return None
+    return {'artist': artist, 'album': album, 'title': title, 'year': year,
+            'durationMs': duration_ms, 'source': BASELINE_SOURCE_MAP.get(source, source)}
+
+
+def parse_custom_song(obj):
+    """Map an extracted song dict onto the list fields (parseOnyxSong in Node)."""
+    def get(*keys):
+        for k in keys:
+            if obj.get(k) is not None and obj.get(k) != '':
+                return _js_string(obj[k])
+        return None
+
+    def get_num(*keys):
+        for k in keys:
+            v = _parse_float(obj.get(k))
+            if v is not None:
+                return v
+        return None
+
+    artist = get('artist', 'Artist', 'song_artist', 'artist_name')
+    title = get('title', 'Title', 'name', 'song_name', 'songname')
+    album = get('album', 'Album', 'album_name')
+    year_raw = get('year', 'Year', 'year_released', 'release_year')
+    year_match = _LEADING_INT.match(year_raw) if year_raw else None
+    year = int(year_match.group(0)) if year_match else None
+    duration_ms = get_num('duration_ms', 'durationMs', 'length_ms', 'song_length', 'length', 'duration')
+
+    source = get('source', 'source_pkg') or 'Custom'
+    source = SOURCE_MAP.get(source, source)
+    pkg_file = get('_pkg_file') or ''
+    if source == 'Custom' and pkg_file:
+        for pkg, official in PKG_SOURCE_MAP:
+            if pkg in pkg_file:
+                source = official
+                break
+
+    if not artist or not title:
+        return None  # non-song PKG
+    return {'artist': artist, 'album': album, 'title': title, 'year': year, 'durationMs': duration_ms,
+            'source': source, 'shortName': get('shortName', 'shortname') or '',
+            'instruments': get('instruments', 'instrumentEmoji') or '',
+            'inferred': obj.get('inferred') or obj.get('Inferred') or False, '_pkg_file': pkg_file}
+
+
+def _line_parts(song):
+    album = song.get('album') or '(unknown album)'
+    year = song['year'] if song.get('year') is not None else '?'
+    dur = ms_to_mm_ss(song.get('durationMs'))
+    instruments = song.get('instruments') or ''
+    source = song.get('source') or ''
+    is_baseline = source in ('Rock Band 4', 'Rock Band 4 Rivals') or source.startswith('Rock Band 4 ')
+    inferred_flag = song.get('inferred')
+    is_inferred = inferred_flag in (True, '✓', 'true')
+    if (song.get('vocalParts') or 0) > 1:
+        instruments = FULL_BAND_HARMONY
+    elif not instruments and (is_baseline or is_inferred):
+        instruments = FULL_BAND
+    inferred = ' 🔍' if inferred_flag else ''
+    pkg_display = ' '.join(x for x in (f"[{song['shortName']}]" if song.get('shortName') else '',
+                                       f"<{song['_pkg_file']}>" if song.get('_pkg_file') else '') if x)
+    tail = f"({year} / {dur}) - {source} {pkg_display}{inferred} {instruments}"
+    return album, tail
+
+
+def format_artist_line(song):
+    album, tail = _line_parts(song)
+    return f"{song['artist']} ({album}) - {song['title']} {tail}"
+
+
+def format_name_line(song):
+    album, tail = _line_parts(song)
+    return f"{song['title']} by {song['artist']} on {album} {tail}"
+
+
+def _artist_counts(new_songs):
+    counts = {}
+    for s in new_songs:
+        artist = s.get('artist') or 'Unknown'
+        counts[artist] = counts.get(artist, 0) + 1
+    return sorted(counts.items(), key=lambda item: (-item[1], locale_key(item[0])))
+
+
+def _plural(n):
+    return 's' if n > 1 else ''
+
+
+def load_update_history(rb4_dir=RB4_DIR):
+    path = os.path.join(rb4_dir, 'update_history.json')
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return json.load(f) or []
+
+
+def build_header(songs, timestamp, duplicates_count=0, history=None):
+    counts = {}
+    for s in songs:
+        counts[s['source']] = counts.get(s['source'], 0) + 1
+    artists = {normalize(s['artist']) for s in songs}
+    albums = {normalize(s['album']) for s in songs if s.get('album')}
+
+    header = f"Generated on: {timestamp}\n\n"
+    header += "Instrument legend:\n"
+    header += "  🎸 = Guitar/Bass/Pro Guitar\n"
+    header += "  🥁 = Drums/Pro Drums\n"
+    header += "  🎤 = Vocals/Harmony\n"
+    header += "  🎹 = Keys/Pro Keys\n"
+    header += "  🔍 = Inferred (metadata was empty - recovered from shortName)\n\n"
+    header += 'Use these to filter songs: e.g. search for "🎹" to find songs with keyboard parts.\n\n'
+
+    header += f"Total songs: {len(songs) + duplicates_count}\n"
+    if duplicates_count > 0:
+        header += f"Duplicate songs: {duplicates_count}\n"
+    header += f"Total unique songs: {len(songs)}\n"
+    header += f"Total artists: {len(artists)}\n"
+    header += f"Total albums: {len(albums)}\n"
+
+    breakdown = '\n'.join(f"  {src}: {n}" for src, n in sorted(counts.items(), key=lambda item: locale_key(item[0])))
+    header += f"\nBreakdown by source:\n{breakdown}\n\n"
+
+    header += "Line format (Artist-sorted): Artist (Album) - Title (Year / Duration) - Source [ShortName] 🎸🎤🥁\n"
+    header += "  Example: Queen (A Night at the Opera) - Bohemian Rhapsody (1975 / 5:55) - Rock Band 1 DLC [bohemianrhapsody] 🎸🎸🎤🥁\n\n"
+    header += "Line format (Name-sorted): Title by Artist on Album (Year / Duration) - Source [ShortName] 🎸🎤🥁\n"
+    header += "  Example: Bohemian Rhapsody by Queen on A Night at the Opera (1975 / 5:55) - Rock Band 1 DLC [bohemianrhapsody] 🎸🎸🎤🥁\n\n"
+
+    if history:
+        latest = history[-1]
+        new_songs = latest.get('newSongs') or []
+        if new_songs:
+            header += f"---\nNew in this update ({latest.get('timestamp')}): {len(new_songs)} song{_plural(len(new_songs))}\n"
+            counts = _artist_counts(new_songs)
+            for artist, count in counts[:20]:
+                header += f"  {artist}: {count} song{_plural(count)}\n"
+            if len(counts) > 20:
+                header += f"  ... and {len(counts) - 20} more artists\n"
+            header += "\n"
+    return header
+
+
+def load_update_history_from_song_list(song_list_path):
+    """Update history blocks from an existing SongListSortedBySongName.txt footer."""
+    if not os.path.exists(song_list_path):
+        return []
+    with open(song_list_path, encoding='utf-8') as f:
+        content = f.read()
+    m = re.search(r'---\nUpdate History:\n([\s\S]*?)(?:---|\nProcessed PKGs:)', content)
+    if not m:
+        return []
+    section = m.group(1)
+    updates = []
+    for block in re.finditer(r'=== (\d{4}-\d{2}-\d{2} \d{2}:\d{2}): \+(\d+) songs ===', section):
+        next_block = section.find('===', block.start() + 1)
+        text = section[block.start():len(section) if next_block == -1 else next_block]
+        # Like the Node script, only an artist line at the very start of the block would match here
+        artists = [{'artist': a, 'title': f"song {n}"} for a, n in re.findall(r'^\s{2}([^:]+): (\d+) song', text)]
+        updates.append({'timestamp': block.group(1), 'newSongs': artists, 'totalSongs': int(block.group(2))})
+    return updates
+
+
+def build_footer(history, processed_pkgs):
+    """Update history (newest first) and processed PKG list appended to the full lists."""
+    append = ''
+    if history:
+        append += "---\nUpdate History:\n"
+        for h in history:
+            new_songs = h.get('newSongs') or []
+            append += f"\n=== {h.get('timestamp')}: +{len(new_songs)} songs ===\n"
+            for artist, count in _artist_counts(new_songs):
+                append += f"  {artist}: {count} song{_plural(count)}\n"
+        append += "\n"
+    if processed_pkgs:
+        append += "---\nProcessed PKGs:\n"
+        for pkg in processed_pkgs:
+            if pkg.strip():
+                append += f"  {pkg.strip()}\n"
+    return append
+
+
+def format_timestamp(now=None, timezone=None):
+    """Timestamp in the Node script's toLocaleString('en-US') format."""
+    now = now or datetime.now().astimezone()
+    if timezone:
+        try:
+            import zoneinfo
+            now = now.astimezone(zoneinfo.ZoneInfo(timezone))
+        except Exception:
+            pass
+    hour = now.hour % 12 or 12
+    return f"{now:%A}, {now:%B} {now.day}, {now.year} at {hour}:{now:%M:%S} {now:%p} {now.tzname() or 'UTC'}"
+
+
+def _system_timezone():
+    tz = os.environ.get('TZ')
+    if not tz:
+        try:
+            with open('/etc/timezone') as f:
+                tz = f.read().strip() or None
+        except OSError:
+            tz = None
+    return tz
+
+
+def render_song_lists(baseline_songs, custom_songs, processed_pkgs=(), history=None, song_list_history=None,
+                      timestamp=None, allow_duplicates=False):
+    """Build the four list files in memory. Returns ({filename: text}, stats)."""
+    custom_keys = {normalize(s['artist']) + '|' + normalize(s['title']) for s in custom_songs}
+    baseline_uniq = [s for s in baseline_songs if normalize(s['artist']) + '|' + normalize(s['title']) not in custom_keys]
+
+    duplicates = 0
+    if allow_duplicates:
+        all_songs = custom_songs + baseline_uniq
+    else:
+        seen = set()
+        all_songs = []
+        for song in custom_songs + baseline_uniq:
+            key = normalize(song['artist']) + '|' + normalize(song['title'])
+            if key in seen:
+                duplicates += 1
+            else:
+                seen.add(key)
+                all_songs.append(song)
+
+    artist_sorted = sorted(all_songs, key=lambda s: (normalize(s['artist']), normalize(s.get('album') or ''), normalize(s['title'])))
+    name_sorted = sorted(all_songs, key=lambda s: (normalize(s['title']), normalize(s['artist'])))
+
+    timestamp = timestamp or format_timestamp(timezone=_system_timezone())
+    header = build_header(all_songs, timestamp, duplicates, history)
+    full_history = list(song_list_history or [])
+    known = {h.get('timestamp') for h in full_history}
+    full_history += [h for h in (history or []) if h.get('timestamp') not in known]
+    full_history.sort(key=lambda h: h.get('timestamp') or '', reverse=True)
+    footer = build_footer(full_history, list(processed_pkgs))
+
+    files = {}
+    for sort_key, songs, fmt in (('Artist', artist_sorted, format_artist_line),
+                                 ('SongName', name_sorted, format_name_line)):
+        lines = [fmt(s) for s in songs]
+        full = header + '\n'.join(lines) + '\n'
+        if footer:
+            full += footer + '\n'
+        files[f'SongListSortedBy{sort_key}.txt'] = full
+
+        clean = [(line, s) for line, s in zip(lines, songs) if not matches_curse(line)]
+        clean_artists = {normalize(s['artist']) for _, s in clean}
+        clean_albums = {normalize(s['album']) for _, s in clean if s.get('album')}
+        files[f'SongListSortedBy{sort_key}Clean.txt'] = (
+            f"Generated on: {timestamp}\n\n"
+            f"Total songs: {len(clean)}\nTotal artists: {len(clean_artists)}\nTotal albums: {len(clean_albums)}\n\n"
+            + '\n'.join(line for line, _ in clean) + '\n')
+
+    stats = {'baseline': len(baseline_songs), 'custom': len(custom_songs),
+             'replaced': len(baseline_songs) - len(baseline_uniq), 'unique': len(all_songs), 'duplicates': duplicates}
+    return files, stats
+
+
+def load_baseline(baseline_file):
+    """Parse the baseline list. Returns (songs, skipped_line_count)."""
+    songs, skipped = [], 0
+    with open(baseline_file, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            song = parse_baseline_line(line)
+            if song:
+                songs.append(song)
+            else:
+                skipped += 1
+    return songs, skipped
+
+
+def generate_song_lists(baseline_file, custom_songs, out_dir=None, processed_pkgs=(), rb4_dir=RB4_DIR,
+                        allow_duplicates=False, atomic=False):
+    """Render and write the four song list files. custom_songs are extracted song dicts.
+
+    With atomic, the existing lists are not cleared first but replaced one by
+    one, so a reader always finds a complete list (used for mid-run publishing).
+    Returns stats (counts of baseline/custom/unique/duplicate songs and the files written).
+    """
+    out_dir = out_dir or os.path.join(rb4_dir, 'output')
+    baseline_songs, baseline_skipped = load_baseline(baseline_file)
+    parsed = [parse_custom_song(obj) for obj in custom_songs]
+    custom = [s for s in parsed if s]
+
+    # The Node script reads earlier update history from the name-sorted list's footer after
+    # clearing the output directory, so that file is always gone or footer-less by then.
+    os.makedirs(out_dir, exist_ok=True)
+    history_list = os.path.join(rb4_dir, 'output', 'SongListSortedBySongName.txt')
+    if not atomic:
+        for name in os.listdir(out_dir):
+            if (name.startswith('SongList') or name.startswith('RB4SongList')) and name.endswith('.txt'):
+                os.remove(os.path.join(out_dir, name))
+    if atomic and os.path.dirname(os.path.abspath(history_list)) == os.path.abspath(out_dir):
+        song_list_history = []  # what clearing the directory first would have left
+    else:
+        song_list_history = load_update_history_from_song_list(history_list)
+
+    files, stats = render_song_lists(baseline_songs, custom, processed_pkgs, load_update_history(rb4_dir),
+                                     song_list_history, allow_duplicates=allow_duplicates)
+    for name, text in files.items():
+        tmp_path = os.path.join(out_dir, f".{name}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, os.path.join(out_dir, name))
+    stats.update(baseline_skipped=baseline_skipped, skipped=len(parsed) - len(custom),
+                 files=[os.path.join(out_dir, name) for name in sorted(files)])
+    return stats
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Generate RB4 text song lists (Python port of generate_rb4_song_list.js)')
+    parser.add_argument('--baseline', default=os.path.join(RB4_DIR, 'rb4songlistWithRivals.txt'),
+                        help='Baseline song list file')
+    parser.add_argument('--custom', default='/workspace/rb4_temp/rb4_custom_songs.json',
+                        help='Custom songs JSON file')
+    parser.add_argument('--outdir', default=None, help='Output directory (default: RB4/output)')
+    parser.add_argument('--processed', default=None, help='Processed PKGs JSON file')
+    parser.add_argument('--allow-duplicates', action='store_true', help='Allow duplicate songs (for debugging)')
+    args = parser.parse_args(argv)
+
+    from song_index import load_songs
+    custom = load_songs(args.custom)  # the JSON plus any not-yet-compacted delta
+    processed = []
+    if args.processed and os.path.exists(args.processed):
+        with open(args.processed, encoding='utf-8') as f:
+            data = json.load(f)
+        processed = data if isinstance(data, list) else []
+
+    stats = generate_song_lists(args.baseline, custom, args.outdir, processed, allow_duplicates=args.allow_duplicates)
+    print(f"Baseline: {stats['baseline']} songs loaded ({stats['baseline_skipped']} lines skipped)")
+    print(f"Custom: {stats['custom']} songs loaded ({stats['skipped']} entries skipped)")
+    print(f"Total unique songs: {stats['unique']}")
+    print(f"Duplicates found: {stats['duplicates']}")
+    for path in stats['files']:
+        print(f"   {os.path.basename(path)}  ({round(os.path.getsize(path) / 1024)} KB)")
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
@@ -0,0 +1,507 @@
+#!/usr/bin/env python3
+"""
+Corpus-wide .songdta_ps4 layout analyzer (NumPy).
+
+Loads every .songdta_ps4 under the given directories into one
+n_files x record_size uint8 array and computes per-offset statistics for the
+whole corpus at once, instead of reading files one at a time like
+find_offsets.py / get_offsets.py:
+
+    entropy      Shannon entropy of the byte at each offset (bits, 0-8)
+    zero/text    fraction of files with NUL / printable ASCII at the offset
+    f32/u32      fraction of plausible values when the 4 bytes at the offset
+                 are read as a little-endian float (finite, 1e-3 <= |x| < 1e6
+                 or 0) or a small integer (< 10,000,000)
+    distinct     fraction of distinct u32 values (ids are ~1.0, flags ~0)
+    known        with --known, for each field of a metadata JSON/NDJSON
+                 (extract_binary_dta.py output, matched by _debug_file), the
+                 offsets where that value appears exactly or correlates best
+
+From these it prints a region map (constant / text / numeric runs) and either
+validates a layout from songdta_schema.LAYOUTS (per-field checks plus any
+varying bytes no field covers) or proposes a new field table in the
+songdta_schema row format, ready to review and add under the new
+songdta_type. Proposed fields that line up with RB4_FIELDS, shifted to
+the --known matches, get the RB4 names, and the table is checked by parsing
+the corpus with it through extract_binary_dta.
+
+Files are grouped by songdta_type (u32 at offset 0); the most common type
+is analyzed unless --type is given. record_size defaults to the most common
+file length; shorter (truncated) files are left out, longer ones are cut.
+
+Usage:
+    python3 research/analyze_songdta_layouts.py <dir>... [--type N] [--size N]
+        [--known metadata.json] [--validate [LAYOUT] | --propose] [--offsets 800:960]
+
+Requires NumPy.
+"""
+
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from songdta_schema import LAYOUTS, RB4_LAYOUT, SchemaError, SongdtaLayout, check, layout_for  # noqa: E402
+
+# extract_binary_dta result key -> (songdta field, kind)
+KNOWN_FIELDS = {
+    'songId': ('song_id', 'int'),
+    'albumYear': ('album_year', 'int'),
+    'originalYear': ('original_year', 'int'),
+    'albumTrackNumber': ('album_track_number', 'int'),
+    'durationMs': ('song_length', 'int'),
+    'previewStart': ('preview_start', 'float'),
+    'title': ('name', 'str'),
+    'artist': ('artist', 'str'),
+    'album': ('album_name', 'str'),
+    'shortName': ('shortname', 'str'),
+}
+
+TEXT_MIN = 0.98       # fraction of files with printable-or-NUL bytes for a text offset
+START_MIN = 0.9       # fraction of files with a character at a string's first byte
+PLAUSIBLE_MIN = 0.95  # fraction of plausible values for a numeric word
+MATCH_MIN = 0.9       # fraction of exact matches to name a field from --known
+FLAG_BITS = 4.0       # max entropy of a byte proposed as a u8 flag/count packed with others
+STR_MIN = 4           # shortest run proposed as a str field
+
+_KIND = {'u8': 'int', 'i16': 'int', 'u32': 'int', 'f32': 'f32', 'str': 'str'}
+
+
+def load_corpus(paths):
+    """{songdta_type: [(name, bytes), ...]} for every .songdta_ps4 under paths."""
+    groups = {}
+    for path in paths:
+        if os.path.isfile(path):
+            found = [path]
+        else:
+            found = sorted(os.path.join(root, name) for root, _dirs, names in os.walk(path)
+                           for name in names if name.endswith('.songdta_ps4'))
+        for filepath in found:
+            with open(filepath, 'rb') as f:
+                data = f.read()
+            kind = struct.unpack_from('<I', data)[0] if len(data) >= 4 else None
+            groups.setdefault(kind, []).append((os.path.basename(filepath), data))
+    return groups
+
+
+def to_matrix(files, size):
+    """(names, n x size uint8 array) of the files at least size bytes long."""
+    kept = [(name, data) for name, data in files if len(data) >= size]
+    matrix = np.empty((len(kept), size), dtype=np.uint8)
+    for row, (_name, data) in enumerate(kept):
+        matrix[row] = np.frombuffer(data, dtype=np.uint8, count=size)
+    return [name for name, _ in kept], matrix
+
+
+def word_views(matrix):
+    """(u32, f32) of the 4 bytes at every offset: n x (size - 3) arrays."""
+    b = matrix.astype(np.uint32)
+    u32 = b[:, :-3] | (b[:, 1:-2] << 8) | (b[:, 2:-1] << 16) | (b[:, 3:] << 24)
+    return u32, u32.view(np.float32)
+
+
+def byte_stats(matrix):
+    """Per-offset entropy, zero, text (printable or NUL) and char (printable) fractions."""
+    n, size = matrix.shape
+    index = matrix.astype(np.int64) + (np.arange(size, dtype=np.int64) * 256)
+    counts = np.bincount(index.ravel(), minlength=size * 256).reshape(size, 256)
+    p = counts / n
+    with np.errstate(divide='ignore', invalid='ignore'):
+        entropy = np.maximum(-np.nansum(np.where(p > 0, p * np.log2(p), 0.0), axis=1), 0.0)
+    printable = counts[:, 0x20:0x7f].sum(axis=1) / n
+    zero = p[:, 0]
+    return {
+        'entropy': entropy,
+        'zero': zero,
+        'char': printable,
+        'text': printable + zero,
+        'const': counts.max(axis=1) == n,
+        'mode': counts.argmax(axis=1),
+    }
+
+
+def word_stats(u32, f32):
+    """Per-offset plausibility of the 4-byte word as f32 / small u32, and its distinct fraction."""
+    n = u32.shape[0]
+    with np.errstate(invalid='ignore', over='ignore'):
+        mag = np.abs(f32)
+        f32_ok = (np.isfinite(f32) & ((mag == 0) | ((mag >= 1e-3) & (mag < 1e6)))).mean(axis=0)
+    u32_ok = (u32 < 10_000_000).mean(axis=0)
+    ordered = np.sort(u32, axis=0)
+    distinct = (1 + (np.diff(ordered, axis=0) != 0).sum(axis=0)) / n
+    return {'f32': f32_ok, 'u32': u32_ok, 'distinct': distinct}
+
+
+def load_known(path, names):
+    """{result key: array of values in matrix row order} for the rows found in a metadata file."""
+    with open(path) as f:
+        text = f.read()
+    records = json.loads(text) if text.lstrip().startswith('[') else \
+        [json.loads(line) for line in text.splitlines() if line.strip()]
+    by_file = {r.get('_debug_file'): r for r in records if isinstance(r, dict)}
+    rows = [by_file.get(name) for name in names]
+    known = {}
+    for key, (_field, kind) in KNOWN_FIELDS.items():
+        values = [r.get(key) if r else None for r in rows]
+        if kind == 'str':
+            known[key] = values
+        else:
+            known[key] = np.array([np.nan if v in (None, '') else float(v) for v in values])
+    return known
+
+
+def _column_corr(columns, y, chunk=256):
+    """Pearson correlation of every column with y (rows where y is known), chunked."""
+    rows = ~np.isnan(y)
+    y = y[rows] - y[rows].mean()
+    y_norm = np.sqrt((y * y).sum())
+    out = np.zeros(columns.shape[1])
+    for start in range(0, columns.shape[1], chunk):
+        with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+            x = columns[rows, start:start + chunk].astype(np.float64)
+            x[~np.isfinite(x)] = 0.0
+            x -= x.mean(axis=0)
+            r = (x * y[:, None]).sum(axis=0) / (np.sqrt((x * x).sum(axis=0)) * y_norm)
+        out[start:start + chunk] = np.nan_to_num(r)
+    return out
+
+
+def _exact_fraction(columns, y, scale=1.0, tolerance=0.5, chunk=256):
+    """Fraction of rows where column * scale is within tolerance of y, for every column, chunked."""
+    out = np.zeros(columns.shape[1])
+    for start in range(0, columns.shape[1], chunk):
+        with np.errstate(invalid='ignore', over='ignore'):
+            x = columns[:, start:start + chunk].astype(np.float64) * scale
+            out[start:start + chunk] = (np.abs(x - y[:, None]) < tolerance).mean(axis=0)
+    return out
+
+
+def match_known(known, matrix, u32, f32):
+    """{key: (offset, type, exact fraction, |r|, r offset)} best location of each known field.
+
+    Numbers are matched as u32, i16 and f32 (also f32 seconds for millisecond
+    values); |r| is the best correlation with any offset read as f32.
+    """
+    found = {}
+    i16 = (matrix[:, :-1].astype(np.uint16) | (matrix[:, 1:].astype(np.uint16) << 8)).view(np.int16)
+    views = (('u32', u32, 1.0, 0.5), ('i16', i16, 1.0, 0.5), ('f32', f32, 1.0, 0.5), ('f32', f32, 1000.0, 1.0))
+    for key, values in known.items():
+        if KNOWN_FIELDS[key][1] == 'str':
+            hits = np.zeros(matrix.shape[1], dtype=np.int64)
+            total = 0
+            for row, value in enumerate(values):
+                if not value:
+                    continue
+                total += 1
+                pos = matrix[row].tobytes().find(value.encode('utf-8') + b'\x00')
+                if pos >= 0:
+                    hits[pos] += 1
+            if total:
+                best = int(hits.argmax())
+                found[key] = (best, 'str', hits[best] / total, None, None)
+            continue
+        y = values
+        rows = ~np.isnan(y)
+        if rows.sum() < 2:
+            continue
+        candidates = []
+        for name, view, scale, tolerance in views:
+            exact = _exact_fraction(view[rows], y[rows], scale, tolerance)
+            best = int(exact.argmax())
+            candidates.append((exact[best], -best, name))
+        exact, offset, kind = max(candidates)
+        offset = -offset
+        corr = np.abs(_column_corr(f32, y))
+        found[key] = (offset, kind, float(exact), float(corr.max()), int(corr.argmax()))
+    return found
+
+
+def regions(stats):
+    """[(start, end, kind)] runs of constant / text / numeric offsets."""
+    kinds = np.where(stats['const'], 'const', np.where(stats['text'] >= TEXT_MIN, 'text', 'numeric'))
+    runs, start = [], 0
+    for offset in range(1, len(kinds) + 1):
+        if offset == len(kinds) or kinds[offset] != kinds[start]:
+            runs.append((start, offset, str(kinds[start])))
+            start = offset
+    return runs
+
+
+def string_starts(stats, taken):
+    """[(start, end)] of string fields: two characters in most files after a NUL or non-text byte.
+
+    A field runs to the next string start, non-text or taken byte, so its
+    size includes any zero padding after it.
+    """
+    char, text = stats['char'], np.where(taken, 0.0, stats['text'])
+    starts = [offset for offset in range(len(char))
+              if text[offset] >= TEXT_MIN and min(char[offset:offset + 2]) >= START_MIN
+              and (offset == 0 or char[offset - 1] <= 1 - START_MIN or text[offset - 1] < TEXT_MIN)]
+    fields = []
+    for i, start in enumerate(starts):
+        limit = starts[i + 1] if i + 1 < len(starts) else len(char)
+        end = start
+        while end < limit and text[end] >= TEXT_MIN:
+            end += 1
+        if end - start >= STR_MIN:
+            fields.append((start, end))
+    return fields
+
+
+def propose(stats, words, found):
+    """Field rows (name, offset, type[, size]) covering the varying bytes.
+
+    Aligned words of plausible floats become f32 first (their top byte
+    often looks like text), then text runs become str fields, and the other
+    varying bytes are grouped in aligned 4-byte words: low-entropy bytes as
+    separate u8 flags/counts, anything else u32 (or the type --known
+    matched). Constant bytes get no field. Fields are named from --known
+    where it matches.
+    """
+    known = [(v[0], KNOWN_FIELDS[k][0], v[1]) for k, v in found.items() if v[2] >= MATCH_MIN]
+    named = {offset: name for offset, name, _kind in known}
+    int_kind = {offset: kind for offset, _name, kind in known if kind in ('u32', 'i16')}
+    size = len(stats['const'])
+    const, entropy, mode = stats['const'], stats['entropy'], stats['mode']
+    rows, taken = [], np.zeros(size, dtype=bool)
+    for word in range(0, len(words['f32']), 4):
+        if word not in int_kind and not const[word] and words['f32'][word] >= PLAUSIBLE_MIN \
+                and words['u32'][word] < PLAUSIBLE_MIN:
+            rows.append((named.get(word, f'f32_{word}'), word, 'f32'))
+            taken[word:word + 4] = True
+    for start, end in string_starts(stats, taken):
+        rows.append((named.get(start, f'str_{start}'), start, 'str', end - start))
+        taken[start:end] = True
+    offset = 0
+    while offset < size:
+        if taken[offset] or const[offset]:
+            offset += 1
+            continue
+        word = offset - offset % 4
+        if word < len(words['f32']) and not taken[word:word + 4].any():
+            varying = [o for o in range(word, word + 4) if not const[o]]
+            # a constant non-zero byte above a varying one: one value spans the word (years: xx 07)
+            spans = any(const[o] and mode[o] for o in range(varying[0] + 1, word + 4))
+            name = named.get(word)
+            if word in int_kind:
+                rows.append((name, word, int_kind[word]))
+            elif not spans and all(entropy[o] <= FLAG_BITS for o in varying):
+                for o in varying:
+                    rows.append((named.get(o, f'u8_{o}'), o, 'u8'))
+            else:
+                rows.append((name or f'u32_{word}', word, 'u32'))
+            taken[word:word + 4] = True
+            offset = word + 4
+        else:
+            rows.append((named.get(offset, f'u8_{offset}'), offset, 'u8'))
+            taken[offset] = True
+            offset += 1
+    return sorted(rows, key=lambda r: r[1])
+
+
+def canonical_names(rows, found, size):
+    """rows with the RB4 names (and types) of the fields they line up with, plus songdta_type at 0.
+
+    songdta_type, the --known matches and str rows paired in order with the
+    RB4 str fields of the same size (where both have as many) are anchors,
+    each giving the shift of the RB4 offsets at that field. The fields between two anchors take the
+    first anchor's shift up to the split point that lines most of them up
+    with a proposed row of the same kind, and the second's after it. A row
+    lined up with a field is renamed, and takes the RB4 type and size unless
+    that would run into the next row.
+    """
+    fields = RB4_LAYOUT.fields
+    anchors = {'songdta_type': 0}
+    anchors.update((KNOWN_FIELDS[k][0], v[0]) for k, v in found.items() if v[2] >= MATCH_MIN)
+    for width in {f.size for f in fields if f.type == 'str'}:
+        ours = [f.name for f in fields if f.type == 'str' and f.size == width]
+        theirs = [row[1] for row in rows if row[2] == 'str' and row[3] == width]
+        if len(ours) == len(theirs):
+            for name, offset in zip(ours, theirs):
+                anchors.setdefault(name, offset)
+    last = -1
+    for field in fields:  # anchors out of offset order are dropped
+        if field.name in anchors:
+            if anchors[field.name] <= last:
+                del anchors[field.name]
+            else:
+                last = anchors[field.name]
+    by_offset = {row[1]: row for row in rows}
+
+    def lines_up(field, shift):
+        row = by_offset.get(field.offset + shift)
+        return row is not None and _KIND[row[2]] == _KIND[field.type]
+
+    mapped = {f.name: anchors[f.name] for f in fields if f.name in anchors}
+    points = [(f.offset, anchors[f.name] - f.offset) for f in fields if f.name in anchors]
+    for i, (start, shift) in enumerate(points):
+        end, next_shift = points[i + 1] if i + 1 < len(points) else (size, shift)
+        between = [f for f in fields if start < f.offset < end and f.name not in anchors]
+        split = max(range(len(between) + 1),
+                    key=lambda j: (sum(lines_up(f, shift) for f in between[:j]) +
+                                   sum(lines_up(f, next_shift) for f in between[j:]), j))
+        for j, field in enumerate(between):
+            field_shift = shift if j < split else next_shift
+            if lines_up(field, field_shift):
+                mapped[field.name] = field.offset + field_shift
+
+    out = dict(by_offset)
+    by_name = {f.name: f for f in fields}
+    for name, offset in mapped.items():
+        field = by_name[name]
+        row = (name, offset, field.type) + ((field.size,) if field.type == 'str' else ())
+        next_start = min((o for o in out if o > offset), default=size)
+        if offset + field.size > next_start and offset in out:
+            row = (name,) + out[offset][1:]  # keep the proposed type and size
+        out[offset] = row
+    return sorted(out.values(), key=lambda r: r[1])
+
+
+def validate(layout, stats, words, matrix, found):
+    """Print a per-field verdict for layout and the varying bytes it doesn't cover."""
+    size = matrix.shape[1]
+    u32 = word_views(matrix)[0]
+    covered = np.zeros(size, dtype=bool)
+    located = {KNOWN_FIELDS[k][0]: v for k, v in found.items()}
+    print(f"\nValidating layout '{layout.name}' ({layout.size} bytes) against {matrix.shape[0]} files")
+    print(f"  {'field':<20} {'offset':>6} {'type':<4} {'size':>4}  check")
+    for field in layout.fields:
+        end = field.offset + field.size
+        if end > size:
+            print(f"  {field.name:<20} {field.offset:>6} {field.type:<4} {field.size:>4}  ❌ beyond record size {size}")
+            continue
+        covered[field.offset:end] = True
+        if field.type == 'str':
+            cols = matrix[:, field.offset:end]
+            text = ((cols == 0) | ((cols >= 0x20) & (cols < 0x7f))).all(axis=1).mean()
+            empty = (cols[:, 0] == 0).mean()
+            ok = text >= TEXT_MIN and empty < 0.5
+            check = f"text in {text:.1%} of files, empty in {empty:.1%}"
+        elif field.type == 'f32':
+            ok = words['f32'][field.offset] >= PLAUSIBLE_MIN
+            check = f"plausible float in {words['f32'][field.offset]:.1%}"
+        else:
+            ok = field.offset < u32.shape[1] or field.type == 'u8'
+            if field.type == 'u8':
+                values = matrix[:, field.offset]
+            else:
+                values = u32[:, min(field.offset, u32.shape[1] - 1)] & (0xffff if field.type == 'i16' else 0xffffffff)
+            check = f"{len(np.unique(values))} distinct value(s), {values.min()}-{values.max()}"
+        hit = located.get(field.name)
+        if hit is not None:
+            at_offset = hit[0] == field.offset
+            ok = ok and (at_offset or hit[2] < MATCH_MIN)
+            check += f"; known values {'here' if at_offset else f'best at {hit[0]}'} ({hit[2]:.0%} exact)"
+        print(f"  {field.name:<20} {field.offset:>6} {field.type:<4} {field.size:>4}  {'✅' if ok else '❌'} {check}")
+    loose = [(s, e) for s, e, kind in regions(stats) if kind != 'const' and not covered[s:e].all()]
+    if loose:
+        print("\n  Varying bytes not covered by any field:")
+        for s, e in loose:
+            gaps = np.flatnonzero(~covered[s:e]) + s
+            print(f"    {gaps[0]}-{gaps[-1]} ({len(gaps)} byte(s), {stats['entropy'][gaps].mean():.2f} bits)")
+    else:
+        print("\n  Every varying byte is covered by a field")
+
+
+def print_offsets(stats, words, start, end):
+    print(f"\n  {'offset':>6} {'entropy':>7} {'zero':>6} {'text':>6} {'char':>6} {'f32':>6} {'u32':>6} {'distinct':>8}")
+    for o in range(start, min(end, len(stats['entropy']))):
+        w = o < len(words['f32'])
+        print(f"  {o:>6} {stats['entropy'][o]:>7.2f} {stats['zero'][o]:>6.1%} {stats['text'][o]:>6.1%} "
+              f"{stats['char'][o]:>6.1%} {words['f32'][o] if w else 0:>6.1%} {words['u32'][o] if w else 0:>6.1%} "
+              f"{words['distinct'][o] if w else 0:>8.1%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Per-offset statistics and layout proposals for a songdta corpus')
+    parser.add_argument('paths', nargs='+', help='Directories (or files) with .songdta_ps4 files')
+    parser.add_argument('--type', type=int, help='songdta_type to analyze (default: the most common)')
+    parser.add_argument('--size', type=int, help='Record size (default: the most common file length)')
+    parser.add_argument('--known', help='Metadata JSON/NDJSON (extract_binary_dta.py output) for known values')
+    parser.add_argument('--validate', nargs='?', const='', metavar='LAYOUT',
+                        help='Check a songdta_schema layout (default: the one for the type)')
+    parser.add_argument('--propose', action='store_true', help='Print a proposed field table')
+    parser.add_argument('--offsets', help='Print per-offset statistics for START:END')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    groups = load_corpus(args.paths)
+    if not groups:
+        print("No .songdta_ps4 files found")
+        return 1
+    print("songdta_type  files")
+    for kind, files in sorted(groups.items(), key=lambda g: -len(g[1])):
+        print(f"  {kind!s:>11}  {len(files)}")
+    kind = args.type if args.type is not None else max(groups, key=lambda k: len(groups[k]))
+    files = groups.get(kind, [])
+    lengths = np.array([len(data) for _, data in files])
+    if not len(lengths):
+        print(f"No files of songdta_type {kind}")
+        return 1
+    size = args.size or int(np.bincount(lengths).argmax())
+    names, matrix = to_matrix(files, size)
+    if len(names) < 2:
+        print(f"Need at least 2 files of {size}+ bytes (have {len(names)})")
+        return 1
+
+    stats = byte_stats(matrix)
+    u32, f32 = word_views(matrix)
+    words = word_stats(u32, f32)
+    found = match_known(load_known(args.known, names), matrix, u32, f32) if args.known else {}
+    print(f"\nType {kind}: {matrix.shape[0]} x {size} bytes "
+          f"({len(files) - len(names)} shorter file(s) left out), analyzed in {time.perf_counter() - start:.2f}s")
+
+    print("\nRegions:")
+    for s, e, region in regions(stats):
+        print(f"  {s:>5}-{e - 1:<5} {region:<8} {e - s:>4} byte(s)  {stats['entropy'][s:e].mean():.2f} bits")
+
+    if found:
+        print("\nKnown fields:")
+        for key, hit in found.items():
+            if hit[1] == 'str':
+                print(f"  {key:<17} str at {hit[0]:>5} ({hit[2]:.0%} exact)")
+            else:
+                print(f"  {key:<17} {hit[1]} at {hit[0]:>5} ({hit[2]:.0%} exact); "
+                      f"best f32 correlation |r|={hit[3]:.3f} at {hit[4]}")
+
+    if args.offsets:
+        lo, _, hi = args.offsets.partition(':')
+        print_offsets(stats, words, int(lo or 0), int(hi or size))
+
+    if args.validate is not None:
+        by_name = {layout.name: layout for layout in LAYOUTS.values()}
+        if args.validate and args.validate not in by_name:
+            parser.error(f"unknown layout {args.validate!r} (have: {', '.join(sorted(by_name))})")
+        layout = by_name[args.validate] if args.validate else layout_for(matrix[0].tobytes())
+        validate(layout, stats, words, matrix, found)
+
+    if args.propose:
+        print(f"\nProposed layout for songdta_type {kind} (review before adding to songdta_schema.LAYOUTS):")
+        print("    # (field, offset, type[, size for str])")
+        rows = canonical_names(propose(stats, words, found), found, size)
+        for row in rows:
+            print(f"    {row!r},")
+        try:
+            layout = SongdtaLayout(f'type{kind}', rows)
+        except SchemaError as e:
+            print(f"  ❌ does not compile: {e}")
+            return 1
+        print(f"  Compiles to a {layout.size}-byte struct ({len(rows)} fields, "
+              f"{sum(r[0] in RB4_LAYOUT.offsets for r in rows)} with RB4 names)")
+        failures = check(files, [layout])
+        for _layout, name, err in failures[:5]:
+            print(f"  ❌ {name}: {err}")
+        print(f"  {'✅' if not failures else '❌'} Parsed {len(files)} file(s) through extract_binary_dta with it: "
+              f"{len(failures)} failure(s)")
+        return 1 if failures else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
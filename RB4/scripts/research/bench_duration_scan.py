@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Benchmark the songdta duration scans in extract_binary_dta.py.
+
+Compares the original per-offset struct.unpack loops (kept here as the
+reference) with the bulk scans (_calculate_duration_ms and
+_scan_duration_any_offset; NumPy if installed, else struct.iter_unpack),
+checks that both give identical results on every file, and prints the
+per-file cost.
+
+Inputs: .songdta_ps4 files under a directory, or (default) a few thousand
+synthetic files: real-sized songdtas, truncated WIP files that reach the
+unaligned scan, and random bytes (NaN/inf/denormal patterns included).
+
+Usage:
+    python3 research/bench_duration_scan.py [--dir path/to/songdta] [--count 3000] [--repeat 3]
+"""
+
+import argparse
+import os
+import random
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import extract_binary_dta as ebd  # noqa: E402
+
+
+def reference_aligned(data):
+    """The original _calculate_duration_ms loop."""
+    floats_in_range = []
+    for i in range(0, len(data) - 4, 4):
+        val = struct.unpack('<f', data[i:i + 4])[0]
+        if 60.0 <= val <= 500.0:
+            floats_in_range.append(val)
+    return int(min(floats_in_range) * 1000) if floats_in_range else 0
+
+
+def reference_any_offset(data):
+    """The original fallback 3 loop in parse_songdta_bytes."""
+    for i in range(len(data) - 4):
+        val = struct.unpack('<f', data[i:i + 4])[0]
+        if 30.0 <= val <= 600.0:
+            return int(val * 1000)
+    return 0
+
+
+def synthetic_files(count, seed=4):
+    rng = random.Random(seed)
+    files = []
+    for n in range(count):
+        kind = n % 3
+        if kind == 0:  # full-size songdta with a length and difficulty floats
+            data = bytearray(1205)
+            struct.pack_into('<I', data, 4, rng.randrange(1, 1 << 31))
+            name = f"Song {n}".encode()
+            data[36:36 + len(name)] = name
+            struct.pack_into('<f', data, 880, rng.uniform(61.0, 499.0))
+            struct.pack_into('<7f', data, 884, *(rng.uniform(0.0, 700.0) for _ in range(7)))
+        elif kind == 1:  # truncated WIP file: only an unaligned float in range
+            data = bytearray(rng.getrandbits(8) & 0x0f for _ in range(rng.randrange(120, 900)))
+            struct.pack_into('<f', data, rng.randrange(1, len(data) - 8) | 1, rng.uniform(30.0, 600.0))
+        else:  # random bytes
+            data = bytearray(rng.getrandbits(8) for _ in range(rng.randrange(4, 1400)))
+        files.append(bytes(data))
+    return files
+
+
+def load_dir(path):
+    files = []
+    for root, _dirs, names in os.walk(path):
+        for name in sorted(names):
+            if name.endswith('.songdta_ps4'):
+                with open(os.path.join(root, name), 'rb') as f:
+                    files.append(f.read())
+    return files
+
+
+def best_time(func, files, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for data in files:
+            func(data)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the songdta duration float scans')
+    parser.add_argument('--dir', help='Directory with .songdta_ps4 files (default: synthetic files)')
+    parser.add_argument('--count', type=int, default=3000, help='Number of synthetic files')
+    parser.add_argument('--repeat', type=int, default=3, help='Timing runs (best is reported)')
+    args = parser.parse_args(argv)
+
+    files = load_dir(args.dir) if args.dir else synthetic_files(args.count)
+    if not files:
+        print("No files to scan")
+        return 1
+    engine = 'numpy' if ebd._np() is not None else 'struct.iter_unpack'
+    print(f"{len(files)} files, {sum(map(len, files)) / len(files):,.0f} bytes average, bulk engine: {engine}")
+
+    mismatches = 0
+    for data in files:
+        if ebd._calculate_duration_ms(data) != reference_aligned(data):
+            mismatches += 1
+        if ebd._scan_duration_any_offset(data) != reference_any_offset(data):
+            mismatches += 1
+    print(f"Result mismatches vs. reference loops: {mismatches}")
+
+    rows = [
+        ('aligned scan (every file)', reference_aligned, ebd._calculate_duration_ms),
+        ('any-offset scan (fallback 3)', reference_any_offset, ebd._scan_duration_any_offset),
+    ]
+    print(f"\n{'scan':<30} {'reference':>14} {'bulk':>14} {'speedup':>8}")
+    for label, reference, bulk in rows:
+        ref = best_time(reference, files, args.repeat) / len(files)
+        new = best_time(bulk, files, args.repeat) / len(files)
+        print(f"{label:<30} {ref * 1e6:>11.1f} µs {new * 1e6:>11.1f} µs {ref / new:>7.1f}x")
+
+    parse = best_time(lambda d: ebd.parse_songdta_bytes(d, 'bench.songdta_ps4'), files, args.repeat) / len(files)
+    print(f"{'parse_songdta_bytes (total)':<30} {'':>14} {parse * 1e6:>11.1f} µs")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -48,7 +48,13 @@ cp "$EXTRACTED_FOLDER"/*.html output/ 2>/dev/null || true
 
 # Restore intermediate files to rb4_temp
 cp "$EXTRACTED_FOLDER"/rb4_custom_songs.json rb4_temp/ 2>/dev/null || true
+# The delta is replayed over the JSON, so never keep a newer one than the backup
+rm -f rb4_temp/rb4_custom_songs.delta.jsonl
+cp "$EXTRACTED_FOLDER"/rb4_custom_songs.delta.jsonl rb4_temp/ 2>/dev/null || true
 cp "$EXTRACTED_FOLDER"/processed_pkgs.json rb4_temp/ 2>/dev/null || true
+# The journal wins over processed_pkgs.json, so never keep a newer one than the backup
+rm -f rb4_temp/processed_pkgs.jsonl
+cp "$EXTRACTED_FOLDER"/processed_pkgs.jsonl rb4_temp/ 2>/dev/null || true
 cp "$EXTRACTED_FOLDER"/pipeline_errors.json rb4_temp/ 2>/dev/null || true
 cp "$EXTRACTED_FOLDER"/update_history.json rb4_temp/ 2>/dev/null || true
 
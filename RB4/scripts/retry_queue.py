@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Persistent retry queue for PKGs that failed with transient errors.
+
+PkgTool.Core sometimes fails on file locks or .NET memory-mapped file errors,
+a download can time out or drop. Such a PKG used to stay unprocessed until
+the next manual run. Failures whose ErrorTracker category is in
+TRANSIENT_CATEGORIES are queued in rb4_temp/retry_queue.json:
+
+    {"<pkg>.pkg": {"path": "...", "category": "file_lock_errors", "attempts": 1,
+                   "next_attempt": <epoch>, "last_error": "...", "first_failed": "<iso>"}}
+
+Each failure doubles the wait before the next attempt (base_delay * 2^(n-1),
+capped at max_delay). At the end of a run, run_pass() retries the PKGs that
+failed in that run one at a time, sleeping until each is due (as long as
+the wait is under max_wait). Entries still waiting carry over to later runs:
+they are skipped until due, and PKGs that reached max_attempts are skipped
+until the entry is removed (or --no-incremental). A success removes the entry.
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+
+TRANSIENT_CATEGORIES = ('file_lock_errors', 'memory_map_error', 'timeout_errors', 'pkg_download_failed')
+
+DEFAULT_BASE_DELAY = 30.0
+DEFAULT_MAX_DELAY = 6 * 3600.0
+DEFAULT_MAX_WAIT = 300.0
+
+
+class RetryQueue:
+    """Transiently failed PKGs with attempt counts and backoff deadlines."""
+
+    def __init__(self, path, max_attempts=3, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY,
+                 clock=time.time):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.clock = clock
+        self.entries = self._load()
+        self.attempted = set()  # PKGs that failed in this run
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                entries = json.load(f)
+            return entries if isinstance(entries, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def exhausted(self, pkg_name):
+        entry = self.entries.get(pkg_name)
+        return entry is not None and entry['attempts'] >= self.max_attempts
+
+    def ready(self, pkg_name):
+        """False while pkg_name waits for its backoff or has used up its attempts."""
+        entry = self.entries.get(pkg_name)
+        return entry is None or (not self.exhausted(pkg_name) and entry['next_attempt'] <= self.clock())
+
+    def delay(self, attempts):
+        return min(self.base_delay * 2 ** (attempts - 1), self.max_delay)
+
+    def failed(self, pkg_name, category, error=None, path=None):
+        """Record a failure. Returns the entry if it was queued, None if the error isn't transient."""
+        if category not in TRANSIENT_CATEGORIES:
+            self.succeeded(pkg_name)  # a permanent error ends retrying
+            return None
+        entry = self.entries.setdefault(pkg_name, {'path': path or pkg_name, 'attempts': 0,
+                                                   'first_failed': datetime.now().isoformat(timespec='seconds')})
+        entry['attempts'] += 1
+        entry.update(category=category, last_error=str(error or '')[:500],
+                     next_attempt=round(self.clock() + self.delay(entry['attempts']), 3))
+        if path:
+            entry['path'] = path
+        self.attempted.add(pkg_name)
+        self._save()
+        return entry
+
+    def succeeded(self, pkg_name):
+        if self.entries.pop(pkg_name, None) is not None:
+            self._save()
+
+    def run_pass(self, retry, log=print, max_wait=DEFAULT_MAX_WAIT, sleep=time.sleep):
+        """Retry PKGs that failed in this run, serially, as they come due.
+
+        retry(pkg_name, entry) must process the PKG and report the outcome via
+        failed()/succeeded(). Stops when nothing is left or the next PKG is
+        not due within max_wait seconds. Returns the number of retries made.
+        """
+        retries = 0
+        while True:
+            pending = sorted((self.entries[p]['next_attempt'], p) for p in self.attempted
+                             if p in self.entries and not self.exhausted(p))
+            if not pending:
+                return retries
+            wait = pending[0][0] - self.clock()
+            if wait > max_wait:
+                log(f"\t{len(pending)} PKG(s) left in the retry queue for a later run (next due in {wait / 60:.0f} min)")
+                return retries
+            if wait > 0:
+                log(f"\tWaiting {wait:.0f}s before retrying {pending[0][1]}")
+                sleep(wait)
+            for due, pkg_name in pending:
+                if due > self.clock():
+                    break
+                retries += 1
+                retry(pkg_name, self.entries[pkg_name])
@@ -22,8 +22,25 @@ DEFAULT_DOCS_DIR = "../docs"
 
 # ── State File Names (relative to temp_dir) ──────────────────────────────
 PROCESSED_PKGS_FILENAME = "processed_pkgs.json"
+STATE_JOURNAL_FILENAME = "processed_pkgs.jsonl"
 UPDATE_HISTORY_FILENAME = "update_history.json"
 ERROR_LOG_FILENAME = "pipeline_errors.json"
+PERF_HISTORY_FILENAME = "perf_history.jsonl"
+TAIL_STATE_FILENAME = "tail_stages.json"
+RETRY_QUEUE_FILENAME = "retry_queue.json"
+PKGTOOL_TUNING_FILENAME = "pkgtool_tuning.json"
+SONGDTA_CACHE_DIRNAME = "songdta_cache"
+
+# ── Parallel Extraction Settings ────────────────────────────────────────────────
+DEFAULT_WORKERS = 1                      # PKGs extracted at once (--workers)
+DEFAULT_DISK_HEADROOM_MB = 1024          # Free space kept in reserve in temp_dir
+DEFAULT_PKG_SIZE_ESTIMATE_MB = 4096      # Used when a PKG's size is unknown (SMB)
+DEFAULT_RETRY_ATTEMPTS = 3               # Attempts per PKG for transient failures (--retry-attempts)
+
+# ── Progressive Publishing Settings ───────────────────────────────────────────
+DEFAULT_PKG_ORDER = "name"               # name | smallest | newest | source (--order)
+DEFAULT_PUBLISH_EVERY = 0                # Republish lists/HTML every N PKGs (0 = off)
+DEFAULT_PUBLISH_MINUTES = 0              # ...or every M minutes (0 = off)
 
 # ── Console Output Settings ─────────────────────────────────────────────────────
 DEFAULT_PROGRESS_BAR_LENGTH = 50
@@ -36,10 +53,34 @@ def get_processed_pkgs_file(temp_dir):
     """Get the processed PKGs file path."""
     return f"{temp_dir}/{PROCESSED_PKGS_FILENAME}"
 
+def get_state_journal_file(temp_dir):
+    """Get the append-only PKG state journal path."""
+    return f"{temp_dir}/{STATE_JOURNAL_FILENAME}"
+
 def get_update_history_file(temp_dir):
     """Get the update history file path."""
     return f"{temp_dir}/{UPDATE_HISTORY_FILENAME}"
 
 def get_error_log_file(temp_dir):
     """Get the error log file path."""
-    return f"{temp_dir}/{ERROR_LOG_FILENAME}"
\ No newline at end of file
+    return f"{temp_dir}/{ERROR_LOG_FILENAME}"
+
+def get_songdta_cache_dir(temp_dir):
+    """Get the raw songdta cache directory (used by --reparse)."""
+    return f"{temp_dir}/{SONGDTA_CACHE_DIRNAME}"
+
+def get_perf_history_file(temp_dir):
+    """Get the per-PKG performance history path."""
+    return f"{temp_dir}/{PERF_HISTORY_FILENAME}"
+
+def get_tail_state_file(temp_dir):
+    """Get the list/HTML/backup stage fingerprint file."""
+    return f"{temp_dir}/{TAIL_STATE_FILENAME}"
+
+def get_retry_queue_file(temp_dir):
+    """Get the transient-failure retry queue path."""
+    return f"{temp_dir}/{RETRY_QUEUE_FILENAME}"
+
+def get_pkgtool_tuning_file(temp_dir):
+    """Get the learned PkgTool.Core processor-count settings path."""
+    return f"{temp_dir}/{PKGTOOL_TUNING_FILENAME}"
@@ -4,10 +4,9 @@ SMB Package Finder - uses smbclient to list/access PKG files without kernel moun
 
 Reads config from .devcontainer/rb4_dlc_config.sh if available
 """
-import subprocess
 import os
-import tempfile
-import shutil
+
+from pkg_transport import LocalTransport, SmbClientTransport, is_pkg_name
 
 # Load config from rb4_dlc_config.sh if it exists
 SMB_SERVER = os.environ.get('SMB_SERVER', '192.168.100.135')
@@ -24,59 +23,48 @@ if os.path.exists(config_path):
             elif line.startswith('SMB_SHARE='):
                 SMB_SHARE = line.split('=')[1].strip('"')
 
+_transport = None
+
+
+def is_rb4_pkg(name):
+    return ('UP8802-' in name or 'Rock.Band.4_' in name) and is_pkg_name(name)
+
+
+def open_transport(kind='smbclient', root=None):
+    """Transport for the configured share (kind 'smbclient'), or a local directory (kind 'local')."""
+    if kind == 'local':
+        return LocalTransport(root)
+    return SmbClientTransport(SMB_SERVER, SMB_SHARE)
+
+
+def get_transport():
+    """Shared smbclient session for list_pkgs/get_pkg_file, opened on first use."""
+    global _transport
+    if _transport is None:
+        _transport = open_transport()
+    return _transport
+
+
+def list_pkg_entries(transport=None):
+    """RemoteEntry(name, size, mtime) for each RB4 PKG on the share"""
+    return [e for e in (transport or get_transport()).list() if is_rb4_pkg(e.name)]
+
+
 def list_pkgs():
     """List PKG files from SMB share"""
-    # Parse SMB_SHARE - could be just "incoming" or "incoming/temp/Rb4Dlc"
-    share_parts = SMB_SHARE.split('/')
-    base_share = share_parts[0]  # e.g., "incoming"
-    sub_path = '/'.join(share_parts[1:]) if len(share_parts) > 1 else ''  # e.g., "temp/Rb4Dlc"
-    
-    if sub_path:
-        cmd = f'smbclient //{SMB_SERVER}/{base_share} -N -c "cd {sub_path}; ls"'
-    else:
-        cmd = f'smbclient //{SMB_SERVER}/{base_share} -N -c "ls"'
-    
-    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-    
-    pkgs = []
-    for line in result.stdout.split('\n'):
-        # Match lines like: "  UP8802-...-V0100.pkg      A 2853699584"
-        if (('UP8802-' in line or 'Rock.Band.4_' in line) and '.pkg' in line and not line.startswith('  ._')):
-            parts = line.split()
-            if parts:
-                pkgs.append(parts[0])
-    
-    # If still no PKGs, try the temp/Rb4Dlc path directly
-    if not pkgs:
-        cmd2 = f'smbclient //{SMB_SERVER}/incoming/temp/Rb4Dlc -N -c "ls"'
-        result2 = subprocess.run(cmd2, shell=True, capture_output=True, text=True)
-        for line in result2.stdout.split('\n'):
-            if (('UP8802-' in line or 'Rock.Band.4_' in line) and '.pkg' in line and not line.startswith('  ._')):
-                parts = line.split()
-                if parts:
-                    pkgs.append(parts[0])
-    
-    return pkgs
+    return [e.name for e in list_pkg_entries()]
+
 
 def get_pkg_file(pkg_name, dest_dir):
     """Copy a single PKG file from SMB share"""
-    # Parse SMB_SHARE - could be just "incoming" or "incoming/temp/Rb4Dlc"
-    share_parts = SMB_SHARE.split('/')
-    base_share = share_parts[0]  # e.g., "incoming"
-    sub_path = '/'.join(share_parts[1:]) if len(share_parts) > 1 else ''  # e.g., "temp/Rb4Dlc"
-    
-    if sub_path:
-        cmd = f'smbclient //{SMB_SERVER}/{base_share} -N -c "cd {sub_path}; get \\"{pkg_name}\\" \\"{dest_dir}/{pkg_name}\\""'
-    else:
-        cmd = f'smbclient //{SMB_SERVER}/{base_share} -N -c "get \\"{pkg_name}\\" \\"{dest_dir}/{pkg_name}\\""'
-    
-    return subprocess.run(cmd, shell=True, timeout=3600).returncode == 0
+    return get_transport().fetch(pkg_name, dest_dir)
+
 
 if __name__ == '__main__':
     print("=== SMB PKG Files ===")
-    pkgs = list_pkgs()
-    print(f"Found {len(pkgs)} PKG files:")
+    pkgs = list_pkg_entries()
+    print(f"Found {len(pkgs)} PKG files ({sum(p.size for p in pkgs) / 1024 ** 3:,.1f} GB):")
     for p in pkgs[:10]:
-        print(f"  {p}")
+        print(f"  {p.name}  {p.size / 1024 ** 2:,.0f} MB")
     if len(pkgs) > 10:
         print(f"  ... and {len(pkgs) - 10} more")
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Song catalog index for rb4_custom_songs.json, keyed by song identity.
+
+Incremental runs used to load the whole output JSON into a dict keyed on
+(artist, title), merge the new songs, load the file a second time to find
+which songs were new, and rewrite every song with indent=2. Songs whose
+title was empty or changed between extractions collided or were duplicated.
+
+SongIndex keys each song on the stable identifiers parse_songdta reads from
+the songdta: "id:<songId>" when songId is non-zero, else "sn:<shortName>",
+else "at:<artist>\\0<title>" (lower-cased). The songId alone is the key so a
+parser fix that recovers a shortName updates the song instead of adding it
+again; a song whose songId is recovered replaces its "sn:" entry. Secondary indexes map shortName and
+(artist, title) to keys, and are kept in step when an upsert changes them.
+
+Storage is the JSON array the Node generator and backups already use, plus an
+append-only delta file next to it (rb4_custom_songs.delta.jsonl), one line
+per added or changed song, and a tombstone per removed song:
+
+    {"key": "id:1234", "song": {...}}
+    {"key": "id:1234", "removed": true}
+
+A run appends only its changes. Loading replays the deltas over the array (a
+torn last line from a crash is ignored), re-keying every song with song_key
+so files written with an older key scheme merge into the current one. Once the delta holds more than
+COMPACT_MIN_RECORDS records and a quarter of the catalog, or when a caller
+needs a complete JSON (generate_rb4_song_list.js), the array is rewritten
+atomically and the delta removed.
+
+Usage:
+    python3 song_index.py rb4_temp/rb4_custom_songs.json [--compact] [--artist A --title T]
+"""
+
+import json
+import os
+
+COMPACT_MIN_RECORDS = 500
+ADDED = 'added'
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+
+
+def _norm(text):
+    return (text or '').strip().lower()
+
+
+def song_key(song):
+    """Identity of a song: songId, else shortName, else lower-cased artist and title."""
+    song_id = song.get('songId') or 0
+    if song_id:
+        return f"id:{song_id}"
+    short_name = song.get('shortName') or ''
+    if short_name:
+        return f"sn:{short_name}"
+    return f"at:{_norm(song.get('artist'))}\0{_norm(song.get('title'))}"
+
+
+def _short_name_key(key, song):
+    """The "sn:" key an "id:" song had before its songId was known, else None."""
+    if key.startswith('id:') and song.get('shortName'):
+        return f"sn:{song['shortName']}"
+    return None
+
+
+def delta_path(output_json):
+    """rb4_custom_songs.json -> rb4_custom_songs.delta.jsonl"""
+    base, _ext = os.path.splitext(output_json)
+    return f"{base}.delta.jsonl"
+
+
+class SongIndex:
+    """Songs by identity key, in first-seen order, with artist/title and shortName lookups."""
+
+    def __init__(self, path):
+        self.path = path
+        self.delta_file = delta_path(path)
+        self.songs = {}  # key -> song
+        self.by_artist_title = {}  # (artist, title) lower-cased -> {keys}
+        self.by_short_name = {}  # shortName -> {keys}
+        self.delta_records = 0
+        self._pending = {}  # key -> song changed since load/save (None: removed)
+
+    @classmethod
+    def load(cls, path):
+        """Index of the JSON array at path plus its delta file (either may be missing)."""
+        index = cls(path)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f) or []
+            for song in data if isinstance(data, list) else [data]:
+                index._put(song_key(song), song)
+        if os.path.exists(index.delta_file):
+            with open(index.delta_file, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # torn write from a crash
+                    if not isinstance(record, dict):
+                        continue
+                    if record.get('removed'):
+                        index._drop(record.get('key'))
+                        index.delta_records += 1
+                    elif isinstance(record.get('song'), dict):
+                        index._put(song_key(record['song']), record['song'])
+                        index.delta_records += 1
+        return index
+
+    def __len__(self):
+        return len(self.songs)
+
+    def __contains__(self, key):
+        return key in self.songs
+
+    def _unlink(self, key, song):
+        for table, secondary in ((self.by_artist_title, (_norm(song.get('artist')), _norm(song.get('title')))),
+                                 (self.by_short_name, song.get('shortName'))):
+            keys = table.get(secondary)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del table[secondary]
+
+    def _put(self, key, song):
+        superseded = _short_name_key(key, song)
+        if self._drop(superseded) is not None:  # the songId was recovered for a song keyed by shortName
+            self._pending.pop(superseded, None)
+        old = self.songs.get(key)
+        if old is not None:
+            self._unlink(key, old)
+        self.songs[key] = song
+        self.by_artist_title.setdefault((_norm(song.get('artist')), _norm(song.get('title'))), set()).add(key)
+        if song.get('shortName'):
+            self.by_short_name.setdefault(song['shortName'], set()).add(key)
+
+    def _drop(self, key):
+        song = self.songs.pop(key, None)
+        if song is not None:
+            self._unlink(key, song)
+        return song
+
+    def upsert(self, song):
+        """Add or replace a song. Returns ADDED, UPDATED or UNCHANGED."""
+        key = song_key(song)
+        old = self.songs.get(key, self.songs.get(_short_name_key(key, song)))
+        if old == song:
+            return UNCHANGED
+        self._put(key, song)
+        self._pending[key] = song
+        return ADDED if old is None else UPDATED
+
+    def remove(self, key):
+        """Drop the song with this key, saved as a tombstone. Returns the song, or None if absent."""
+        song = self._drop(key)
+        if song is not None:
+            self._pending[key] = None
+        return song
+
+    def find(self, artist, title):
+        """Songs with this artist and title (case-insensitive)."""
+        return [self.songs[k] for k in sorted(self.by_artist_title.get((_norm(artist), _norm(title)), ()))]
+
+    def find_short_name(self, short_name):
+        return [self.songs[k] for k in sorted(self.by_short_name.get(short_name, ()))]
+
+    def all_songs(self):
+        return list(self.songs.values())
+
+    def save(self, compact=False):
+        """Append pending changes to the delta file, or rewrite the JSON when compacting is due.
+
+        Returns the number of songs written.
+        """
+        due = (self.delta_records + len(self._pending) > max(COMPACT_MIN_RECORDS, len(self.songs) // 4))
+        if compact or due or not os.path.exists(self.path):
+            if compact and not self._pending and not self.delta_records and os.path.exists(self.path):
+                return 0
+            self.compact()
+            return len(self.songs)
+        if not self._pending:
+            return 0
+        with open(self.delta_file, 'a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps({'key': key, 'song': song} if song is not None else {'key': key, 'removed': True}) + '\n'
+                            for key, song in self._pending.items()))
+            f.flush()
+            os.fsync(f.fileno())
+        written = len(self._pending)
+        self.delta_records += written
+        self._pending = {}
+        return written
+
+    def compact(self):
+        """Rewrite the JSON array with every song and drop the delta file."""
+        write_songs(self.path, self.all_songs())
+        self.delta_records = 0
+        self._pending = {}
+
+
+def write_songs(path, songs):
+    """Atomically write a complete song array to path, superseding any delta file."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(songs, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    if os.path.exists(delta_path(path)):
+        os.remove(delta_path(path))
+
+
+def load_songs(path):
+    """Every song in the catalog at path, deltas applied."""
+    return SongIndex.load(path).all_songs()
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Inspect or compact the RB4 custom song catalog')
+    parser.add_argument('output_json', help='rb4_custom_songs.json')
+    parser.add_argument('--compact', action='store_true', help='Fold the delta file into the JSON array')
+    parser.add_argument('--artist', help='Find songs by artist (with --title)')
+    parser.add_argument('--title', help='Find songs by title (with --artist)')
+    args = parser.parse_args(argv)
+
+    index = SongIndex.load(args.output_json)
+    print(f"{len(index)} songs ({index.delta_records} delta record(s) in {index.delta_file})")
+    if args.compact:
+        index.save(compact=True)
+        print(f"Compacted into {args.output_json}")
+    if args.artist and args.title:
+        found = index.find(args.artist, args.title)
+        for song in found:
+            print(f"{song.get('artist')} - {song.get('title')} [{song_key(song)}]")
+        return 0 if found else 1
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
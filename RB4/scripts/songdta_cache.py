@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache of raw .songdta_ps4 bytes.
+
+Extracting a PKG takes minutes; parsing its song data takes microseconds. This
+cache keeps the raw song data of every processed PKG so a parser fix in
+extract_binary_dta.py can be applied to the whole collection with --reparse
+instead of re-extracting everything with --no-incremental.
+
+Layout (in <temp_dir>/songdta_cache/):
+
+    blobs.pack    zlib-compressed blobs, appended back to back
+    index.jsonl   one JSON record per line:
+                    {"blob": <sha256>, "offset": N, "length": N}
+                    {"pkg": <name>, "size": N, "mtime": N|null, "source": S,
+                     "files": [[<inner path>, <sha256>], ...]}
+
+Blobs are keyed by the SHA-256 of their uncompressed bytes, so identical song
+data shared between PKG versions is stored once. A later "pkg" record for the
+same PKG name replaces the earlier one. Both files are append-only; a torn
+last line (crash mid-write) is ignored on load. Blobs past the end of a
+truncated pack are dropped, and so are the PKG records that use them; their
+names are kept in `stale` so the pipeline extracts those PKGs again.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import zlib
+
+PACK_FILENAME = 'blobs.pack'
+INDEX_FILENAME = 'index.jsonl'
+
+
+def pkg_identity(pkg_path, include_mtime=True):
+    """(size, mtime) identifying a PKG file; mtime is None for copies (e.g. SMB downloads)."""
+    st = os.stat(pkg_path)
+    return st.st_size, (int(st.st_mtime) if include_mtime else None)
+
+
+class SongdtaCache:
+    """Append-only blob store for raw song data, safe to use from worker threads."""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.pack_path = os.path.join(cache_dir, PACK_FILENAME)
+        self.index_path = os.path.join(cache_dir, INDEX_FILENAME)
+        self.blobs = {}  # sha256 -> (offset, length)
+        self.pkgs = {}   # pkg name -> record
+        self.stale = set()  # pkg names whose records referenced lost blobs
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return
+        pack_size = os.path.getsize(self.pack_path) if os.path.exists(self.pack_path) else 0
+        with open(self.index_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn write at the end of the file
+                if 'blob' in record:
+                    if record['offset'] + record['length'] <= pack_size:
+                        self.blobs[record['blob']] = (record['offset'], record['length'])
+                elif 'pkg' in record:
+                    self.pkgs[record['pkg']] = record
+        for pkg_name, record in list(self.pkgs.items()):
+            if any(sha not in self.blobs for _inner_path, sha in record['files']):
+                del self.pkgs[pkg_name]
+                self.stale.add(pkg_name)
+
+    def __len__(self):
+        return len(self.pkgs)
+
+    def put(self, pkg_name, songdta_files, source=None, size=None, mtime=None):
+        """Store a PKG's [(inner_path, bytes)] song data."""
+        files = []
+        lines = []
+        with self._lock:
+            with open(self.pack_path, 'ab') as pack:
+                for inner_path, data in songdta_files:
+                    sha = hashlib.sha256(data).hexdigest()
+                    if sha not in self.blobs:
+                        packed = zlib.compress(data)
+                        offset = pack.tell()
+                        pack.write(packed)
+                        self.blobs[sha] = (offset, len(packed))
+                        lines.append({'blob': sha, 'offset': offset, 'length': len(packed)})
+                    files.append([inner_path, sha])
+            record = {'pkg': pkg_name, 'size': size, 'mtime': mtime, 'source': source, 'files': files}
+            lines.append(record)
+            with open(self.index_path, 'a', encoding='utf-8') as index:
+                index.write(''.join(json.dumps(line) + '\n' for line in lines))
+            self.pkgs[pkg_name] = record
+
+    def get(self, pkg_name):
+        """Return [(inner_path, bytes)] for a cached PKG, or None."""
+        record = self.pkgs.get(pkg_name)
+        if record is None:
+            return None
+        with open(self.pack_path, 'rb') as pack:
+            return [(inner_path, self._read_blob(pack, sha)) for inner_path, sha in record['files']]
+
+    def _read_blob(self, pack, sha):
+        offset, length = self.blobs[sha]
+        pack.seek(offset)
+        return zlib.decompress(pack.read(length))
+
+    def items(self):
+        """Yield (pkg_name, record, [(inner_path, bytes)]) for every cached PKG, sorted by name."""
+        if not self.pkgs:
+            return
+        with open(self.pack_path, 'rb') as pack:
+            for pkg_name in sorted(self.pkgs):
+                record = self.pkgs[pkg_name]
+                yield pkg_name, record, [(p, self._read_blob(pack, sha)) for p, sha in record['files']]
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+songdta_schema.py — Versioned field layouts for .songdta_ps4, compiled to struct.
+
+Each layout is a table of (field, offset, type) rows from LibForge's
+010/songdta.bt template (also written out in research/analyze_songdta_structure.py).
+SongdtaLayout compiles the table into a single struct.Struct, with pad bytes
+for the gaps, and decodes a whole file header with one unpack_from:
+
+    layout = layout_for(data)          # picked by the songdta_type at offset 0
+    fields = layout.decode(data)       # {'song_id': 1234, 'name': 'Song', 'guitar': 3.0, ...}
+
+Files shorter than the layout (truncated WIP files) are decoded field by
+field: a field that doesn't fit entirely reads as 0, 0.0 or '' as before.
+decode() always returns every RB4_FIELDS name; a layout that leaves one out
+(a new version whose offsets aren't all known yet) reads it as that default.
+Strings are NUL-terminated, decoded as UTF-8 (errors replaced) and stripped.
+
+A new songdta version is supported by adding its table to LAYOUTS under its
+songdta_type value (--check parses files through every layout). RB4 files are type 11; unknown types (and the all-zero
+placeholder files, type 0) use DEFAULT_LAYOUT, the RB4 table.
+
+Usage (decode files with the schema, for checking a layout):
+    python3 songdta_schema.py <file.songdta_ps4>... [--layout rb4]
+    python3 songdta_schema.py --check [<file.songdta_ps4>...]
+"""
+
+import struct
+
+# Field types: struct format (without byte order) and the value of a missing field
+TYPES = {
+    'u8': ('B', 0),
+    'i16': ('h', 0),
+    'u32': ('I', 0),
+    'f32': ('f', 0.0),
+    'str': ('s', ''),   # fixed-size char[n], NUL-terminated
+}
+
+RB4_FIELDS = [
+    # (field, offset, type[, size for str])
+    ('songdta_type', 0, 'u32'),
+    ('song_id', 4, 'u32'),
+    ('version', 8, 'i16'),
+    ('game_origin', 10, 'str', 18),
+    ('preview_start', 28, 'f32'),
+    ('preview_end', 32, 'f32'),
+    ('name', 36, 'str', 256),
+    ('artist', 292, 'str', 256),
+    ('album_name', 548, 'str', 256),
+    ('album_track_number', 804, 'i16'),
+    ('album_year', 808, 'u32'),
+    ('original_year', 812, 'u32'),
+    ('genre', 816, 'str', 64),
+    ('song_length', 880, 'u32'),  # float in the template; RB4 files store milliseconds
+    ('guitar', 884, 'f32'),
+    ('bass', 888, 'f32'),
+    ('vocals', 892, 'f32'),
+    ('drum', 896, 'f32'),
+    ('band', 900, 'f32'),
+    ('keys', 904, 'f32'),
+    ('real_keys', 908, 'f32'),
+    ('tutorial', 912, 'u8'),
+    ('album_art', 913, 'u8'),
+    ('cover', 914, 'u8'),
+    ('vocal_gender', 915, 'u8'),
+    ('anim_tempo', 916, 'str', 16),
+    ('has_markup', 932, 'u8'),
+    ('vocal_parts', 936, 'u8'),
+    ('solos', 940, 'u8'),
+    ('fake', 944, 'u8'),
+    ('shortname', 945, 'str', 256),
+]
+
+# Every field the parser reads, with the value used when a layout doesn't define it
+FIELD_DEFAULTS = {row[0]: TYPES[row[2]][1] for row in RB4_FIELDS}
+
+
+class SchemaError(Exception):
+    """A layout table is inconsistent (overlapping fields, unknown type)."""
+
+
+class SongdtaField:
+    __slots__ = ('name', 'offset', 'type', 'size', 'fmt', 'default')
+
+    def __init__(self, name, offset, type, size=None):
+        if type not in TYPES:
+            raise SchemaError(f"{name}: unknown type {type!r}")
+        code, self.default = TYPES[type]
+        if type == 'str':
+            if not size:
+                raise SchemaError(f"{name}: str fields need a size")
+            self.fmt = f"{size}s"
+        else:
+            self.fmt = code
+        self.name = name
+        self.offset = offset
+        self.type = type
+        self.size = struct.calcsize('<' + self.fmt)
+
+    def __repr__(self):
+        return f"SongdtaField({self.name!r}, {self.offset}, {self.type!r}, size={self.size})"
+
+
+def _decode_str(raw):
+    return raw.split(b'\x00')[0].decode('utf-8', errors='replace').strip()
+
+
+class SongdtaLayout:
+    """One songdta version: its fields compiled into a single struct.Struct."""
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = sorted((SongdtaField(*row) for row in fields), key=lambda f: f.offset)
+        fmt, pos = '<', 0
+        for field in self.fields:
+            if field.offset < pos:
+                raise SchemaError(f"{name}: {field.name} at {field.offset} overlaps the previous field")
+            if field.offset > pos:
+                fmt += f"{field.offset - pos}x"
+            fmt += field.fmt
+            pos = field.offset + field.size
+        self.struct = struct.Struct(fmt)
+        self.size = self.struct.size
+        self._names = [f.name for f in self.fields]
+        self._strings = [i for i, f in enumerate(self.fields) if f.type == 'str']
+        self._single = [(f, struct.Struct('<' + f.fmt)) for f in self.fields]
+        self._absent = {k: v for k, v in FIELD_DEFAULTS.items() if k not in self._names}
+
+    @property
+    def offsets(self):
+        return {f.name: f.offset for f in self.fields}
+
+    def decode(self, data):
+        """{field: value} for data (bytes, bytearray, memoryview or mmap), every FIELD_DEFAULTS name included."""
+        view = memoryview(data)
+        if len(view) >= self.size:
+            values = list(self.struct.unpack_from(view))
+            for i in self._strings:
+                values[i] = _decode_str(values[i])
+            fields = dict(zip(self._names, values))
+            if self._absent:
+                fields.update(self._absent)
+            return fields
+        fields = dict(self._absent)
+        for field, single in self._single:
+            if field.offset + field.size > len(view):
+                fields[field.name] = field.default
+            else:
+                value = single.unpack_from(view, field.offset)[0]
+                fields[field.name] = _decode_str(value) if field.type == 'str' else value
+        return fields
+
+
+RB4_LAYOUT = SongdtaLayout('rb4', RB4_FIELDS)
+DEFAULT_LAYOUT = RB4_LAYOUT  # for songdta_type values not in LAYOUTS
+
+LAYOUTS = {
+    # songdta_type -> layout; add new versions here
+    11: RB4_LAYOUT,
+}
+_TYPE = struct.Struct('<I')
+
+
+def layout_for(data):
+    """Layout for a songdta file, chosen by its songdta_type (DEFAULT_LAYOUT if unknown)."""
+    if len(data) < _TYPE.size:
+        return DEFAULT_LAYOUT
+    return LAYOUTS.get(_TYPE.unpack_from(data)[0], DEFAULT_LAYOUT)
+
+
+def decode_songdta(data):
+    """{field: value} for a songdta file using the layout for its type."""
+    return layout_for(data).decode(data)
+
+
+# A layout that knows only a few fields, as a new version's first table would
+_PARTIAL_FIELDS = [('songdta_type', 0, 'u32'), ('song_id', 4, 'u32'), ('name', 36, 'str', 256)]
+
+
+def check(samples, layouts=None):
+    """Parse (name, data) samples with extract_binary_dta under each layout.
+
+    layouts defaults to every registered layout and a partial one. Each is
+    registered in LAYOUTS for the sample's songdta_type while it is parsed.
+    Returns [(layout name, sample name, error)] for the failures.
+    """
+    from extract_binary_dta import parse_songdta_bytes
+    import songdta_schema  # the module the parser reads LAYOUTS from, also when this file runs as __main__
+    registry = songdta_schema.LAYOUTS
+    if layouts is None:
+        layouts = [*registry.values(), songdta_schema.DEFAULT_LAYOUT,
+                   songdta_schema.SongdtaLayout('partial', _PARTIAL_FIELDS)]
+    layouts = {layout.name: layout for layout in layouts}
+    failures = []
+    for name, data in samples:
+        song_type = _TYPE.unpack_from(data)[0] if len(data) >= _TYPE.size else 0
+        registered = registry.get(song_type)
+        try:
+            for layout in layouts.values():
+                registry[song_type] = layout
+                try:
+                    parse_songdta_bytes(data, name)
+                except Exception as e:
+                    failures.append((layout.name, name, f"{type(e).__name__}: {e}"))
+        finally:
+            if registered is None:
+                del registry[song_type]
+            else:
+                registry[song_type] = registered
+    return failures
+
+
+def main(argv=None):
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description='Decode .songdta_ps4 files with the schema tables')
+    parser.add_argument('files', nargs='*', help='.songdta_ps4 files')
+    parser.add_argument('--layout', help='Force a layout by name (default: by songdta_type)')
+    parser.add_argument('--check', action='store_true',
+                        help='Parse the files (default: a blank RB4 header) under every layout, '
+                             'including one with only a few fields')
+    args = parser.parse_args(argv)
+
+    if args.check:
+        samples = []
+        for path in args.files:
+            with open(path, 'rb') as f:
+                samples.append((path, f.read()))
+        if not samples:
+            blank = bytearray(DEFAULT_LAYOUT.size)
+            _TYPE.pack_into(blank, 0, 11)
+            blank[36:41] = b'Check'
+            samples.append(('blank.songdta_ps4', bytes(blank)))
+        failures = check(samples)
+        for layout, name, err in failures:
+            print(f"FAIL {layout}: {name}: {err}")
+        print(f"{len(samples)} file(s) parsed under every layout and a partial one: {len(failures)} failure(s)")
+        return 1 if failures else 0
+    if not args.files:
+        parser.error('no files given')
+
+    by_name = {layout.name: layout for layout in LAYOUTS.values()}
+    if args.layout and args.layout not in by_name:
+        parser.error(f"unknown layout {args.layout!r} (have: {', '.join(sorted(by_name))})")
+    for path in args.files:
+        with open(path, 'rb') as f:
+            data = f.read()
+        layout = by_name[args.layout] if args.layout else layout_for(data)
+        print(json.dumps({'file': path, 'layout': layout.name, 'size': len(data), **layout.decode(data)},
+                         ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
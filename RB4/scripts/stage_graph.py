@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Make-style stage graph for the tail of the RB4 pipeline.
+
+Each stage declares the files (or directories) it reads and writes. Before a
+stage runs, its inputs are fingerprinted; the stage is skipped when the
+fingerprints match the ones recorded after its last successful run and its
+outputs are still on disk unchanged. Stages run in dependency order, derived
+from which stage produces which path.
+
+    graph = StageGraph('rb4_temp/tail_stages.json')
+    graph.add('html', build_html, inputs=[metadata_dir, 'scripts/generate_html_list.py'],
+              outputs=['output/RB4SongList.html'])
+    graph.add('docs_copy', copy_html, inputs=['output/RB4SongList.html'],
+              outputs=['/workspace/docs/RB4SongList.html'])
+    graph.run()
+
+Fingerprints are SHA-256 content hashes. Hashing thousands of metadata JSONs
+on every run would defeat the point, so each file's hash is cached in the
+state file together with its size and mtime and only recomputed when those
+change; an up-to-date run costs one stat() per file.
+"""
+
+import hashlib
+import json
+import os
+
+STATUS_RAN = 'ran'
+STATUS_SKIPPED = 'skipped'
+
+
+class TailStage:
+    __slots__ = ('name', 'func', 'inputs', 'outputs', 'params')
+
+    def __init__(self, name, func, inputs=(), outputs=(), params=None):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = params
+
+
+class FileHasher:
+    """Content hashes for files and directories, cached by (size, mtime_ns).
+
+    Files whose names start with one of the ignore prefixes are left out of
+    directory hashes (e.g. an index kept next to the files it indexes).
+    """
+
+    def __init__(self, cache=None, ignore=()):
+        self.cache = cache if cache is not None else {}  # path -> [size, mtime_ns, sha256]
+        self.ignore = tuple(ignore)
+        self.seen = set()
+
+    def _file(self, path, st):
+        self.seen.add(path)
+        cached = self.cache.get(path)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        digest = h.hexdigest()
+        self.cache[path] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def _walk(self, root, rel=''):
+        with os.scandir(os.path.join(root, rel)) as it:
+            for entry in sorted(it, key=lambda e: e.name):
+                if self.ignore and entry.name.startswith(self.ignore):
+                    continue
+                name = f"{rel}/{entry.name}" if rel else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    yield from self._walk(root, name)
+                elif entry.is_file():
+                    yield name, self._file(entry.path, entry.stat())
+
+    def prune(self):
+        """Drop cached hashes of files not looked at since this hasher was created."""
+        for path in set(self.cache) - self.seen:
+            del self.cache[path]
+
+    def fingerprint(self, path):
+        """Hash of a file, a directory tree (names + contents), or None if missing."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isdir(path):
+            return self._file(path, st)
+        h = hashlib.sha256()
+        for name, digest in self._walk(path):
+            h.update(f"{name}\0{digest}\n".encode('utf-8'))
+        return 'dir:' + h.hexdigest()
+
+
+class StageGraph:
+    """Runs stages whose inputs or outputs changed since they last succeeded."""
+
+    def __init__(self, state_file, log=print, ignore=()):
+        self.state_file = state_file
+        self.log = log
+        self.stages = []
+        self._state = self._load()
+        self.hasher = FileHasher(self._state.setdefault('files', {}), ignore)
+
+    def _load(self):
+        try:
+            with open(self.state_file, encoding='utf-8') as f:
+                state = json.load(f)
+            return state if isinstance(state, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        tmp_path = f"{self.state_file}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._state, f)
+        os.replace(tmp_path, self.state_file)
+
+    def add(self, name, func, inputs=(), outputs=(), params=None):
+        """Declare a stage. params (any JSON value) is part of its fingerprint, e.g. a command line."""
+        self.stages.append(TailStage(name, func, inputs, outputs, params))
+
+    def ordered(self):
+        """Stages in dependency order (producers before consumers, otherwise as added)."""
+        producer = {path: stage.name for stage in self.stages for path in stage.outputs}
+        deps = {stage.name: {producer[p] for p in stage.inputs if producer.get(p, stage.name) != stage.name}
+                for stage in self.stages}
+        done, order = set(), []
+        while len(order) < len(self.stages):
+            ready = [s for s in self.stages if s.name not in done and deps[s.name] <= done]
+            if not ready:
+                raise ValueError("stage graph has a cycle: " + ", ".join(s.name for s in self.stages if s.name not in done))
+            order.append(ready[0])
+            done.add(ready[0].name)
+        return order
+
+    def _fingerprints(self, paths):
+        return {path: self.hasher.fingerprint(path) for path in paths}
+
+    def run(self, force=False):
+        """Run out-of-date stages in order. Returns {stage name: 'ran' | 'skipped'}."""
+        results = {}
+        recorded = self._state.setdefault('stages', {})
+        for stage in self.ordered():
+            inputs = self._fingerprints(stage.inputs)
+            previous = recorded.get(stage.name)
+            up_to_date = (not force and previous is not None
+                          and previous.get('params') == stage.params
+                          and previous.get('inputs') == inputs
+                          and previous.get('outputs') == self._fingerprints(stage.outputs))
+            if up_to_date:
+                self.log(f"\t{stage.name}: up to date")
+                results[stage.name] = STATUS_SKIPPED
+                continue
+            stage.func()
+            recorded[stage.name] = {'params': stage.params, 'inputs': inputs,
+                                    'outputs': self._fingerprints(stage.outputs)}
+            self._save()
+            results[stage.name] = STATUS_RAN
+        self.hasher.prune()
+        self._save()  # keep refreshed file hashes
+        return results
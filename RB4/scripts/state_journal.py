@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Append-only state journal for the RB4 pipeline.
+
+Replaces rewriting the whole processed_pkgs.json after every PKG (O(n²) bytes
+over a run, and a crash mid-write could truncate it) with one JSON line per
+finished PKG:
+
+    {"pkg": "<name>.pkg", "status": "done"|"failed", "size": N, "mtime": N,
+     "seconds": 12.3, "songs": 4, "error": "...", "ts": "<iso time>"}
+
+Lines are buffered and fsync'ed in batches (every `batch_size` records or
+`flush_interval` seconds, and on close). A crash loses at most the last
+unflushed batch, which is simply reprocessed on the next run. A torn last line
+is ignored when loading.
+
+On startup the journal is compacted to one line per PKG (latest record wins),
+and any names in an existing processed_pkgs.json that the journal does not
+know yet are imported as "done" (first run after upgrading, or a restored
+backup). processed_pkgs.json is still exported at the end of a run for
+generate_rb4_song_list.js and the backup/restore scripts.
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+def _fsync_write(path, text):
+    """Atomically replace path with text (temp file + fsync + os.replace)."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class StateJournal:
+    """Per-PKG processing state backed by an append-only JSON-lines file."""
+
+    def __init__(self, journal_path, processed_pkgs_file=None, batch_size=20, flush_interval=5.0):
+        self.journal_path = journal_path
+        self.processed_pkgs_file = processed_pkgs_file
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.records = {}  # pkg name -> latest record
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._load()
+        self._import_processed_list()
+        self.compact()
+
+    def _load(self):
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn write from a crash
+                if isinstance(record, dict) and record.get('pkg'):
+                    self.records[record['pkg']] = record
+
+    def _import_processed_list(self):
+        if not self.processed_pkgs_file or not os.path.exists(self.processed_pkgs_file):
+            return
+        try:
+            with open(self.processed_pkgs_file) as f:
+                names = json.load(f)
+        except ValueError:
+            return
+        for name in names:
+            if name not in self.records:
+                self.records[name] = {'pkg': name, 'status': STATUS_DONE, 'imported': True}
+
+    def compact(self):
+        """Rewrite the journal with one line per PKG."""
+        with self._lock:
+            self._flush_locked()
+            os.makedirs(os.path.dirname(self.journal_path) or '.', exist_ok=True)
+            _fsync_write(self.journal_path,
+                         ''.join(json.dumps(self.records[name]) + '\n' for name in sorted(self.records)))
+
+    def processed(self):
+        """Names of PKGs that finished successfully."""
+        return {name for name, r in self.records.items() if r.get('status') == STATUS_DONE}
+
+    def is_done(self, pkg_name, size=None):
+        """True if pkg_name finished and its size (when both are known) is unchanged."""
+        record = self.records.get(pkg_name)
+        if not record or record.get('status') != STATUS_DONE:
+            return False
+        return size is None or record.get('size') is None or record['size'] == size
+
+    def record(self, pkg_name, status, size=None, mtime=None, seconds=None, songs=None, error=None):
+        """Append a record for pkg_name (buffered; fsync'ed in batches)."""
+        record = {'pkg': pkg_name, 'status': status, 'size': size, 'mtime': mtime,
+                  'seconds': round(seconds, 3) if seconds is not None else None,
+                  'songs': songs, 'ts': datetime.now().isoformat()}
+        if error:
+            record['error'] = str(error)[:500]
+        with self._lock:
+            self.records[pkg_name] = record
+            self._pending.append(record)
+            if (len(self._pending) >= self.batch_size or
+                    time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if self._pending:
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(r) + '\n' for r in self._pending))
+                f.flush()
+                os.fsync(f.fileno())
+            self._pending = []
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def export_processed(self):
+        """Write processed_pkgs.json (sorted list of done PKGs) for the Node generator."""
+        if self.processed_pkgs_file:
+            _fsync_write(self.processed_pkgs_file, json.dumps(sorted(self.processed()), indent=2))
+
+    def close(self):
+        self.flush()
+        self.export_processed()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Chrome Trace Event Format writer for RB4 pipeline runs (--trace out.json).
+
+Every timed stage becomes a complete ("X") event on the thread that ran it,
+so parallel extract workers and pipeline stages show up as separate tracks:
+
+    {"name": "inner_extract", "cat": "pkg", "ph": "X", "ts": <us>, "dur": <us>,
+     "pid": <pid>, "tid": 3, "args": {"pkg": "...", "bytes": 123}}
+
+Threads are numbered in the order they first record a span and labelled
+with their Python thread name through "thread_name" metadata events. The
+output opens directly in https://ui.perfetto.dev or chrome://tracing.
+"""
+
+import json
+import os
+import threading
+import time
+
+
+class TraceWriter:
+    """Collects spans in memory and writes them as a trace JSON file on close()."""
+
+    def __init__(self, path, process_name='rb4_songlist_generator'):
+        self.path = path
+        self.process_name = process_name
+        self.pid = os.getpid()
+        self.origin = time.perf_counter()
+        self.events = []
+        self._tids = {}  # thread ident -> (tid, name)
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _tid(self):
+        ident = threading.get_ident()
+        entry = self._tids.get(ident)
+        if entry is None:
+            entry = self._tids[ident] = (len(self._tids) + 1, threading.current_thread().name)
+        return entry[0]
+
+    def span(self, name, start, seconds, cat='pkg', **args):
+        """Record a span that started at time.perf_counter() value start."""
+        event = {'name': name, 'cat': cat, 'ph': 'X',
+                 'ts': round((start - self.origin) * 1e6, 1), 'dur': round(seconds * 1e6, 1),
+                 'pid': self.pid}
+        if args:
+            event['args'] = {k: v for k, v in args.items() if v is not None}
+        with self._lock:
+            event['tid'] = self._tid()
+            self.events.append(event)
+
+    def close(self):
+        """Write the trace file (safe to call twice)."""
+        if self._closed:
+            return
+        self._closed = True
+        with self._lock:
+            self.events.append({'name': 'run', 'cat': 'run', 'ph': 'X', 'ts': 0,
+                                'dur': round((time.perf_counter() - self.origin) * 1e6, 1),
+                                'pid': self.pid, 'tid': self._tid()})
+            meta = [{'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'args': {'name': self.process_name}}]
+            meta += [{'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'name': name}}
+                     for tid, name in self._tids.values()]
+            events = meta + sorted(self.events, key=lambda e: e['ts'])
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, default=str)
+        os.replace(tmp_path, self.path)
@@ -27,8 +27,6 @@ import subprocess
 import tempfile
 from pathlib import Path
 import argparse
-from tqdm import tqdm
-import mido
 
 # How much to shorten the offending note (5–15 ms is completely inaudible)
 SHORTEN_MS = 10
@@ -51,6 +49,9 @@ def repack_con(work_dir: Path, output_con: Path, onyx_path: str):
         raise RuntimeError(f"Onyx repacking failed. Return code: {result.returncode}")
 
 def fix_vocal_overhang(con_path=None, midi_path=None, location="", track_name="PART HARM1", onyx_path=r"C:\Program Files\OnyxToolkit\onyx.exe"):
+    # Imported here so --help works without mido installed
+    import mido
+
     if not con_path and not midi_path:
         print("ERROR: Must provide either con_file or midi_file")
         return
@@ -394,10 +395,11 @@ def fix_vocal_overhang(con_path=None, midi_path=None, location="", track_name="P
                 shutil.rmtree(work_dir)
 
 # ------------------------------------------------------------------
-if __name__ == "__main__":
-    if len(sys.argv) == 1 or sys.argv[1] in ("-h", "--help"):
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
         print(__doc__)
-        sys.exit(0)
+        return 0
 
     parser = argparse.ArgumentParser(description="Fix RB3 vocal overhang errors")
     parser.add_argument("--con_file", help="Path to the .con file")
@@ -406,7 +408,7 @@ if __name__ == "__main__":
     parser.add_argument("--track_name", default="PART HARM1", help="Track name (default: PART HARM1)")
     parser.add_argument("--onyx_path", default=r"C:\Program Files\OnyxToolkit\onyx.exe", help="Full path to onyx.exe")
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     # Validate arguments
     if not args.con_file and not args.midi_file:
@@ -416,6 +418,8 @@ if __name__ == "__main__":
         
 
     fix_vocal_overhang(con_path=args.con_file, midi_path=args.midi_file, location=args.location, track_name=args.track_name, onyx_path=args.onyx_path)
+    return 0
 
 
-    
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+rbtools.py — Single entry point for the Rock Band song list tools.
+
+Usage:
+    python3 rbtools.py <command> [command options]
+    python3 rbtools.py <command> --help
+
+Commands:
+    rb3-lists      Generate RB3 song lists from songs.dta files (generate_song_lists.py)
+    rb4            Run the RB4 PKG → song list pipeline (RB4/scripts/rb4_songlist_generator.py)
+    html           Generate the RB4 HTML song list (RB4/scripts/generate_html_list.py)
+    ark            Extract files from a Rock Band .ark archive (RB4/scripts/ark_extract.py)
+    vocal-fix      Fix RB3 vocal overhang errors in a CON/MIDI (otherTools/fixVocalOverhangErrorInRb3XboxCon.py)
+    disabled       Move commented-out songs out of ./songs.dta (otherTools/extract_disabled_songs.py)
+    status         Quick summary of the RB4 pipeline state (processed PKGs, last update)
+    startup-time   Measure interpreter startup for --help and quick queries
+
+Each command only imports its own module (and that module's dependencies) when
+it is actually run, so `--help` and `status` stay fast.  Check with:
+    python3 rbtools.py startup-time
+"""
+
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+RB4_SCRIPTS_DIR = os.path.join(REPO_ROOT, 'RB4', 'scripts')
+OTHER_TOOLS_DIR = os.path.join(REPO_ROOT, 'otherTools')
+
+# Startup budget for --help and quick queries (milliseconds)
+STARTUP_BUDGET_MS = 100
+
+# command -> (module directory, module name, description)
+# Modules are imported lazily and must expose main(argv) -> int.
+COMMANDS = {
+    'rb3-lists': (REPO_ROOT, 'generate_song_lists', 'Generate RB3 song lists from songs.dta files'),
+    'rb4': (RB4_SCRIPTS_DIR, 'rb4_songlist_generator', 'Run the RB4 PKG → song list pipeline'),
+    'html': (RB4_SCRIPTS_DIR, 'generate_html_list', 'Generate the RB4 HTML song list'),
+    'ark': (RB4_SCRIPTS_DIR, 'ark_extract', 'Extract files from a Rock Band .ark archive'),
+    'vocal-fix': (OTHER_TOOLS_DIR, 'fixVocalOverhangErrorInRb3XboxCon', 'Fix RB3 vocal overhang errors in a CON/MIDI'),
+    'disabled': (OTHER_TOOLS_DIR, 'extract_disabled_songs', 'Move commented-out songs out of ./songs.dta'),
+}
+
+# Commands measured by `startup-time` (argv passed to rbtools.py)
+STARTUP_PROBES = [
+    ['--help'],
+    ['status'],
+    ['rb3-lists', '--help'],
+    ['rb4', '--help'],
+    ['html', '--help'],
+    ['ark', '--help'],
+    ['vocal-fix', '--help'],
+]
+
+
+def _load_module(directory, name):
+    """Import a tool module from its folder (tool folders are not packages)."""
+    import importlib
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    return importlib.import_module(name)
+
+
+def run_tool(command, argv):
+    """Run a delegated tool command with its own argument parser."""
+    directory, module_name, _ = COMMANDS[command]
+    module = _load_module(directory, module_name)
+    if module_name == 'extract_disabled_songs':
+        # Works on ./songs.dta in the current directory and takes no options
+        if argv and argv[0] in ('-h', '--help'):
+            print(module.__doc__.strip())
+            return 0
+        return 0 if module.extract_disabled_songs() else 1
+    result = module.main(argv)
+    return result or 0
+
+
+def cmd_status(argv):
+    """Print a quick summary of the RB4 pipeline state without loading metadata."""
+    import argparse
+    import json
+    sys.path.insert(0, RB4_SCRIPTS_DIR)
+    from settings_defaults import (DEFAULT_TEMP_DIR, DEFAULT_METADATA_DIR, get_processed_pkgs_file,
+                                   get_state_journal_file, get_update_history_file)
+
+    parser = argparse.ArgumentParser(prog='rbtools.py status', description='Quick summary of the RB4 pipeline state')
+    parser.add_argument('--temp-dir', default=DEFAULT_TEMP_DIR, help=f'Pipeline temp directory (default: {DEFAULT_TEMP_DIR})')
+    parser.add_argument('--metadata-dir', default=DEFAULT_METADATA_DIR, help=f'Metadata directory (default: {DEFAULT_METADATA_DIR})')
+    args = parser.parse_args(argv)
+
+    processed_file = get_processed_pkgs_file(args.temp_dir)
+    processed = []
+    if os.path.exists(processed_file):
+        with open(processed_file) as f:
+            processed = json.load(f)
+    print(f"Processed PKGs: {len(processed)} ({processed_file})")
+
+    journal_file = get_state_journal_file(args.temp_dir)
+    if os.path.exists(journal_file):
+        latest = {}
+        with open(journal_file) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                latest[record.get('pkg')] = record.get('status')
+        failed = sum(1 for status in latest.values() if status == 'failed')
+        print(f"Journal: {len(latest)} PKGs, {failed} failed last time ({journal_file})")
+
+    metadata_count = 0
+    if os.path.isdir(args.metadata_dir):
+        metadata_count = sum(1 for f in os.listdir(args.metadata_dir) if f.startswith('metadata_') and f.endswith('.json'))
+    print(f"Metadata files: {metadata_count} ({args.metadata_dir})")
+
+    history_file = get_update_history_file(args.temp_dir)
+    if os.path.exists(history_file):
+        with open(history_file) as f:
+            history = json.load(f)
+        if history:
+            latest = history[-1]
+            print(f"Last update: {latest.get('timestamp')} — {len(latest.get('newSongs', []))} new, {latest.get('totalSongs', 0)} total songs")
+    return 0
+
+
+def cmd_startup_time(argv):
+    """Measure wall-clock startup for --help and quick queries in fresh interpreters."""
+    import argparse
+    import subprocess
+    import time
+
+    parser = argparse.ArgumentParser(prog='rbtools.py startup-time', description='Measure rbtools startup time')
+    parser.add_argument('--runs', type=int, default=5, help='Runs per command; the median is reported (default: 5)')
+    parser.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS,
+                        help=f'Fail if any median exceeds this many milliseconds (default: {STARTUP_BUDGET_MS})')
+    args = parser.parse_args(argv)
+
+    script = os.path.abspath(__file__)
+    over_budget = []
+    for probe in STARTUP_PROBES:
+        timings = []
+        for _ in range(max(1, args.runs)):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, script] + probe, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        median = timings[len(timings) // 2]
+        mark = 'OK ' if median <= args.budget_ms else 'SLOW'
+        print(f"  {mark} {median:7.1f} ms  rbtools.py {' '.join(probe)}")
+        if median > args.budget_ms:
+            over_budget.append(probe)
+
+    if over_budget:
+        print(f"{len(over_budget)} command(s) over the {args.budget_ms:.0f} ms budget")
+        return 1
+    print(f"All commands within the {args.budget_ms:.0f} ms budget")
+    return 0
+
+
+BUILTIN_COMMANDS = {
+    'status': (cmd_status, 'Quick summary of the RB4 pipeline state'),
+    'startup-time': (cmd_startup_time, 'Measure interpreter startup for --help and quick queries'),
+}
+
+
+def print_help():
+    print('Usage: python3 rbtools.py <command> [command options]')
+    print('')
+    print('Commands:')
+    for name, (_, _, description) in COMMANDS.items():
+        print(f'  {name:<14} {description}')
+    for name, (_, description) in BUILTIN_COMMANDS.items():
+        print(f'  {name:<14} {description}')
+    print('')
+    print('Run "python3 rbtools.py <command> --help" for command options.')
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ('-h', '--help'):
+        print_help()
+        return 0
+
+    command, rest = argv[0], argv[1:]
+    if command in BUILTIN_COMMANDS:
+        return BUILTIN_COMMANDS[command][0](rest)
+    if command in COMMANDS:
+        return run_tool(command, rest)
+
+    print(f"Unknown command: {command}", file=sys.stderr)
+    print_help()
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())